@@ -1,9 +1,12 @@
 from django.contrib import admin
 from ai.models.document import Document, DocumentChunk
-from ai.models.conversation import Conversation, Message
+from ai.models.conversation import ChatTurn, Conversation, Message
+from ai.models.ingestion import IngestionJob
 
 # Register your models here.
 admin.site.register(Document)
 admin.site.register(DocumentChunk)
 admin.site.register(Conversation)
 admin.site.register(Message)
+admin.site.register(ChatTurn)
+admin.site.register(IngestionJob)
@@ -0,0 +1,231 @@
+import asyncio
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from main.lib.tracing import span
+
+# Admission priorities, lowest first: follow-up turns are let in before new conversations
+CONTINUING = 0
+NEW = 1
+
+class AdmissionRejected(Exception):
+    """A request turned away by admission control, with the HTTP status and Retry-After (seconds) to answer with"""
+
+    def __init__(self, status, detail, retry_after):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(self.retry_after)}
+
+class _Waiter:
+    def __init__(self, priority, sequence, wake, enqueued_at):
+        self.priority = priority
+        self.sequence = sequence
+        self.wake = wake
+        self.enqueued_at = enqueued_at
+        # "waiting", then "admitted" when given a slot or "evicted" to make room for a higher priority
+        self.state = "waiting"
+
+class Slot:
+    """A held admission slot; release() may be called more than once"""
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._released = False
+        self._started = controller.clock()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self._controller.clock() - self._started)
+
+class AdmissionController:
+    """
+    Bounds how many LLM calls one worker process runs at once.
+
+    Up to max_concurrent requests hold a slot; the next max_queue wait for one,
+    continuing conversations (CONTINUING) ahead of new ones (NEW) and each
+    priority first come, first served. When the queue is full a new
+    conversation is refused at once with 429, while a continuing one takes the
+    place of the newest waiting new conversation, which then gets the 429.
+    A request that waits more than timeout seconds gets 503. Both carry a
+    Retry-After estimated from the queue length and recent call durations.
+
+    Works from threads and event loops alike: sync callers block on an Event
+    and async callers await a future, both woken under one lock.
+    """
+
+    def __init__(self, max_concurrent=None, max_queue=None, timeout=None, clock=time.monotonic):
+        self.max_concurrent = max_concurrent or settings.LLM_CONCURRENCY
+        self.max_queue = settings.LLM_QUEUE_SIZE if max_queue is None else max_queue
+        self.timeout = timeout or settings.LLM_QUEUE_TIMEOUT_SECONDS
+        self.clock = clock
+        self.in_flight = 0
+        self.counts = {"admitted": 0, "rejected": 0, "evicted": 0, "timed_out": 0}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._waits = deque(maxlen=1000)
+        # Moving average of how long a slot is held
+        self._service_seconds = None
+        self._lock = threading.Lock()
+
+    def _retry_after(self):
+        service_seconds = self._service_seconds or 1.0
+        return max(math.ceil((len(self._queue) + 1) * service_seconds / self.max_concurrent), 1)
+
+    def _admit(self, waited):
+        self.in_flight += 1
+        self.counts["admitted"] += 1
+        self._waits.append(waited)
+
+    def _enter(self, priority, wake):
+        """Take a slot (returns None) or a place in the queue (returns the waiter), or raise AdmissionRejected"""
+        with self._lock:
+            if self.in_flight < self.max_concurrent and not self._queue:
+                self._admit(0.0)
+                return None
+            if len(self._queue) >= self.max_queue:
+                newest_new = max(
+                    (waiter for waiter in self._queue if waiter.priority > priority),
+                    key=lambda waiter: (waiter.priority, waiter.sequence), default=None
+                )
+                if newest_new is None:
+                    self.counts["rejected"] += 1
+                    raise AdmissionRejected(429, "Too many requests, please try again shortly", self._retry_after())
+                self._queue.remove(newest_new)
+                newest_new.state = "evicted"
+                self.counts["evicted"] += 1
+                newest_new.wake()
+            waiter = _Waiter(priority, next(self._sequence), wake, self.clock())
+            self._queue.append(waiter)
+            return waiter
+
+    def _settle(self, waiter):
+        """After a wait ended: keep an admitted slot, or leave the queue and raise AdmissionRejected"""
+        with self._lock:
+            if waiter.state == "admitted":
+                return
+            if waiter.state == "evicted":
+                self.counts["rejected"] += 1
+                raise AdmissionRejected(429, "Too many requests, please try again shortly", self._retry_after())
+            self._queue.remove(waiter)
+            self.counts["timed_out"] += 1
+            raise AdmissionRejected(503, "The assistant is busy, please try again shortly", self._retry_after())
+
+    def _abandon(self, waiter):
+        """A waiting caller went away (e.g. the client disconnected): give back whatever it held"""
+        with self._lock:
+            if waiter.state == "waiting":
+                self._queue.remove(waiter)
+                return
+        if waiter.state == "admitted":
+            self._release(None)
+
+    def _release(self, held):
+        with self._lock:
+            self.in_flight -= 1
+            if held is not None:
+                self._service_seconds = held if self._service_seconds is None else 0.8 * self._service_seconds + 0.2 * held
+            while self._queue and self.in_flight < self.max_concurrent:
+                waiter = min(self._queue, key=lambda waiter: (waiter.priority, waiter.sequence))
+                self._queue.remove(waiter)
+                waiter.state = "admitted"
+                self._admit(self.clock() - waiter.enqueued_at)
+                waiter.wake()
+
+    def enter(self, priority=NEW):
+        """Block until a slot is free and return it, or raise AdmissionRejected"""
+        event = threading.Event()
+        with span("admission_wait"):
+            waiter = self._enter(priority, event.set)
+            if waiter is not None:
+                event.wait(self.timeout)
+                self._settle(waiter)
+        return Slot(self)
+
+    async def aenter(self, priority=NEW):
+        """Async version of enter()"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with span("admission_wait"):
+            waiter = self._enter(priority, wake)
+            if waiter is not None:
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                except asyncio.TimeoutError:
+                    pass
+                except asyncio.CancelledError:
+                    self._abandon(waiter)
+                    raise
+                self._settle(waiter)
+        return Slot(self)
+
+    @contextmanager
+    def admit(self, priority=NEW):
+        slot = self.enter(priority)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    @asynccontextmanager
+    async def aadmit(self, priority=NEW):
+        slot = await self.aenter(priority)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    def stats(self):
+        """Current load, outcome counts and queue wait percentiles of this process"""
+        with self._lock:
+            waits = sorted(self._waits)
+            queued = [waiter.priority for waiter in self._queue]
+            stats = {
+                "in_flight": self.in_flight,
+                "max_concurrent": self.max_concurrent,
+                "queued": len(queued),
+                "queued_continuing": queued.count(CONTINUING),
+                "queued_new": queued.count(NEW),
+                "max_queue": self.max_queue,
+                **self.counts,
+                "service_seconds": self._service_seconds,
+            }
+
+        def percentile(q):
+            return waits[min(int(len(waits) * q / 100), len(waits) - 1)] if waits else None
+
+        stats["wait_seconds"] = {"p50": percentile(50), "p95": percentile(95), "max": waits[-1] if waits else None}
+        return stats
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_admission_controller():
+    """The process-wide AdmissionController, built from settings on first use"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
+
+@receiver(setting_changed)
+def _reset_admission_controller(setting, **kwargs):
+    global _controller
+    if setting in ("LLM_CONCURRENCY", "LLM_QUEUE_SIZE", "LLM_QUEUE_TIMEOUT_SECONDS"):
+        with _controller_lock:
+            _controller = None
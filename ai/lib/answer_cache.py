@@ -0,0 +1,76 @@
+import hashlib
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from main.lib import metrics
+
+CACHE_REQUESTS = metrics.counter("cache_requests_total", "Cache lookups by cache and result (hit or miss)", ["cache", "result"])
+
+class AnswerCache:
+    """
+    Semantic cache of first-turn answers.
+
+    Entries are grouped under a signature of the exact chunks retrieval
+    returned (id, content hash and last update of each), and a lookup matches
+    the cached question whose embedding is closest to the query's, if its
+    cosine similarity reaches the threshold. A paraphrase that retrieves the
+    same context therefore reuses the answer, while any re-ingested, edited or
+    purged chunk changes the signature, so stale entries are never read again
+    and simply expire after ttl seconds.
+
+    Entries live in the Django cache. Two requests storing under the same
+    signature at once may drop one entry, which only costs a future miss.
+    """
+
+    KEY_PREFIX = "answer-cache"
+
+    def __init__(self, threshold=None, ttl=None, max_entries=None, backend=None):
+        self.threshold = settings.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = settings.ANSWER_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+        self.backend = backend or cache
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @staticmethod
+    def context_signature(chunks):
+        parts = sorted(f"{chunk.id}:{chunk.content_hash}:{chunk.updated_at.isoformat()}" for chunk in chunks)
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def _key(self, chunks):
+        return f"{self.KEY_PREFIX}:{self.context_signature(chunks)}"
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, chunks):
+        """Return {"answer", "reason", "similarity"} of the closest cached question for this context, or None"""
+        if not self.enabled or embedding is None or not chunks:
+            return None
+        match = self._closest(embedding, self.backend.get(self._key(chunks)))
+        CACHE_REQUESTS.inc(cache="answer", result="miss" if match is None else "hit")
+        return match
+
+    def _closest(self, embedding, entries):
+        if not entries:
+            return None
+        query = self._normalize(embedding)
+        similarities = np.asarray([entry["embedding"] for entry in entries], dtype=np.float32) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return {"answer": entries[best]["answer"], "reason": entries[best]["reason"], "similarity": float(similarities[best])}
+
+    def store(self, embedding, chunks, answer, reason):
+        if not self.enabled or embedding is None or not chunks:
+            return
+        key = self._key(chunks)
+        entries = self.backend.get(key) or []
+        entries.append({"embedding": self._normalize(embedding).tolist(), "answer": answer, "reason": reason})
+        # Keep the newest entries
+        self.backend.set(key, entries[-self.max_entries:], self.ttl)
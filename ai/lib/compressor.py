@@ -0,0 +1,93 @@
+import re
+import numpy as np
+from django.conf import settings
+from ai.utils.tokens import count_tokens
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def split_sentences(text):
+    """Split chunk text into sentences on terminal punctuation and line breaks (PDF pages break lines too)"""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence and sentence.strip()]
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class ContextCompressor:
+    """
+    Shrinks retrieved chunks to the sentences most relevant to the query
+    before they are put into the prompt.
+
+    Every chunk is split into sentences, and sentences repeated across chunks
+    (overlapping pages, running headers) are kept once. When everything left
+    fits in token_budget nothing else is dropped. Otherwise sentences are
+    scored by cosine similarity of their embedding (from encode) to the query
+    embedding, and the best ones are kept until the budget is spent, skipping
+    any that is a near-duplicate of one already kept. Without an encoder or a
+    query embedding, sentences are kept in reading order instead. Kept
+    sentences stay in their original order within their chunk, and chunks
+    with nothing left are dropped.
+    """
+
+    def __init__(self, token_budget=None, dedupe_threshold=None, encode=None):
+        self.token_budget = settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+        self.dedupe_threshold = settings.CONTEXT_DEDUPE_THRESHOLD if dedupe_threshold is None else dedupe_threshold
+        self.encode = encode
+
+    def compress(self, query_embedding, chunks):
+        """Return copies of the chunk dicts with their text reduced to the kept sentences"""
+        if self.token_budget <= 0:
+            return chunks
+
+        sentences = []
+        seen = set()
+        for chunk_index, chunk in enumerate(chunks):
+            for sentence in split_sentences(chunk["text"]):
+                key = " ".join(sentence.lower().split())
+                if key in seen:
+                    continue
+                seen.add(key)
+                sentences.append((chunk_index, sentence))
+        tokens = [count_tokens(sentence) for _, sentence in sentences]
+
+        if sum(tokens) <= self.token_budget:
+            kept = range(len(sentences))
+        elif self.encode is not None and query_embedding is not None:
+            kept = self._select_by_relevance(query_embedding, [sentence for _, sentence in sentences], tokens)
+        else:
+            kept = self._select_in_order(tokens)
+
+        selected = [[] for _ in chunks]
+        for index in sorted(kept):
+            chunk_index, sentence = sentences[index]
+            selected[chunk_index].append(sentence)
+        return [
+            {**chunk, "text": " ".join(kept_sentences)}
+            for chunk, kept_sentences in zip(chunks, selected) if kept_sentences
+        ]
+
+    def _select_in_order(self, tokens):
+        kept = []
+        used = 0
+        for index, count in enumerate(tokens):
+            if used + count <= self.token_budget:
+                kept.append(index)
+                used += count
+        return kept
+
+    def _select_by_relevance(self, query_embedding, texts, tokens):
+        embeddings = _normalize(self.encode(texts))
+        scores = embeddings @ _normalize(query_embedding)
+        kept = []
+        used = 0
+        # Stable, so ties keep reading order
+        for index in np.argsort(-scores, kind="stable"):
+            if used + tokens[index] > self.token_budget:
+                # A shorter, less relevant sentence may still fit
+                continue
+            if kept and np.max(embeddings[kept] @ embeddings[index]) >= self.dedupe_threshold:
+                continue
+            kept.append(int(index))
+            used += tokens[index]
+        return kept
@@ -0,0 +1,199 @@
+import os
+import json
+from django.conf import settings
+from django.utils import timezone
+from ai.lib.ingestion import DocumentIngestor
+from ai.lib.loader import parse_document
+from ai.lib.nlp import NLPPreprocessor
+from ai.lib.pipeline import Pipeline, Stage
+from ai.models.document import Document
+from ai.utils.iteration import batched
+from main.services.s3 import S3Service
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+def resolve_sources(paths=(), manifest=None, prefix=None, s3_service=None):
+    """
+    Collect the documents to ingest, in order and without duplicates.
+
+    Each entry of paths is a local file, a local directory (searched recursively)
+    or an S3 key. A manifest lists one path or key per line, ignoring blank lines
+    and # comments, and a prefix expands to every key under it in the bucket.
+    """
+    candidates = []
+    if manifest:
+        with open(manifest) as f:
+            candidates.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    candidates.extend(paths)
+
+    sources = []
+    for candidate in candidates:
+        if os.path.isdir(candidate):
+            for directory, _, files in sorted(os.walk(candidate)):
+                sources.extend(os.path.join(directory, name) for name in sorted(files))
+        else:
+            sources.append(candidate)
+    if prefix is not None:
+        sources.extend((s3_service or S3Service()).list_keys(prefix))
+
+    supported = [source for source in sources if source.lower().endswith(SUPPORTED_EXTENSIONS)]
+    return list(dict.fromkeys(supported))
+
+class ParsedDocument:
+    """Pages parsed by the pipeline, in the shape DocumentIngestor expects from a loader"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.page_count = len(pages)
+
+    def iter_pages(self):
+        return iter(self.pages)
+
+class CorpusCheckpoint:
+    """
+    Append-only JSONL record of documents that were fully ingested.
+
+    Every line is written and fsynced as soon as a document is committed, so an
+    interrupted run loses at most the documents that were in flight.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; that document simply runs again
+                        continue
+                    self.completed[record["source"]] = record
+
+    def __contains__(self, source):
+        return source in self.completed
+
+    def record(self, source, **fields):
+        record = {"source": source, **fields, "finished_at": timezone.now().isoformat()}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.completed[source] = record
+
+class CorpusIngestor:
+    """
+    Ingests a list of documents through a Pipeline of download (threads), parse
+    (processes when parse_workers > 1), NLP (threads) and insert (the calling
+    thread), so that every stage works on a different document at the same time.
+
+    The bounded queues between stages cap how many downloaded or parsed documents
+    are held in memory. Documents already in the checkpoint are skipped; one that
+    already exists in the database (e.g. left half-written by an interrupted run)
+    is re-ingested in place, which only fills in the pages that are missing.
+    """
+
+    def __init__(self, sources, checkpoint, workers=4, parse_workers=1, nlp_workers=1, s3_service=None,
+                 nlp_processor=None, batch_size=None, description="", queue_size=None):
+        self.sources = sources
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.nlp_workers = nlp_workers
+        self.s3_service = s3_service
+        self._nlp_processor = nlp_processor
+        self.batch_size = batch_size or settings.DOCUMENT_INGEST_BATCH_SIZE
+        self.description = description
+        self.queue_size = queue_size or settings.DOCUMENT_PIPELINE_QUEUE_SIZE
+        self.resumed = set()
+        self.pages_ingested = 0
+        self.metrics = []
+        self.succeeded = []
+        self.skipped = []
+        self.failed = []
+        self._on_document = None
+
+    @property
+    def nlp_processor(self):
+        if self._nlp_processor is None:
+            self._nlp_processor = NLPPreprocessor()
+        return self._nlp_processor
+
+    def download(self, source):
+        """Read a local file or download an S3 object (I/O stage)"""
+        if os.path.exists(source):
+            with open(source, "rb") as f:
+                return source, f.read()
+        if self.s3_service is None:
+            self.s3_service = S3Service()
+        content = self.s3_service.download_file_to_memory(source)
+        if content is None:
+            raise ValueError(f"Failed to download file from S3: {source}")
+        return source, content
+
+    def preprocess(self, document):
+        """Run NLP over a parsed document's pages in batches (model stage)"""
+        source, pages = document
+        if source in self.resumed:
+            # reingest() only runs NLP on the pages that are missing or changed
+            return source, pages, None
+        nlp_data = []
+        for batch in batched(pages, self.batch_size):
+            nlp_data.extend(self.nlp_processor.preprocess_batch(batch, batch_size=self.batch_size))
+        return source, pages, nlp_data
+
+    def ingest(self, document):
+        """Write a document's chunks and checkpoint it (runs in the calling thread)"""
+        source, pages, nlp_data = document
+        loader = ParsedDocument(pages)
+        existing = Document.objects.filter(file_url=source, removed=False).order_by("id").first()
+        document = existing or Document.objects.create(file_url=source, description=self.description)
+
+        ingestor = DocumentIngestor(document, loader=loader, nlp_processor=self.nlp_processor,
+                                    batch_size=self.batch_size)
+        if nlp_data is None:
+            ingestor.reingest()
+        else:
+            for batch in batched(nlp_data, self.batch_size):
+                ingestor.write_batch(batch)
+            ingestor.writer.finalize()
+        self.checkpoint.record(source, document=document.id, pages=len(pages))
+        self.pages_ingested += len(pages)
+        self.succeeded.append(source)
+        if self._on_document:
+            self._on_document(source, None)
+
+    def _fail(self, source, error):
+        self.failed.append((source, error))
+        if self._on_document:
+            self._on_document(source, error)
+
+    def run(self, on_document=None):
+        """
+        Ingest every source that is not checkpointed yet.
+
+        on_document(source, error) is called after each document; error is None on success.
+        """
+        self._on_document = on_document
+        pending = []
+        for source in self.sources:
+            (self.skipped if source in self.checkpoint else pending).append(source)
+        self.resumed = set(
+            Document.objects.filter(file_url__in=pending, removed=False).values_list("file_url", flat=True)
+        )
+
+        parse_kind = Stage.PROCESS if self.parse_workers > 1 else Stage.THREAD
+        pipeline = Pipeline(
+            [
+                Stage("download", self.download, workers=self.workers),
+                Stage("parse", parse_document, workers=self.parse_workers, kind=parse_kind),
+                Stage("nlp", self.preprocess, workers=self.nlp_workers),
+            ],
+            sink=Stage("insert", self.ingest),
+            queue_size=self.queue_size,
+            on_error=self._fail
+        )
+        try:
+            pipeline.run(pending)
+        finally:
+            self.metrics = pipeline.metrics()
@@ -0,0 +1,161 @@
+import logging
+from django.conf import settings
+from django.db.models import Q
+from langchain_core.messages import SystemMessage, HumanMessage
+from ai.lib.llm import get_chat_model
+from ai.models.conversation import Message
+from ai.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant that answers questions about UP Cebu.
+Update the current summary with the new messages. Keep the facts, names, dates, programs and open questions the assistant may need to answer follow-up questions; drop greetings and repetition.
+Respond with the updated summary only, in plain text and at most 200 words."""
+
+# Upper bound on messages folded by one summary update; any remainder is folded on the next turn
+SUMMARY_MAX_MESSAGES = 40
+
+class ConversationHistory:
+    """
+    The part of a conversation sent to the LLM: the most recent turns verbatim,
+    plus a rolling summary of everything before them.
+
+    The window holds at most max_turns user/assistant turns and token_budget
+    tokens. It is read newest-first with a limited query on the
+    (conversation, created_at) index instead of loading the whole conversation.
+    Messages that have fallen out of the window are folded into
+    Conversation.summary by one short LLM call once summary_batch of them are
+    waiting, so the summary is extended incrementally rather than rebuilt.
+    load() only reads; summarize() makes that call, and is meant to run once
+    the answer is saved so the summary never delays it.
+    Conversation.summarized_until and summarized_message mark the newest
+    message it covers. Messages are ordered by (created_at, id) throughout,
+    as both messages of a turn can share a timestamp.
+    """
+
+    def __init__(self, conversation, max_turns=None, token_budget=None, summary_batch=None, llm=None):
+        self.conversation = conversation
+        self.max_turns = max_turns or settings.HISTORY_MAX_TURNS
+        self.token_budget = token_budget or settings.HISTORY_TOKEN_BUDGET
+        self.summary_batch = summary_batch or settings.HISTORY_SUMMARY_BATCH
+        self._llm = llm
+        # Set by load(): messages waiting to be summarized, and how many there are once counted
+        self._pending_messages = None
+        self._pending_count = None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_chat_model(model=settings.HISTORY_SUMMARY_MODEL)
+        return self._llm
+
+    @property
+    def summary(self):
+        return self.conversation.summary
+
+    def _recent(self):
+        # One message more than the window can hold tells whether anything older exists; both messages of a
+        # turn are inserted together, so the id breaks timestamp ties
+        return Message.objects.filter(conversation=self.conversation).order_by("-created_at", "-id")[:self.max_turns * 2 + 1]
+
+    def _window(self, recent):
+        """The newest messages that fit in the turn limit and token budget, oldest first"""
+        window = []
+        tokens = 0
+        for message in recent[:self.max_turns * 2]:
+            tokens += count_tokens(message.content)
+            if tokens > self.token_budget:
+                break
+            window.append(message)
+        return window[::-1]
+
+    def _pending(self, recent, window):
+        """Messages older than the window and not yet in the summary, or None when none can be"""
+        if len(window) == len(recent):
+            # The whole conversation fits in the window
+            return None
+        pending = Message.objects.filter(conversation=self.conversation)
+        if window:
+            oldest = window[0]
+            pending = pending.filter(Q(created_at__lt=oldest.created_at) | Q(created_at=oldest.created_at, id__lt=oldest.id))
+        else:
+            newest = recent[0]
+            pending = pending.filter(Q(created_at__lt=newest.created_at) | Q(created_at=newest.created_at, id__lte=newest.id))
+        until = self.conversation.summarized_until
+        if until and self.conversation.summarized_message_id:
+            pending = pending.filter(Q(created_at__gt=until) | Q(created_at=until, id__gt=self.conversation.summarized_message_id))
+        elif until:
+            # Summarized before the message was recorded
+            pending = pending.filter(created_at__gt=until)
+        return pending.order_by("created_at", "id")
+
+    def _summary_prompt(self, messages):
+        transcript = "\n".join(f"{message.role}: {message.content}" for message in messages)
+        return [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Current summary:\n{self.summary or '(none)'}\n\nNew messages:\n{transcript}"),
+        ]
+
+    def _apply_summary(self, messages, summary):
+        self.conversation.summary = summary.strip()
+        self.conversation.summarized_until = messages[-1].created_at
+        self.conversation.summarized_message = messages[-1]
+
+    def load(self):
+        """Return the window of recent messages, oldest first"""
+        recent = list(self._recent())
+        window = self._window(recent)
+        self._pending_messages = self._pending(recent, window)
+        return window
+
+    async def aload(self):
+        """Async version of load(), for the async retrieval view"""
+        recent = [message async for message in self._recent()]
+        window = self._window(recent)
+        self._pending_messages = self._pending(recent, window)
+        return window
+
+    def summary_due(self):
+        """Whether summary_batch messages older than the loaded window are waiting to be summarized"""
+        if self._pending_messages is None:
+            return False
+        if self._pending_count is None:
+            self._pending_count = self._pending_messages.count()
+        return self._pending_count >= self.summary_batch
+
+    async def asummary_due(self):
+        """Async version of summary_due()"""
+        if self._pending_messages is None:
+            return False
+        if self._pending_count is None:
+            self._pending_count = await self._pending_messages.acount()
+        return self._pending_count >= self.summary_batch
+
+    def summarize(self):
+        """Fold the messages waiting since load() into the summary, if a batch is due; returns whether it was updated"""
+        if not self.summary_due():
+            return False
+        messages = list(self._pending_messages[:SUMMARY_MAX_MESSAGES])
+        try:
+            result = self.llm.invoke(self._summary_prompt(messages))
+        except Exception as e:
+            # A stale summary is better than a failed chat; the messages are folded on a later turn
+            logger.warning("Failed to update summary of conversation %s: %s", self.conversation.id, e)
+            return False
+        self._apply_summary(messages, result.content)
+        self.conversation.save(update_fields=["summary", "summarized_until", "summarized_message", "updated_at"])
+        return True
+
+    async def asummarize(self):
+        """Async version of summarize()"""
+        if not await self.asummary_due():
+            return False
+        messages = [message async for message in self._pending_messages[:SUMMARY_MAX_MESSAGES]]
+        try:
+            result = await self.llm.ainvoke(self._summary_prompt(messages))
+        except Exception as e:
+            logger.warning("Failed to update summary of conversation %s: %s", self.conversation.id, e)
+            return False
+        self._apply_summary(messages, result.content)
+        await self.conversation.asave(update_fields=["summary", "summarized_until", "summarized_message", "updated_at"])
+        return True
@@ -0,0 +1,217 @@
+import time
+import hashlib
+import logging
+from collections import defaultdict, deque
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, transaction
+from ai.lib.loader import DocumentLoader
+from ai.lib.nlp import NLPPreprocessor
+from ai.lib.pipeline import Pipeline, Stage
+from ai.models.conversation import ChatTurn, Message
+from ai.models.document import DocumentChunk
+from ai.utils.iteration import batched
+
+logger = logging.getLogger(__name__)
+
+def page_hash(text):
+    """Stable fingerprint of a page's text used to detect changed pages"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def refresh_search_vectors(queryset):
+    """Recompute stored full-text search vectors for a queryset of chunks in one UPDATE (PostgreSQL only)"""
+    if connection.vendor != "postgresql":
+        return 0
+    return queryset.update(search_vector=SearchVector("text"))
+
+def purge_chunks(document, batch_size=None, on_progress=None):
+    """
+    Delete a document's chunks in short transactions of batch_size rows, and return how many were deleted.
+
+    ChatTurn.context and Message.context links to each batch are deleted explicitly
+    first, so no single statement cascades over a whole document and locks are held
+    only briefly.
+    on_progress(deleted) is called after every batch.
+    """
+    batch_size = batch_size or settings.DOCUMENT_CHUNK_INSERT_BATCH_SIZE
+    deleted = 0
+    while ids := list(DocumentChunk.objects.filter(document=document).values_list("id", flat=True)[:batch_size]):
+        delete_chunks(ids)
+        deleted += len(ids)
+        if on_progress:
+            on_progress(deleted)
+    return deleted
+
+def delete_chunks(ids):
+    """Delete chunks by id in one transaction, with their ChatTurn.context and Message.context links"""
+    with transaction.atomic():
+        ChatTurn.context.through.objects.filter(documentchunk_id__in=ids).delete()
+        Message.context.through.objects.filter(documentchunk_id__in=ids).delete()
+        DocumentChunk.objects.filter(id__in=ids).delete()
+
+class ChunkWriter:
+    """
+    Accumulates DocumentChunk rows and inserts them with batched bulk_create
+    instead of one INSERT round trip per page. Each batch's search vectors are
+    filled in with one UPDATE in the same transaction, so its chunks are
+    searchable as soon as they are visible.
+    """
+    
+    def __init__(self, document, batch_size=None):
+        self.document = document
+        self.batch_size = batch_size or settings.DOCUMENT_CHUNK_INSERT_BATCH_SIZE
+        self.pending = []
+        self.rows_written = 0
+    
+    def add(self, chunks):
+        """Queue chunks, flushing once a full insert batch has accumulated"""
+        self.pending.extend(chunks)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Insert every queued chunk and its search vectors in a single short transaction"""
+        if not self.pending:
+            return
+        with transaction.atomic():
+            DocumentChunk.objects.bulk_create(self.pending, batch_size=self.batch_size)
+            refresh_search_vectors(DocumentChunk.objects.filter(id__in=[chunk.id for chunk in self.pending]))
+        self.rows_written += len(self.pending)
+        self.pending = []
+    
+    def finalize(self):
+        """Flush the remaining chunks"""
+        self.flush()
+
+class DocumentIngestor:
+    """
+    Streams a document's pages through NLP in batches and hands the chunks to a
+    ChunkWriter as each batch completes, so memory stays flat regardless of
+    document size and early pages become searchable before the last one is parsed.
+
+    ingest() runs as a Pipeline: pages are downloaded and parsed in a feeder
+    thread, NLP runs in nlp_workers threads, and chunks are written from the
+    calling thread, all overlapping and bounded by small queues.
+    """
+    
+    def __init__(self, document, loader=None, nlp_processor=None, batch_size=None, on_progress=None,
+                 insert_batch_size=None, nlp_workers=None):
+        self.document = document
+        self.loader = loader or DocumentLoader(document.file_url, lazy=True)
+        self.nlp_processor = nlp_processor or NLPPreprocessor()
+        self.batch_size = batch_size or settings.DOCUMENT_INGEST_BATCH_SIZE
+        self.writer = ChunkWriter(document, batch_size=insert_batch_size)
+        self.nlp_workers = nlp_workers or settings.DOCUMENT_NLP_WORKERS
+        # Called as on_progress(pages_processed, pages_total) after every committed batch
+        self.on_progress = on_progress
+        self.pages_processed = 0
+        # Chunk counts by outcome for the last reingest()
+        self.stats = {}
+        # Seconds spent in NLP and in chunk writes during ingest() or reingest()
+        self.timings = {"nlp": 0.0, "insert": 0.0}
+        # Per-stage metrics of the last ingest() pipeline
+        self.metrics = []
+    
+    def ingest(self):
+        """Process every page of the document and return the number of chunks written"""
+        pipeline = Pipeline(
+            [Stage("nlp", self.preprocess, workers=self.nlp_workers)],
+            sink=Stage("insert", self.write_batch),
+            queue_size=settings.DOCUMENT_PIPELINE_QUEUE_SIZE,
+            source_name="load"
+        )
+        pipeline.run(batched(self.loader.iter_pages(), self.batch_size))
+        
+        started = time.perf_counter()
+        self.writer.finalize()
+        pipeline.sink.busy_seconds += time.perf_counter() - started
+        self.metrics = pipeline.metrics()
+        self.timings["nlp"] += pipeline.stages[0].busy_seconds
+        self.timings["insert"] += pipeline.sink.busy_seconds
+        return self.pages_processed
+    
+    def preprocess(self, pages):
+        """Run NLP over a batch of page texts"""
+        return self.nlp_processor.preprocess_batch(pages, batch_size=self.batch_size)
+    
+    def write_batch(self, nlp_data):
+        """Turn the NLP output of the next pages into chunks and queue them for insertion"""
+        self.writer.add([
+            self._build_chunk(data, self.pages_processed + offset) for offset, data in enumerate(nlp_data)
+        ])
+        self.pages_processed += len(nlp_data)
+        logger.debug("Processed %s pages of %s", self.pages_processed, self.document.file_url)
+        if self.on_progress:
+            self.on_progress(self.pages_processed, getattr(self.loader, "page_count", None))
+    
+    def reingest(self):
+        """
+        Re-download the document and only rewrite chunks whose page content changed.
+
+        Existing chunks are matched to new pages by content hash, so unchanged pages
+        keep their ids (and the context links to them) even when they move. Changed pages
+        are inserted as new chunks, and the unmatched chunks are deleted afterwards along
+        with their context links, so a saved answer never cites text it wasn't generated
+        from. NLP, writes and search-vector refreshes therefore scale with the size of the
+        diff rather than the size of the document.
+        """
+        pages = list(self.loader.iter_pages())
+        
+        existing = defaultdict(deque)
+        chunks = DocumentChunk.objects.filter(document=self.document).order_by("page_number", "id")
+        for chunk_id, page_number, content_hash in chunks.values_list("id", "page_number", "content_hash"):
+            existing[content_hash].append((chunk_id, page_number))
+        
+        renumbered = []
+        changed = []
+        for page_number, page in enumerate(pages):
+            matches = existing[page_hash(page)]
+            if matches:
+                chunk_id, old_page_number = matches.popleft()
+                if old_page_number != page_number:
+                    renumbered.append(DocumentChunk(id=chunk_id, page_number=page_number))
+            else:
+                changed.append(page_number)
+        
+        stale_ids = sorted(chunk_id for matches in existing.values() for chunk_id, _ in matches)
+        self.stats = {
+            "unchanged": len(pages) - len(changed),
+            "moved": len(renumbered),
+            "inserted": len(changed),
+            "deleted": len(stale_ids),
+        }
+        
+        with transaction.atomic():
+            DocumentChunk.objects.bulk_update(renumbered, ["page_number"], batch_size=self.writer.batch_size)
+        
+        for page_numbers in batched(changed, self.batch_size):
+            started = time.perf_counter()
+            nlp_data = self.nlp_processor.preprocess_batch([pages[n] for n in page_numbers], batch_size=self.batch_size)
+            written = time.perf_counter()
+            self.timings["nlp"] += written - started
+            self.writer.add([self._build_chunk(data, page_number) for page_number, data in zip(page_numbers, nlp_data)])
+            self.timings["insert"] += time.perf_counter() - written
+            self.pages_processed += len(page_numbers)
+            if self.on_progress:
+                self.on_progress(self.pages_processed, len(changed))
+        
+        started = time.perf_counter()
+        self.writer.finalize()
+        # Deleted once their replacements are in, so retrieval never misses the page in between
+        for ids in batched(stale_ids, self.writer.batch_size):
+            delete_chunks(ids)
+        self.timings["insert"] += time.perf_counter() - started
+        logger.info("Re-ingested %s: %s", self.document.file_url, self.stats)
+        return self.pages_processed
+    
+    def _build_chunk(self, nlp_data, page_number):
+        return DocumentChunk(
+            document=self.document,
+            text=nlp_data["original_text"],
+            tokens_json=nlp_data["preprocessed_tokens"],
+            embedding_json=nlp_data["embeddings"].tolist(),
+            pos_json=nlp_data["pos"],
+            entity_json=nlp_data["entities"],
+            page_number=page_number,
+            content_hash=page_hash(nlp_data["original_text"])
+        )
@@ -0,0 +1,187 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from ai.lib.ingestion import DocumentIngestor, purge_chunks
+from ai.lib.nlp import NLPPreprocessor
+from ai.models.document import DocumentChunk
+from ai.models.ingestion import IngestionJob
+from main.lib import metrics
+from main.services.s3 import S3Service
+
+logger = logging.getLogger(__name__)
+
+INGESTION_JOBS = metrics.counter("ingestion_jobs_total", "Ingestion jobs finished, by kind and outcome", ["kind", "outcome"])
+INGESTION_JOB_SECONDS = metrics.histogram(
+    "ingestion_job_duration_seconds", "Time to run an ingestion job", ["kind"],
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+)
+INGESTION_PAGES = metrics.counter("ingestion_pages_total", "Pages ingested (chunks deleted for purge jobs)", ["kind"])
+INGESTION_PAGES_PER_SECOND = metrics.histogram(
+    "ingestion_pages_per_second", "Ingestion throughput of a job, in pages per second", ["kind"],
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+)
+
+class IngestionWorker:
+    """
+    Claims pending IngestionJobs from the database and ingests their documents
+    outside the request cycle, retrying failures with exponential backoff.
+
+    Jobs are claimed with a conditional UPDATE, so any number of workers can poll
+    the same table. A RUNNING job whose updated_at heartbeat is older than the
+    lease is considered abandoned by a crashed worker and is claimed again, unless
+    it has used up its attempts, in which case it is marked as failed.
+    """
+
+    def __init__(self, name=None, lease_seconds=None, retry_delay_seconds=None):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds or settings.INGEST_JOB_LEASE_SECONDS
+        self.retry_delay_seconds = retry_delay_seconds or settings.INGEST_JOB_RETRY_DELAY_SECONDS
+        self._nlp_processor = None
+
+    @property
+    def nlp_processor(self):
+        """Load the NLP models once per worker process rather than once per job"""
+        if self._nlp_processor is None:
+            self._nlp_processor = NLPPreprocessor()
+        return self._nlp_processor
+
+    def _stale(self, now):
+        return Q(status=IngestionJob.RUNNING, updated_at__lt=now - timedelta(seconds=self.lease_seconds))
+
+    def _claimable(self, now):
+        return (
+            Q(status=IngestionJob.PENDING, run_after__lte=now)
+            | self._stale(now) & Q(attempts__lt=F("max_attempts"))
+        )
+
+    def _expire(self, now):
+        """Fail abandoned jobs that have no attempts left, so a job that keeps killing its worker stops coming back"""
+        expired = IngestionJob.objects.filter(self._stale(now), attempts__gte=F("max_attempts")).update(
+            status=IngestionJob.FAILED,
+            error="Lease expired after the last attempt",
+            finished_at=now,
+            updated_at=now
+        )
+        if expired:
+            logger.warning("Marked %s abandoned job(s) as failed after their last attempt", expired)
+
+    def claim(self):
+        """Atomically claim the next runnable job, or return None if there is none"""
+        self._expire(timezone.now())
+        while True:
+            now = timezone.now()
+            job_id = (
+                IngestionJob.objects.filter(self._claimable(now))
+                .order_by("run_after", "id")
+                .values_list("id", flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+
+            claimed = IngestionJob.objects.filter(self._claimable(now), id=job_id).update(
+                status=IngestionJob.RUNNING,
+                attempts=F("attempts") + 1,
+                worker=self.name,
+                pages_processed=0,
+                started_at=now,
+                finished_at=None,
+                updated_at=now
+            )
+            if claimed:
+                return IngestionJob.objects.select_related("document").get(id=job_id)
+            # Another worker claimed it between the SELECT and the UPDATE; try the next one
+
+    def run_once(self):
+        """Claim and process a single job; return it, or None when the queue is empty"""
+        job = self.claim()
+        if job is None:
+            return None
+        self.process(job)
+        return job
+
+    def process(self, job):
+        logger.info(
+            "Worker %s running %s of %s (job %s, attempt %s)",
+            self.name, job.kind, job.document.file_url, job.id, job.attempts
+        )
+        if job.document.removed and job.kind != IngestionJob.PURGE:
+            # Deleted while queued; the document's purge job removes whatever was written
+            logger.info("Skipping job %s: %s was removed", job.id, job.document.file_url)
+            self._succeed(job, 0)
+            INGESTION_JOBS.inc(kind=job.kind, outcome="skipped")
+            return
+        started = time.monotonic()
+        try:
+            if job.kind == IngestionJob.INGEST:
+                # A retried job starts from a clean slate rather than appending to a partial ingest
+                purge_chunks(job.document)
+            if job.kind == IngestionJob.PURGE:
+                processed = self._purge(job)
+            else:
+                ingestor = DocumentIngestor(
+                    job.document,
+                    nlp_processor=self.nlp_processor,
+                    on_progress=lambda processed, total: self._report_progress(job, processed, total)
+                )
+                if job.kind == IngestionJob.REINGEST:
+                    # Diffing against the stored chunks is idempotent, so retries need no cleanup
+                    ingestor.reingest()
+                else:
+                    ingestor.ingest()
+                processed = ingestor.pages_processed
+        except Exception as e:
+            self._fail(job, e)
+            INGESTION_JOBS.inc(kind=job.kind, outcome="failed")
+            return
+
+        self._succeed(job, processed)
+        elapsed = time.monotonic() - started
+        INGESTION_JOBS.inc(kind=job.kind, outcome="succeeded")
+        INGESTION_JOB_SECONDS.observe(elapsed, kind=job.kind)
+        INGESTION_PAGES.inc(processed, kind=job.kind)
+        if processed and elapsed > 0:
+            INGESTION_PAGES_PER_SECOND.observe(processed / elapsed, kind=job.kind)
+
+    def _purge(self, job):
+        """Delete a removed document's chunks in batches and drop its cached download"""
+        total = DocumentChunk.objects.filter(document=job.document).count()
+        # Progress counts deleted chunks rather than pages
+        deleted = purge_chunks(job.document, on_progress=lambda deleted: self._report_progress(job, deleted, total))
+        S3Service().evict_cached(job.document.file_url)
+        return deleted
+
+    def _succeed(self, job, processed):
+        job.status = IngestionJob.SUCCEEDED
+        job.pages_processed = processed
+        job.pages_total = processed
+        job.finished_at = timezone.now()
+        job.error = ""
+        job.save(update_fields=["status", "pages_processed", "pages_total", "finished_at", "error", "updated_at"])
+
+    def _report_progress(self, job, processed, total):
+        """Persist progress; the write also renews the job's lease"""
+        job.pages_processed = processed
+        job.pages_total = total
+        IngestionJob.objects.filter(id=job.id).update(
+            pages_processed=processed,
+            pages_total=total,
+            updated_at=timezone.now()
+        )
+
+    def _fail(self, job, error):
+        logger.warning("Job %s failed on attempt %s: %s", job.id, job.attempts, error)
+        job.error = "".join(traceback.format_exception(error))[-4000:]
+        job.finished_at = timezone.now()
+        if job.attempts < job.max_attempts:
+            job.status = IngestionJob.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=self.retry_delay_seconds * 2 ** (job.attempts - 1))
+        else:
+            job.status = IngestionJob.FAILED
+        job.save(update_fields=["status", "error", "finished_at", "run_after", "updated_at"])
@@ -0,0 +1,622 @@
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Optional
+import httpx
+import openai
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from ai.utils.tokens import count_tokens
+from main.lib import metrics
+
+# Pieces of generated text streamed one at a time: a word with the whitespace after it
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+LLM_REQUESTS = metrics.counter(
+    "llm_requests_total", "LLM calls by model, mode (invoke or stream) and outcome", ["model", "mode", "outcome"]
+)
+LLM_SECONDS = metrics.histogram(
+    "llm_request_duration_seconds", "Time of an LLM call, retries included", ["model", "mode"]
+)
+LLM_FIRST_TOKEN_SECONDS = metrics.histogram(
+    "llm_first_token_seconds", "Time until the first chunk of a streamed LLM answer", ["model"]
+)
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens reported by the LLM, by model and type (input or output)", ["model", "type"])
+
+def build_chat_model(model=None, json_mode=False, http_client=None, http_async_client=None):
+    """
+    A new chat model for settings.LLM_BACKEND: "openai", "fake", or the dotted
+    path of a factory called with model and json_mode. model defaults to
+    settings.LLM_MODEL; json_mode asks for a JSON object response. OpenAI
+    models use the given httpx clients and leave retries to LLMClient.
+    """
+    model = model or settings.LLM_MODEL
+    if settings.LLM_BACKEND == "openai":
+        return ChatOpenAI(
+            model=model,
+            temperature=0,
+            model_kwargs={"response_format": {"type": "json_object"}} if json_mode else {},
+            max_retries=0,
+            # Streamed answers end with a chunk carrying token usage
+            stream_usage=True,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+    if settings.LLM_BACKEND == "fake":
+        return FakeChatModel(
+            json_mode=json_mode,
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            latency_sigma=settings.FAKE_LLM_LATENCY_SIGMA,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            answer_words=settings.FAKE_LLM_ANSWER_WORDS,
+            seed=settings.FAKE_LLM_SEED,
+        )
+    return import_string(settings.LLM_BACKEND)(model=model, json_mode=json_mode)
+
+def get_chat_model(model=None, json_mode=False):
+    """The process-wide LLMClient for this model and response format"""
+    return LLMClientManager.instance().client(model or settings.LLM_MODEL, json_mode)
+
+class LLMUnavailableError(Exception):
+    """
+    The LLM did not answer: its circuit breaker is open, the call's deadline
+    passed or every retry failed. retry_after is a suggested wait in seconds,
+    when one is known.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _DeadlineExceeded(Exception):
+    pass
+
+# Errors worth retrying: the provider was unreachable, slow, rate limiting or failing
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+class CircuitBreaker:
+    """
+    Fails calls fast once the provider looks down.
+
+    After failure_threshold consecutive failures the breaker opens and
+    allow() refuses calls for reset_seconds. Then one trial call is let
+    through (half-open): its success closes the breaker, its failure opens it
+    again for another reset_seconds.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(self.reset_seconds - (self.clock() - self.opened_at), 0)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+class LatencyTracker:
+    """Durations of recent successful calls, for the hedging delay"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        """The q-th percentile of recent calls, or None until min_samples have been recorded"""
+        samples = sorted(self.samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(len(samples) * q / 100), len(samples) - 1)]
+
+class LLMClient:
+    """
+    A chat model wrapped with the manager's reliability policy.
+
+    invoke/ainvoke give up with LLMUnavailableError once deadline seconds have
+    passed, and retry RETRYABLE_ERRORS up to max_retries times with full
+    jitter (a random wait of up to retry_base_delay * 2**attempt). With hedge
+    on, a second identical request is sent if the first has not answered
+    within the p95 of recent calls, and whichever finishes first is used; a
+    sync hedge that loses keeps running in its thread until it returns. Other
+    errors (bad requests, authentication) are raised as they are. stream
+    and astream retry only failures before the first chunk and are not
+    hedged, and rely on the HTTP timeout instead of the deadline.
+
+    async_model, if given, returns the model to await on the running event
+    loop (its connections can't be used from another loop); otherwise model
+    serves async calls too.
+    """
+
+    def __init__(self, model, breaker, executor, deadline, max_retries, retry_base_delay, hedge, latencies=None, name=None,
+                 async_model=None):
+        self.model = model
+        self.async_model = async_model or (lambda: model)
+        # Label of the client's metrics
+        self.name = name or getattr(model, "model_name", None) or type(model).__name__
+        self.breaker = breaker
+        self.executor = executor
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.hedge = hedge
+        self.latencies = latencies or LatencyTracker(min_samples=settings.LLM_HEDGE_MIN_SAMPLES)
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise LLMUnavailableError("The LLM provider is unavailable", retry_after=self.breaker.retry_after())
+
+    def _hedge_delay(self):
+        return self.latencies.percentile(95) if self.hedge else None
+
+    def _backoff(self, attempt):
+        return random.uniform(0, self.retry_base_delay * 2 ** attempt)
+
+    def _timed_invoke(self, messages):
+        started = time.monotonic()
+        result = self.model.invoke(messages)
+        self.latencies.record(time.monotonic() - started)
+        return result
+
+    async def _atimed_invoke(self, messages):
+        started = time.monotonic()
+        result = await self.async_model().ainvoke(messages)
+        self.latencies.record(time.monotonic() - started)
+        return result
+
+    def _call(self, messages, deadline):
+        futures = [self.executor.submit(self._timed_invoke, messages)]
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None:
+            done, _ = wait(futures, timeout=max(min(hedge_delay, deadline - time.monotonic()), 0))
+            if not done and deadline > time.monotonic():
+                futures.append(self.executor.submit(self._timed_invoke, messages))
+        pending = set(futures)
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise _DeadlineExceeded()
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _acall(self, messages, deadline):
+        tasks = [asyncio.ensure_future(self._atimed_invoke(messages))]
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=max(min(hedge_delay, deadline - time.monotonic()), 0))
+                if not done and deadline > time.monotonic():
+                    tasks.append(asyncio.ensure_future(self._atimed_invoke(messages)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise _DeadlineExceeded()
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @contextmanager
+    def _observe(self, mode):
+        """Count a call by outcome and time it, retries and backoff included"""
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            yield
+            outcome = "success"
+        except LLMUnavailableError:
+            outcome = "unavailable"
+            raise
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            LLM_REQUESTS.inc(model=self.name, mode=mode, outcome=outcome)
+            LLM_SECONDS.observe(time.monotonic() - started, model=self.name, mode=mode)
+
+    def _count_tokens(self, message):
+        usage = getattr(message, "usage_metadata", None) or {}
+        for kind in ("input", "output"):
+            if usage.get(f"{kind}_tokens"):
+                LLM_TOKENS.inc(usage[f"{kind}_tokens"], model=self.name, type=kind)
+
+    def invoke(self, messages):
+        with self._observe("invoke"):
+            result = self._invoke(messages)
+        self._count_tokens(result)
+        return result
+
+    async def ainvoke(self, messages):
+        with self._observe("invoke"):
+            result = await self._ainvoke(messages)
+        self._count_tokens(result)
+        return result
+
+    def stream(self, messages):
+        with self._observe("stream"):
+            started = time.monotonic()
+            first = True
+            for chunk in self._stream(messages):
+                if first:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.monotonic() - started, model=self.name)
+                    first = False
+                self._count_tokens(chunk)
+                yield chunk
+
+    async def astream(self, messages):
+        with self._observe("stream"):
+            started = time.monotonic()
+            first = True
+            async for chunk in self._astream(messages):
+                if first:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.monotonic() - started, model=self.name)
+                    first = False
+                self._count_tokens(chunk)
+                yield chunk
+
+    def _invoke(self, messages):
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                result = self._call(messages, deadline)
+            except _DeadlineExceeded:
+                self.breaker.record_failure()
+                raise LLMUnavailableError(f"The LLM did not answer within {self.deadline}s")
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                delay = self._backoff(attempt)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    raise LLMUnavailableError(f"The LLM call failed: {e}") from e
+                time.sleep(delay)
+            except Exception:
+                # The provider answered, just not with a result
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _ainvoke(self, messages):
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                result = await self._acall(messages, deadline)
+            except _DeadlineExceeded:
+                self.breaker.record_failure()
+                raise LLMUnavailableError(f"The LLM did not answer within {self.deadline}s")
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                delay = self._backoff(attempt)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    raise LLMUnavailableError(f"The LLM call failed: {e}") from e
+                await asyncio.sleep(delay)
+            except Exception:
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def _stream(self, messages):
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            started = False
+            try:
+                for chunk in self.model.stream(messages):
+                    started = True
+                    yield chunk
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                # Chunks already sent can't be taken back, so only a stream that never started is retried
+                if started or attempt == self.max_retries:
+                    raise LLMUnavailableError(f"The LLM stream failed: {e}") from e
+                time.sleep(self._backoff(attempt))
+            except Exception:
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return
+
+    async def _astream(self, messages):
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            started = False
+            try:
+                async for chunk in self.async_model().astream(messages):
+                    started = True
+                    yield chunk
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                if started or attempt == self.max_retries:
+                    raise LLMUnavailableError(f"The LLM stream failed: {e}") from e
+                await asyncio.sleep(self._backoff(attempt))
+            except Exception:
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return
+
+class LLMClientManager:
+    """
+    Process-wide owner of the LLM clients, created on first use.
+
+    Clients are kept per (model, json_mode) and share keep-alive httpx
+    connection pools, so calls reuse open connections instead of setting up
+    a new client and TLS handshake per request: one pool for sync calls, and
+    one per event loop for async calls, since an async connection belongs to
+    the loop that opened it. They also share
+    one circuit breaker, since they all talk to the same provider, and one
+    thread pool running sync calls so deadlines and hedges can be enforced.
+    Changing any LLM_ or FAKE_LLM_ setting (e.g. with override_settings)
+    discards the manager.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS)
+        self.executor = ThreadPoolExecutor(max_workers=settings.LLM_MAX_CONNECTIONS, thread_name_prefix="llm")
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_SECONDS
+        )
+        timeout = httpx.Timeout(settings.LLM_DEADLINE_SECONDS, connect=5.0)
+        self._limits, self._timeout = limits, timeout
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        # Per event loop, dropped along with the loop
+        self._async_http_clients = weakref.WeakKeyDictionary()
+        self._async_models = weakref.WeakKeyDictionary()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def reset(cls):
+        with cls._instance_lock:
+            manager, cls._instance = cls._instance, None
+        if manager is not None:
+            manager.executor.shutdown(wait=False)
+            manager.http_client.close()
+            for loop, http_async_client in list(manager._async_http_clients.items()):
+                _close_on_loop(loop, http_async_client)
+
+    def async_http_client(self):
+        """The async connection pool of the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_http_clients:
+                self._async_http_clients[loop] = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+            return self._async_http_clients[loop]
+
+    def _async_model(self, model, json_mode):
+        loop = asyncio.get_running_loop()
+        http_async_client = self.async_http_client()
+        with self._lock:
+            models = self._async_models.setdefault(loop, {})
+            if (model, json_mode) not in models:
+                models[(model, json_mode)] = build_chat_model(model, json_mode, self.http_client, http_async_client)
+            return models[(model, json_mode)]
+
+    def client(self, model, json_mode=False):
+        with self._lock:
+            key = (model, json_mode)
+            if key not in self._clients:
+                self._clients[key] = LLMClient(
+                    build_chat_model(model, json_mode, self.http_client),
+                    breaker=self.breaker,
+                    executor=self.executor,
+                    deadline=settings.LLM_DEADLINE_SECONDS,
+                    max_retries=settings.LLM_MAX_RETRIES,
+                    retry_base_delay=settings.LLM_RETRY_BASE_DELAY_MS / 1000,
+                    hedge=settings.LLM_HEDGE,
+                    name=model,
+                    async_model=lambda: self._async_model(model, json_mode)
+                )
+            return self._clients[key]
+
+def _close_on_loop(loop, http_async_client):
+    """Close an async httpx client on the loop its connections belong to"""
+    if loop.is_closed():
+        # Its connections were dropped with the loop
+        return
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(http_async_client.aclose(), loop)
+        return
+    try:
+        loop.run_until_complete(http_async_client.aclose())
+    except RuntimeError:
+        # Another loop is running in this thread; the connections go when the loop is closed
+        pass
+
+@receiver(setting_changed)
+def _reset_llm_clients(setting, **kwargs):
+    if setting.startswith(("LLM_", "FAKE_LLM_")):
+        LLMClientManager.reset()
+
+# One latency generator per seed, shared by every FakeChatModel in the process
+_latency_rngs = {}
+_latency_lock = threading.Lock()
+
+class FakeChatModel(BaseChatModel):
+    """
+    A local stand-in for the chat model, for load tests and profiling without
+    an API key.
+
+    The reply is deterministic for a given prompt: answer_words words drawn
+    from the prompt's own text, as a {"answer", "reason"} object in json_mode
+    and plain text otherwise. Time to first token follows a lognormal
+    distribution with median latency_ms and shape latency_sigma (0 makes it
+    fixed), drawn from a generator seeded with seed, so a run's sequence of
+    latencies is reproducible. The remaining tokens follow at
+    tokens_per_second (0 sends them at once). invoke and ainvoke take as long
+    as streaming the whole reply would; the async methods sleep without
+    blocking the event loop.
+    """
+
+    json_mode: bool = False
+    latency_ms: float = 800.0
+    latency_sigma: float = 0.0
+    tokens_per_second: float = 0.0
+    answer_words: int = 60
+    seed: Optional[int] = None
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _first_token_delay(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        with _latency_lock:
+            rng = _latency_rngs.setdefault(self.seed, random.Random(self.seed))
+            return self.latency_ms / 1000 * math.exp(self.latency_sigma * rng.gauss(0, 1))
+
+    def _token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _reply(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        question = next((message.content for message in reversed(messages) if isinstance(message, HumanMessage)), "")
+        context = next((message.content for message in messages if isinstance(message, SystemMessage)), prompt)
+        words = re.findall(r"[A-Za-z][A-Za-z'-]*", context) or ["lorem"]
+        rng = random.Random(f"{self.seed}:{prompt}")
+        answer = " ".join(rng.choices(words, k=self.answer_words))
+        if self.json_mode:
+            reason = f"Fake LLM response to: {question}"
+            return json.dumps({"answer": answer, "reason": reason}), prompt
+        return answer, prompt
+
+    def _message(self, content, prompt, pieces):
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": count_tokens(prompt),
+                "output_tokens": pieces,
+                "total_tokens": count_tokens(prompt) + pieces,
+            }
+        )
+
+    def _chunk(self, piece, prompt, pieces, index):
+        # Like OpenAI with stream_usage, the last chunk reports the token usage of the whole answer
+        if index < len(pieces) - 1:
+            return AIMessageChunk(content=piece)
+        return AIMessageChunk(content=piece, usage_metadata=self._message("", prompt, len(pieces)).usage_metadata)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        content, prompt = self._reply(messages)
+        pieces = TOKEN_PATTERN.findall(content)
+        time.sleep(self._first_token_delay() + self._token_delay() * max(len(pieces) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=self._message(content, prompt, len(pieces)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        content, prompt = self._reply(messages)
+        pieces = TOKEN_PATTERN.findall(content)
+        await asyncio.sleep(self._first_token_delay() + self._token_delay() * max(len(pieces) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=self._message(content, prompt, len(pieces)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        content, prompt = self._reply(messages)
+        pieces = TOKEN_PATTERN.findall(content)
+        delay = self._first_token_delay()
+        for index, piece in enumerate(pieces):
+            time.sleep(delay)
+            delay = self._token_delay()
+            chunk = ChatGenerationChunk(message=self._chunk(piece, prompt, pieces, index))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        content, prompt = self._reply(messages)
+        pieces = TOKEN_PATTERN.findall(content)
+        delay = self._first_token_delay()
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(delay)
+            delay = self._token_delay()
+            chunk = ChatGenerationChunk(message=self._chunk(piece, prompt, pieces, index))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
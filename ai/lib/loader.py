@@ -1,16 +1,65 @@
-import tempfile
+import io
 import os
-from typing import List
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterator, List, Optional, Tuple
+import docx2txt
+from pypdf import PdfReader
+from django.conf import settings
 from main.services.s3 import S3Service
 
+# PdfReader over the shared document, opened once per extraction worker process
+_worker_reader = None
+
+def _init_pdf_worker(content: bytes):
+    """Open the in-memory PDF once when an extraction worker starts."""
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(content))
+
+def _extract_page_range(page_range: Tuple[int, int]) -> List[str]:
+    """Extract the text of pages [start, end) in an extraction worker."""
+    start, end = page_range
+    return [_worker_reader.pages[number].extract_text(extraction_mode="plain").strip() for number in range(start, end)]
+
+def _split_page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split page numbers into at most `parts` contiguous, ordered ranges."""
+    size = max(1, -(-page_count // parts))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+class _InMemorySource:
+    """Serves already-downloaded bytes to DocumentLoader in place of S3Service."""
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def download_file_to_stream(self, key: str, spool_threshold: int = 0) -> IO[bytes]:
+        return io.BytesIO(self.content)
+
+def parse_document(document: Tuple[str, bytes]) -> Tuple[str, List[str]]:
+    """
+    Parse a downloaded (key, content) pair into (key, pages).
+
+    Module-level and free of Django settings so ingestion pipelines can run it in worker processes.
+    """
+    key, content = document
+    loader = DocumentLoader(key, s3_service=_InMemorySource(content), spool_threshold=0, lazy=True, workers=1)
+    return key, loader.get_pages()
+
 class DocumentLoader:
-    def __init__(self, s3_key: str):
+    def __init__(self, s3_key: str, s3_service: Optional[S3Service] = None, spool_threshold: Optional[int] = None,
+                 lazy: bool = False, workers: Optional[int] = None):
         self.s3_key = s3_key
         self.file_extension = self._extract_file_extension(s3_key)
-        self.s3_service = S3Service()
-        self.pages = self.load(s3_key)
-    
+        self.s3_service = s3_service or S3Service()
+        # Downloads larger than this many bytes spill from memory to an anonymous temp file
+        self.spool_threshold = settings.DOCUMENT_SPOOL_THRESHOLD if spool_threshold is None else spool_threshold
+        # Number of processes extracting PDF pages; 1 keeps extraction in this process
+        self.workers = settings.DOCUMENT_EXTRACT_WORKERS if workers is None else workers
+        # Number of pages in the source, known once parsing has started
+        self.page_count = None
+        # In lazy mode nothing is downloaded until iter_pages() is consumed
+        self.pages = None if lazy else self.load(s3_key)
+
     def _extract_file_extension(self, s3_key: str) -> str:
         """Extract file extension from S3 key."""
         # Extract extension and remove the dot
@@ -19,81 +68,100 @@ class DocumentLoader:
 
     def load(self, s3_key: str) -> List[str]:
         """Load document based on file extension and return page content."""
+        return list(self._iter_source(s3_key))
+
+    def iter_pages(self) -> Iterator[str]:
+        """Yield page contents one at a time, parsing them on demand in lazy mode."""
+        if self.pages is not None:
+            yield from self.pages
+        else:
+            yield from self._iter_source(self.s3_key)
+
+    def _iter_source(self, s3_key: str) -> Iterator[str]:
+        """Yield page contents based on file extension."""
         if self.file_extension == 'pdf':
-            return self._load_pdf(s3_key)
+            return self._iter_pdf(s3_key)
         elif self.file_extension == 'docx':
-            return self._load_docx(s3_key)
+            return self._iter_docx(s3_key)
         else:
             raise ValueError(f"Unsupported file extension: {self.file_extension}")
-    
-    def _load_pdf(self, s3_key: str) -> List[str]:
-        """Load PDF document from S3 and return content per page."""
-        # Download file content to memory
-        file_content = self.s3_service.download_file_to_memory(s3_key)
-        if file_content is None:
-            raise ValueError(f"Failed to download file from S3: {s3_key}")
-        
-        # Create a temporary file to work with LangChain loaders
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
-        try:
-            # Use LangChain PyPDFLoader
-            loader = PyPDFLoader(temp_file_path)
-            documents = loader.load()
-            
-            # Extract page content from each document
-            pages = [doc.page_content.strip() for doc in documents if doc.page_content.strip()]
-            
-            return pages
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-    
-    def _load_docx(self, s3_key: str) -> List[str]:
-        """Load DOCX document from S3 and return content per logical section."""
-        # Download file content to memory
-        file_content = self.s3_service.download_file_to_memory(s3_key)
-        if file_content is None:
+
+    def _open_stream(self, s3_key: str) -> IO[bytes]:
+        """Download the S3 object into a seekable in-memory (spooled) stream."""
+        stream = self.s3_service.download_file_to_stream(s3_key, spool_threshold=self.spool_threshold)
+        if stream is None:
             raise ValueError(f"Failed to download file from S3: {s3_key}")
-        
-        # Create a temporary file to work with LangChain loaders
-        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
+        return stream
+
+    def _iter_pdf(self, s3_key: str) -> Iterator[str]:
+        """Load PDF document from S3 and yield content per page."""
+        with self._open_stream(s3_key) as stream:
+            yield from self._parse_pdf(stream)
+
+    def _parse_pdf(self, stream: IO[bytes]) -> Iterator[str]:
+        """Extract non-empty page text from a PDF stream, matching LangChain's PyPDFLoader output."""
+        reader = PdfReader(stream)
+        page_count = self.page_count = len(reader.pages)
+        if self.workers > 1 and page_count >= settings.DOCUMENT_EXTRACT_MIN_PAGES:
+            yield from self._parse_pdf_parallel(stream, page_count)
+            return
+
+        for page in reader.pages:
+            content = page.extract_text(extraction_mode="plain").strip()
+            if content:
+                yield content
+
+    def _parse_pdf_parallel(self, stream: IO[bytes], page_count: int) -> Iterator[str]:
+        """Extract page ranges of the same in-memory PDF across a process pool, preserving page order."""
+        stream.seek(0)
+        content = stream.read()
+        # Several ranges per worker so one slow range (e.g. dense OCR text) doesn't stall the pool
+        page_ranges = _split_page_ranges(page_count, self.workers * 4)
+
+        executor = ProcessPoolExecutor(
+            max_workers=min(self.workers, len(page_ranges)),
+            # spawn avoids forking a process that already holds model threads and DB connections
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pdf_worker,
+            initargs=(content,)
+        )
         try:
-            # Use LangChain Docx2txtLoader
-            loader = Docx2txtLoader(temp_file_path)
-            documents = loader.load()
-            
-            # For DOCX, split content by page breaks or double newlines to simulate pages
-            pages = []
-            for doc in documents:
-                content = doc.page_content.strip()
-                if content:
-                    # Split by page breaks (\f) or double newlines as logical page separators
-                    page_splits = content.split('\f')  # Form feed character used for page breaks
-                    if len(page_splits) == 1:
-                        # If no page breaks found, split by double newlines as sections
-                        page_splits = [section.strip() for section in content.split('\n\n') if section.strip()]
-                    else:
-                        page_splits = [page.strip() for page in page_splits if page.strip()]
-                    
-                    pages.extend(page_splits)
-            
-            # If no logical splits found, return the entire content as one page
-            if not pages and documents:
-                full_content = '\n'.join([doc.page_content.strip() for doc in documents if doc.page_content.strip()])
-                if full_content:
-                    pages = [full_content]
-            
-            return pages
+            # map() yields results in submission order while later ranges are still extracting
+            for texts in executor.map(_extract_page_range, page_ranges):
+                for text in texts:
+                    if text:
+                        yield text
         finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-    
+            executor.shutdown(cancel_futures=True)
+
+    def _iter_docx(self, s3_key: str) -> Iterator[str]:
+        """Load DOCX document from S3 and yield content per logical section."""
+        # docx2txt extracts the whole body at once, so sections are split up front
+        with self._open_stream(s3_key) as stream:
+            pages = self._parse_docx(stream)
+        self.page_count = len(pages)
+        yield from pages
+
+    def _parse_docx(self, stream: IO[bytes]) -> List[str]:
+        """Split DOCX text from a stream into logical pages, matching LangChain's Docx2txtLoader output."""
+        content = docx2txt.process(stream).strip()
+        if not content:
+            return []
+
+        # For DOCX, split content by page breaks or double newlines to simulate pages
+        # Split by page breaks (\f) or double newlines as logical page separators
+        page_splits = content.split('\f')  # Form feed character used for page breaks
+        if len(page_splits) == 1:
+            # If no page breaks found, split by double newlines as sections
+            pages = [section.strip() for section in content.split('\n\n') if section.strip()]
+        else:
+            pages = [page.strip() for page in page_splits if page.strip()]
+
+        # If no logical splits found, return the entire content as one page
+        return pages or [content]
+
     def get_pages(self) -> List[str]:
         """Get the loaded page contents as an array of strings."""
+        if self.pages is None:
+            self.pages = self.load(self.s3_key)
         return self.pages
@@ -1,14 +1,25 @@
+import time
 import spacy
 # import onnxruntime as ort
 # from transformers import PreTrainedTokenizerFast
 from sentence_transformers import SentenceTransformer
 # import numpy as np
 # import os
+from main.lib import metrics
+
+MODEL_LOAD_SECONDS = metrics.histogram(
+    "model_load_seconds", "Time to load an NLP model into memory", ["model"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
 
 class NLPPreprocessor:
     def __init__(self):
+        started = time.perf_counter()
         self.nlp_model = spacy.load("en_core_web_md")
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - started, model="en_core_web_md")
+        started = time.perf_counter()
         self.sbert_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - started, model="all-MiniLM-L6-v2")
         
         # # Setup ONNX model and tokenizer for all-MiniLM-L6-v2
         # model_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../models/all-MiniLM-L6-v2"))
@@ -34,33 +45,62 @@ class NLPPreprocessor:
         }
     
     def preprocess(self, original_text):
-        """Main preprocessing pipeline"""
+        """Main preprocessing pipeline; the results are also kept on the instance for get_data()"""
         self.original_text = original_text
         self.doc = self.nlp_model(original_text)
 
-        self.original_tokens = self._extract_tokens()
-        self.pos = self._extract_pos()
-        self.entities = self._extract_entities()
+        data = self._analyze(original_text, self.doc)
+        for key, value in data.items():
+            setattr(self, key, value)
+        
+        self.embeddings = self._extract_embeddings()
+
+        return self.get_data()
+    
+    def preprocess_batch(self, original_texts, batch_size=32):
+        """
+        Preprocessing pipeline for several texts, batching spaCy and SBERT inference.
+        Keeps no state on the instance, so several threads can share one preprocessor.
+        """
+        results = [
+            self._analyze(original_text, doc)
+            for original_text, doc in zip(original_texts, self.nlp_model.pipe(original_texts, batch_size=batch_size))
+        ]
+        
+        embeddings = self.sbert_model.encode(
+            [result["preprocessed_text"] for result in results],
+            batch_size=batch_size,
+            convert_to_tensor=False
+        )
+        for result, embedding in zip(results, embeddings):
+            result["embeddings"] = embedding
         
-        preprocessed_tokens = self._lemmatize()
+        return results
+    
+    def _analyze(self, original_text, doc):
+        """Tokens, tags, entities and the preprocessed text of a parsed doc, without embeddings"""
+        preprocessed_tokens = self._lemmatize(doc)
         preprocessed_tokens = self._remove_stopwords(preprocessed_tokens)
         preprocessed_tokens = self._remove_punctuation(preprocessed_tokens)
         preprocessed_tokens = self._remove_whitespace_tokens(preprocessed_tokens)
         # preprocessed_tokens = self._remove_numbers(preprocessed_tokens)
-        self.preprocessed_tokens = preprocessed_tokens
-        self.preprocessed_text = " ".join(preprocessed_tokens)
-        
-        self.embeddings = self._extract_embeddings()
-
-        return self.get_data()
+        return {
+            "original_text": original_text,
+            "original_tokens": self._extract_tokens(doc),
+            "embeddings": None,
+            "pos": self._extract_pos(doc),
+            "entities": self._extract_entities(doc),
+            "preprocessed_tokens": preprocessed_tokens,
+            "preprocessed_text": " ".join(preprocessed_tokens)
+        }
     
-    def _extract_tokens(self):
+    def _extract_tokens(self, doc=None):
         """Extract tokens from the text"""
-        return [token.text for token in self.doc]
+        return [token.text for token in (self.doc if doc is None else doc)]
     
-    def _lemmatize(self):
+    def _lemmatize(self, doc=None):
         """Lemmatize tokens"""
-        return [token.lemma_.lower() for token in self.doc]
+        return [token.lemma_.lower() for token in (self.doc if doc is None else doc)]
     
     def _remove_stopwords(self, preprocessed_tokens):
         """Remove stopwords from tokens"""
@@ -104,10 +144,10 @@ class NLPPreprocessor:
         embedding = self.sbert_model.encode(text, convert_to_tensor=False)
         return embedding
     
-    def _extract_pos(self):
+    def _extract_pos(self, doc=None):
         """Extract part-of-speech tags"""
-        return [(token.text, token.pos_, token.tag_) for token in self.doc]
+        return [(token.text, token.pos_, token.tag_) for token in (self.doc if doc is None else doc)]
     
-    def _extract_entities(self):
+    def _extract_entities(self, doc=None):
         """Extract named entities"""
-        return [(ent.text, ent.label_, ent.start_char, ent.end_char) for ent in self.doc.ents]
+        return [(ent.text, ent.label_, ent.start_char, ent.end_char) for ent in (self.doc if doc is None else doc).ents]
@@ -0,0 +1,306 @@
+import time
+import heapq
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+# Marks the end of a stage's input
+_DONE = object()
+
+def _timed_call(fn, payload):
+    """Run fn in a worker process and report how long it took there."""
+    started = time.perf_counter()
+    result = fn(payload)
+    return result, time.perf_counter() - started
+
+class _Envelope:
+    """An item in flight: its position in the input, the input item itself, the current payload and any error."""
+
+    __slots__ = ("seq", "key", "payload", "error")
+
+    def __init__(self, seq, key, payload, error=None):
+        self.seq = seq
+        self.key = key
+        self.payload = payload
+        self.error = error
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    Thread stages suit I/O and code that releases the GIL (downloads, model
+    inference); process stages suit pure-Python CPU work such as PDF parsing,
+    and need a picklable module-level fn. initializer/initargs set up each
+    worker process of a process stage.
+    """
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1, kind: str = THREAD,
+                 initializer: Optional[Callable] = None, initargs: tuple = ()):
+        if kind not in (self.THREAD, self.PROCESS):
+            raise ValueError(f"Unknown stage kind: {kind}")
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.kind = kind
+        self.initializer = initializer
+        self.initargs = initargs
+        self.items = 0
+        # Seconds spent running fn, waiting for input, and blocked on a full output queue
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _record(self, busy=0.0, wait=0.0, blocked=0.0, items=0):
+        with self._lock:
+            self.busy_seconds += busy
+            self.wait_seconds += wait
+            self.blocked_seconds += blocked
+            self.items += items
+
+class Pipeline:
+    """
+    Runs items through a chain of stages connected by bounded queues, so that
+    downloading, parsing, NLP and database writes of different items overlap.
+
+    The source iterable is consumed in a feeder thread (timed as the source
+    stage), each stage runs in its own workers, and the sink runs in the calling
+    thread, which keeps database access on the caller's connection. A full queue
+    blocks the stage feeding it, so a slow stage throttles everything upstream
+    instead of letting work pile up in memory. The sink sees items in input
+    order regardless of how many workers a stage has.
+
+    An exception raised for one item is passed to on_error(item, error) in the
+    calling thread and the item skips the remaining stages; without on_error
+    the pipeline stops and the exception is raised from run().
+    """
+
+    def __init__(self, stages: List[Stage], sink: Stage, queue_size: int = 4, source_name: str = "source",
+                 on_error: Optional[Callable[[Any, Exception], None]] = None):
+        self.source = Stage(source_name, None)
+        self.stages = stages
+        self.sink = sink
+        self.queue_size = queue_size
+        self.on_error = on_error
+        self.wall_seconds = 0.0
+        self._stop = threading.Event()
+        self._failure = None
+
+    def _put(self, stage, out_queue, envelope):
+        """Blocking put that gives up once the pipeline is stopping; returns False in that case"""
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                out_queue.put(envelope, timeout=0.1)
+                stage._record(blocked=time.perf_counter() - started)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, stage, in_queue):
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                envelope = in_queue.get(timeout=0.1)
+                stage._record(wait=time.perf_counter() - started)
+                return envelope
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _abort(self, error):
+        if self._failure is None:
+            self._failure = error
+        self._stop.set()
+
+    def _feed(self, items, out_queue):
+        seq = 0
+        iterator = iter(items)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                self.source._record(busy=time.perf_counter() - started, items=1)
+                if not self._put(self.source, out_queue, _Envelope(seq, item, item)):
+                    return
+                seq += 1
+        except Exception as e:
+            # A failing source (e.g. an unreadable download) can't be attributed to one item
+            self._abort(e)
+            return
+        self._put(self.source, out_queue, _DONE)
+
+    def _run_thread_worker(self, stage, in_queue, out_queue, finished):
+        while (envelope := self._get(stage, in_queue)) is not _DONE:
+            if envelope.error is None:
+                started = time.perf_counter()
+                try:
+                    envelope.payload = stage.fn(envelope.payload)
+                except Exception as e:
+                    envelope.error = e
+                    if self.on_error is None:
+                        self._abort(e)
+                stage._record(busy=time.perf_counter() - started, items=1)
+            if not self._put(stage, out_queue, envelope):
+                return
+        # Let sibling workers see the end of input, and signal downstream once the last worker is done
+        try:
+            in_queue.put_nowait(_DONE)
+        except queue.Full:
+            # Only possible while stopping, when nobody is waiting for it
+            pass
+        if finished():
+            self._put(stage, out_queue, _DONE)
+
+    def _start_thread_stage(self, stage, in_queue, out_queue):
+        remaining = [stage.workers]
+        lock = threading.Lock()
+
+        def finished():
+            with lock:
+                remaining[0] -= 1
+                return remaining[0] == 0
+
+        return [
+            threading.Thread(target=self._run_thread_worker, args=(stage, in_queue, out_queue, finished),
+                             name=f"pipeline-{stage.name}-{number}", daemon=True)
+            for number in range(stage.workers)
+        ]
+
+    def _start_process_stage(self, stage, in_queue, out_queue, executors):
+        executor = ProcessPoolExecutor(
+            max_workers=stage.workers,
+            # spawn avoids forking a process that already holds model threads and DB connections
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=stage.initializer,
+            initargs=stage.initargs
+        )
+        executors.append(executor)
+        # Bound the submitted-but-unfinished work so the executor's own queue can't grow without limit
+        slots = threading.Semaphore(stage.workers * 2)
+        pending = queue.Queue()
+
+        def submit():
+            try:
+                while (envelope := self._get(stage, in_queue)) is not _DONE:
+                    while not slots.acquire(timeout=0.1):
+                        if self._stop.is_set():
+                            return
+                    future = None
+                    if envelope.error is None:
+                        try:
+                            future = executor.submit(_timed_call, stage.fn, envelope.payload)
+                        except Exception as e:
+                            # e.g. BrokenProcessPool once a worker was killed; every later item fails the same way
+                            envelope.error = e
+                            if self.on_error is None:
+                                self._abort(e)
+                                return
+                    pending.put((envelope, future))
+            finally:
+                pending.put(_DONE)
+
+        def collect():
+            while (entry := pending.get()) is not _DONE:
+                envelope, future = entry
+                if future is not None:
+                    try:
+                        envelope.payload, seconds = future.result()
+                        stage._record(busy=seconds, items=1)
+                    except Exception as e:
+                        envelope.error = e
+                        if self.on_error is None:
+                            self._abort(e)
+                slots.release()
+                if not self._put(stage, out_queue, envelope):
+                    return
+            self._put(stage, out_queue, _DONE)
+
+        return [
+            threading.Thread(target=submit, name=f"pipeline-{stage.name}-submit", daemon=True),
+            threading.Thread(target=collect, name=f"pipeline-{stage.name}-collect", daemon=True),
+        ]
+
+    def run(self, items: Iterable[Any]):
+        """Push every item through the stages into the sink; returns once the sink has seen them all"""
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        executors = []
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name="pipeline-source", daemon=True)]
+        for stage, in_queue, out_queue in zip(self.stages, queues, queues[1:]):
+            if stage.kind == Stage.PROCESS:
+                threads.extend(self._start_process_stage(stage, in_queue, out_queue, executors))
+            else:
+                threads.extend(self._start_thread_stage(stage, in_queue, out_queue))
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._drain(queues[-1])
+        except BaseException as e:
+            self._abort(e)
+            raise
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            for executor in executors:
+                executor.shutdown(cancel_futures=True)
+            self.wall_seconds = time.perf_counter() - started
+
+        if self._failure is not None:
+            raise self._failure
+
+    def _drain(self, in_queue):
+        """Run the sink in the calling thread, restoring input order with a small reorder buffer"""
+        next_seq = 0
+        reorder = []
+        while (envelope := self._get(self.sink, in_queue)) is not _DONE:
+            heapq.heappush(reorder, (envelope.seq, id(envelope), envelope))
+            while reorder and reorder[0][0] == next_seq:
+                envelope = heapq.heappop(reorder)[2]
+                next_seq += 1
+                if envelope.error is not None:
+                    if self.on_error is not None:
+                        self.on_error(envelope.key, envelope.error)
+                    continue
+                started = time.perf_counter()
+                try:
+                    self.sink.fn(envelope.payload)
+                except Exception as e:
+                    if self.on_error is None:
+                        raise
+                    self.on_error(envelope.key, e)
+                self.sink._record(busy=time.perf_counter() - started, items=1)
+
+    def metrics(self):
+        """
+        Per-stage counters, in pipeline order.
+
+        utilization is busy time over the time the stage's workers were available;
+        a stage near 1.0 is the bottleneck, and large blocked_seconds upstream of it
+        show backpressure.
+        """
+        wall = self.wall_seconds or 1e-9
+        return [
+            {
+                "stage": stage.name,
+                "kind": stage.kind,
+                "workers": stage.workers,
+                "items": stage.items,
+                "busy_seconds": stage.busy_seconds,
+                "wait_seconds": stage.wait_seconds,
+                "blocked_seconds": stage.blocked_seconds,
+                "utilization": min(1.0, stage.busy_seconds / (stage.workers * wall)),
+            }
+            for stage in [self.source, *self.stages, self.sink]
+        ]
@@ -1,9 +1,16 @@
 from ai.lib.nlp import NLPPreprocessor
 from ai.models.document import DocumentChunk, Document
-from django.contrib.postgres.search import SearchRank, SearchVector
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
 from ai.utils.retrieval import cosine_sim
+from main.lib.tracing import span
+from functools import reduce
 import numpy as np
 import json
+import logging
+import operator
+
+logger = logging.getLogger(__name__)
 
 class HybridRetriever():
     def __init__(self, BOOST=0.1, sparse_k=10, dense_k=3):
@@ -11,10 +18,16 @@ class HybridRetriever():
         self.BOOST = BOOST
         self.sparse_k = sparse_k
         self.dense_k = dense_k
+        self.query_embedding = None
         
     def _preprocess_query(self, query):
         return self.nlp_preprocessor.preprocess(query)
     
+    @staticmethod
+    def _search_query(query):
+        # Chunks sharing any term with the query; a single plain query would require all of them
+        return reduce(operator.or_, (SearchQuery(term) for term in query.split() or [query]))
+    
     @staticmethod
     def _has_matching_entity(doc_entities, query_entities):
         doc_ents = set([ent[0] for ent in doc_entities])
@@ -22,42 +35,46 @@ class HybridRetriever():
         return not doc_ents.isdisjoint(query_ents)
     
     def retrieve(self, query):
-        preprocessed_query = self._preprocess_query(query)
+        with span("query_nlp"):
+            preprocessed_query = self._preprocess_query(query)
         
         query_emb = preprocessed_query.get("embeddings")
         query_entities = preprocessed_query.get("entities")
-        
-        print("ATTEMPTING SPARSE RETRIEVAL")
+        # Exposed so callers can reuse it, e.g. for the answer cache
+        self.query_embedding = query_emb
         
         # === Sparse retrieval using PostgreSQL full-text search ===
-        docs = DocumentChunk.objects.annotate(
-            rank=SearchRank(SearchVector('text'), query)
-        ).order_by('-rank')[:self.sparse_k]
-        
-        candidate_docs = docs.only("id", "document_id", "text", "embedding_json", "entity_json")
-        
-        print(f'SPARSE RETRIEVAL RESULTS: {candidate_docs}')
+        # Matching on the stored search vector lets the GIN index pick the chunks to rank
+        with span("sparse_search"):
+            search_query = self._search_query(query)
+            docs = DocumentChunk.objects.filter(document__removed=False, search_vector=search_query).annotate(
+                rank=SearchRank(F('search_vector'), search_query)
+            ).order_by('-rank')[:self.sparse_k]
+            
+            candidate_docs = list(docs.only("id", "document_id", "text", "embedding_json", "entity_json"))
         
-        print("ATTEMPTING DENSE RETRIEVAL")
+        logger.debug("Sparse retrieval results", extra={"data": {"chunk_ids": [doc.id for doc in candidate_docs]}})
         
         # === Dense embedding + entity-boosted reranking ===
-        reranked = sorted(
-            candidate_docs,
-            key=lambda doc: self._rerank_with_boost(doc, query_emb, query_entities),
-            reverse=True
-        )[:self.dense_k]
+        with span("dense_rerank"):
+            reranked = sorted(
+                candidate_docs,
+                key=lambda doc: self._rerank_with_boost(doc, query_emb, query_entities),
+                reverse=True
+            )[:self.dense_k]
         
-        print(f'DENSE RETRIEVAL RESULTS: {reranked}')
+        logger.debug("Dense retrieval results", extra={"data": {"chunk_ids": [doc.id for doc in reranked]}})
         
         # Convert DocumentChunk objects to dictionaries for JSON serialization
         result = []
-        for doc in reranked:
-            source = Document.objects.get(id=doc.document_id).description
-            result.append({
-                'id': doc.id,
-                'text': doc.text,
-                'source': source
-            })
+        with span("document_lookup"):
+            for doc in reranked:
+                source = Document.objects.get(id=doc.document_id).description
+                result.append({
+                    'id': doc.id,
+                    'text': doc.text,
+                    'source': source
+                })
 
         return result
 
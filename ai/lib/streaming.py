@@ -0,0 +1,171 @@
+import json
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class AnswerExtractor:
+    """
+    Pulls the value of one string field out of a JSON object while it is still
+    being generated, e.g. the answer of {"answer": ..., "reason": ...}.
+
+    feed() takes the next piece of raw model output and returns the newly
+    decoded text of the field, so the answer can be forwarded before the model
+    has finished the rest of the object. Escape sequences split across pieces
+    are held back until they are complete, and only keys of the outermost
+    object are matched, so a nested or quoted "answer" is ignored.
+    """
+
+    def __init__(self, field="answer"):
+        self.field = field
+        self.raw = ""
+        self.value = ""
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key = None
+        self._await_value = False
+        self._in_value = False
+
+    def feed(self, chunk):
+        self.raw += chunk
+        if self.complete:
+            return ""
+
+        decoded = []
+        text = self.raw
+        while self._pos < len(text):
+            char = text[self._pos]
+
+            if self._in_value:
+                if char == '"':
+                    self._in_value = False
+                    self.complete = True
+                    self._pos += 1
+                    break
+                if char == "\\":
+                    escape = self._read_escape(text, self._pos)
+                    if escape is None:
+                        break
+                    value, length = escape
+                    decoded.append(value)
+                    self._pos += length
+                    continue
+                decoded.append(char)
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if char == "\\":
+                    if self._pos + 1 >= len(text):
+                        break
+                    self._pos += 2
+                    continue
+                if char == '"':
+                    self._in_string = False
+                    if self._expect_key:
+                        self._key = json.loads(text[self._string_start:self._pos + 1])
+                        self._expect_key = False
+                self._pos += 1
+                continue
+
+            if self._await_value and not char.isspace():
+                self._await_value = False
+                if char == '"':
+                    self._in_value = True
+                    self._pos += 1
+                    continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char in "{[":
+                self._depth += 1
+                self._expect_key = self._depth == 1 and char == "{"
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and char == ",":
+                self._expect_key = True
+            elif self._depth == 1 and char == ":":
+                self._await_value = self._key == self.field
+                self._key = None
+            self._pos += 1
+
+        text = "".join(decoded)
+        self.value += text
+        return text
+
+    @staticmethod
+    def _read_escape(text, pos):
+        """Decode the escape sequence at pos as (text, length), or None if it is not complete yet"""
+        if pos + 1 >= len(text):
+            return None
+        if text[pos + 1] != "u":
+            length = 2
+        else:
+            length = 6
+            if pos + length > len(text):
+                return None
+            try:
+                code = int(text[pos + 2:pos + 6], 16)
+            except ValueError:
+                return text[pos + 1], 2
+            # A high surrogate is only meaningful together with the low surrogate escape after it
+            if 0xD800 <= code < 0xDC00:
+                if pos + 12 > len(text):
+                    return None
+                if text[pos + 6:pos + 8] == "\\u":
+                    length = 12
+        try:
+            return json.loads(f'"{text[pos:pos + length]}"'), length
+        except json.JSONDecodeError:
+            return text[pos + 1], 2
+
+class ClosingIterator:
+    """
+    Iterates over events and calls on_close when the response is closed, even
+    if iteration never started (closing an unstarted generator skips its
+    finally blocks).
+    """
+
+    def __init__(self, events, on_close):
+        self._events = iter(events)
+        self._on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def close(self):
+        try:
+            if hasattr(self._events, "close"):
+                self._events.close()
+        finally:
+            self._on_close()
+
+class AsyncClosingIterator:
+    """ClosingIterator for async iterators, as served to ASGI clients"""
+
+    def __init__(self, events, on_close):
+        self._events = aiter(events)
+        self._on_close = on_close
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await anext(self._events)
+
+    def close(self):
+        # Django closes the response from sync code; an unfinished async generator is finalised by the event loop
+        self._on_close()
+
+async def aiterate(items):
+    """Async iterator over items already at hand, so an ASGI response sends them without buffering"""
+    for item in items:
+        yield item
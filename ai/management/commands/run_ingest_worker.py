@@ -0,0 +1,45 @@
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ai.lib.jobs import IngestionWorker
+
+class Command(BaseCommand):
+    help = "Process queued document ingestion jobs in the background"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=2.0,
+                            help="Seconds to wait before polling again when the queue is empty")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty instead of polling forever")
+        parser.add_argument("--max-jobs", type=int, default=None,
+                            help="Exit after processing this many jobs")
+        parser.add_argument("--name", default=None, help="Worker name recorded on claimed jobs")
+
+    def handle(self, *args, **options):
+        worker = IngestionWorker(name=options["name"])
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f"Ingestion worker {worker.name} started")
+        processed = 0
+        while not self.stopping:
+            close_old_connections()
+            job = worker.run_once()
+            if job is not None:
+                processed += 1
+                self.stdout.write(f"Job {job.id}: {job.status} ({job.pages_processed} pages)")
+                if options["max_jobs"] and processed >= options["max_jobs"]:
+                    break
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
+
+        self.stdout.write(f"Ingestion worker {worker.name} stopped after {processed} jobs")
+
+    def _stop(self, signum, frame):
+        # Finish the current job, then exit at the next poll
+        self.stopping = True
@@ -0,0 +1,40 @@
+# Generated by Django 5.1 on 2026-10-19 07:41
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def build_search_vectors(apps, schema_editor):
+    # tsvector columns and GIN indexes only exist on PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "UPDATE ai_documentchunk SET search_vector = to_tsvector(COALESCE(text, '')) "
+        "WHERE search_vector IS NULL"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS ai_documentchunk_search_vector_gin "
+        "ON ai_documentchunk USING gin (search_vector)"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS ai_documentchunk_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0003_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.RunPython(build_search_vectors, drop_search_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1 on 2026-10-19 07:34
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_page_numbers(apps, schema_editor):
+    # Chunks were inserted in page order, so their ids give the original page sequence
+    DocumentChunk = apps.get_model('ai', 'DocumentChunk')
+    document_ids = DocumentChunk.objects.values_list('document_id', flat=True).distinct()
+    for document_id in document_ids:
+        chunks = list(DocumentChunk.objects.filter(document_id=document_id).order_by('id').only('id', 'text'))
+        for page_number, chunk in enumerate(chunks):
+            chunk.page_number = page_number
+            chunk.content_hash = hashlib.sha256(chunk.text.encode('utf-8')).hexdigest()
+        DocumentChunk.objects.bulk_update(chunks, ['page_number', 'content_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0004_documentchunk_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='page_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingest'), ('reingest', 'Re-ingest changed pages')], default='ingest', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='documentchunk',
+            index=models.Index(fields=['document', 'page_number'], name='ai_document_documen_1655ce_idx'),
+        ),
+        migrations.RunPython(backfill_page_numbers, migrations.RunPython.noop),
+    ]
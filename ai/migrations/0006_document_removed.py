@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-19 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0005_documentchunk_page_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='removed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='ingestionjob',
+            name='kind',
+            field=models.CharField(choices=[('ingest', 'Ingest'), ('reingest', 'Re-ingest changed pages'), ('purge', 'Purge chunks of a removed document')], default='ingest', max_length=20),
+        ),
+    ]
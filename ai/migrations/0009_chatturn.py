@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-19 08:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0008_message_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('context', models.ManyToManyField(blank=True, to='ai.documentchunk')),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ai.conversation')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='turn',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='ai.chatturn'),
+        ),
+    ]
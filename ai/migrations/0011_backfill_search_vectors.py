@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-19 09:02
+
+from django.db import migrations
+
+
+def backfill_search_vectors(apps, schema_editor):
+    # Sparse retrieval only matches stored vectors; fill any left by ingests that stopped before finalize
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "UPDATE ai_documentchunk SET search_vector = to_tsvector(COALESCE(text, '')) "
+        "WHERE search_vector IS NULL"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0010_conversation_summarized_message'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,11 @@ from ai.models.document import DocumentChunk
 class Conversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255, default="New Conversation")
+    # Rolling summary of the messages older than the history window, and the newest message it covers
+    # (its timestamp, and the message itself to tell apart messages saved at the same time)
+    summary = models.TextField(blank=True, default="")
+    summarized_until = models.DateTimeField(blank=True, null=True)
+    summarized_message = models.ForeignKey("Message", on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -16,14 +21,46 @@ class Conversation(models.Model):
     def messages(self):
         return Message.objects.filter(conversation=self)
     
+class ChatTurn(models.Model):
+    """A question and its answer, with the chunks retrieved to answer it recorded once for both messages"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE)
+    context = models.ManyToManyField(DocumentChunk, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Turn {self.id} of conversation {self.conversation_id}"
+
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE)
+    turn = models.ForeignKey(ChatTurn, on_delete=models.CASCADE, blank=True, null=True, related_name="messages")
     role = models.CharField(max_length=10)
     content = models.TextField()
+    # Only set on messages saved before turns recorded the context
     context = models.ManyToManyField(DocumentChunk, blank=True)
+    # Assistant messages: the model's explanation of the answer, and the Idempotency-Key of the request
+    reason = models.TextField(blank=True, default="")
+    idempotency_key = models.CharField(max_length=255, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Serves the newest-first, limited history window query
+            models.Index(fields=["conversation", "created_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conversation", "idempotency_key"],
+                condition=~models.Q(idempotency_key=""),
+                name="unique_message_idempotency_key"
+            ),
+        ]
+    
     def __str__(self):
         return f"Message for {self.conversation.user.username}"
+    
+    @property
+    def context_chunks(self):
+        """The chunks retrieved for this message's turn"""
+        return self.turn.context.all() if self.turn_id else self.context.all()
 
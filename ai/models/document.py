@@ -1,10 +1,13 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 import json
 import numpy as np
 
 class Document(models.Model):
     file_url = models.CharField(max_length=2000)
     description = models.TextField(blank=True, null=True)
+    # Set by DELETE; the document is hidden from retrieval at once and its chunks are purged by a background job
+    removed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -22,9 +25,19 @@ class DocumentChunk(models.Model):
     embedding_json = models.JSONField()
     pos_json = models.JSONField()
     entity_json = models.JSONField()
+    # Position of the page within the document and a hash of its text, used to diff re-ingestions
+    page_number = models.PositiveIntegerField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    # Precomputed to_tsvector(text) for sparse retrieval, filled in bulk after ingestion (PostgreSQL only)
+    search_vector = SearchVectorField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=["document", "page_number"]),
+        ]
+    
     def __str__(self):
         return f"Chunk for {self.document.file_url}"
     
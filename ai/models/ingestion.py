@@ -0,0 +1,71 @@
+from django.db import models
+from django.utils import timezone
+
+from ai.models.document import Document
+
+class IngestionJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+    
+    INGEST = "ingest"
+    REINGEST = "reingest"
+    PURGE = "purge"
+    KIND_CHOICES = [
+        (INGEST, "Ingest"),
+        (REINGEST, "Re-ingest changed pages"),
+        (PURGE, "Purge chunks of a removed document"),
+    ]
+    
+    document = models.ForeignKey(Document, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=INGEST)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    pages_total = models.PositiveIntegerField(blank=True, null=True)
+    pages_processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=255, blank=True, default="")
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+        ]
+    
+    def __str__(self):
+        return f"Ingestion job {self.id} for {self.document.file_url} ({self.status})"
+    
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        return max((end - self.started_at).total_seconds(), 0.0)
+    
+    @property
+    def pages_per_second(self):
+        elapsed = self.elapsed_seconds
+        if not elapsed or not self.pages_processed:
+            return None
+        return self.pages_processed / elapsed
+    
+    @property
+    def eta_seconds(self):
+        if self.status != self.RUNNING or self.pages_total is None:
+            return None
+        rate = self.pages_per_second
+        if not rate:
+            return None
+        return max(self.pages_total - self.pages_processed, 0) / rate
@@ -3,7 +3,7 @@ from ai.models.conversation import Conversation, Message
 from ai.serializers.document import ContextDocumentChunkSerializer
 
 class MessageSerializer(serializers.ModelSerializer):
-    context = ContextDocumentChunkSerializer(many=True, read_only=True)
+    context = ContextDocumentChunkSerializer(source="context_chunks", many=True, read_only=True)
     
     class Meta:
         model = Message
@@ -17,7 +17,8 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'title', 'messages', 'created_at', 'updated_at']
     
     def get_messages(self, obj):
-        return MessageSerializer(obj.messages, many=True).data
+        messages = obj.messages.select_related("turn").prefetch_related("turn__context", "context")
+        return MessageSerializer(messages, many=True).data
 
 class SimpleConversationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from ai.models.ingestion import IngestionJob
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    pages_per_second = serializers.FloatField(read_only=True)
+    eta_seconds = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = IngestionJob
+        fields = ['id', 'document', 'kind', 'status', 'attempts', 'max_attempts', 'pages_total', 'pages_processed',
+                  'pages_per_second', 'eta_seconds', 'error', 'started_at', 'finished_at', 'created_at', 'updated_at']
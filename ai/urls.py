@@ -1,12 +1,17 @@
 from django.urls import path
-from ai.views.loader import DocumentView, DocumentChunkView, SimpleDocumentChunkView
+from django.views.decorators.csrf import csrf_exempt
+from ai.views.loader import DocumentView, DocumentChunkView, SimpleDocumentChunkView, IngestionJobView
 from ai.views.conversation import ConversationView, SimpleConversationView
-from ai.views.retrieval import HybridRetrievalView
+from ai.views.retrieval import HybridRetrievalView, AsyncHybridRetrievalView, AdmissionStatsView
 
 urlpatterns = [
     # Document
     path('document/', DocumentView.as_view({'post': 'create', 'get': 'list'}), name='document'),
-    path('document/<int:pk>/', DocumentView.as_view({'get': 'retrieve', 'delete': 'destroy'}), name='document-detail'),
+    path('document/<int:pk>/', DocumentView.as_view({'get': 'retrieve', 'put': 'update', 'delete': 'destroy'}), name='document-detail'),
+    
+    # Ingestion Job
+    path('ingestion-job/', IngestionJobView.as_view({'get': 'list'}), name='ingestion-job'),
+    path('ingestion-job/<int:pk>/', IngestionJobView.as_view({'get': 'retrieve'}), name='ingestion-job-detail'),
     
     # Document Chunk
     path('simple-document-chunk/', SimpleDocumentChunkView.as_view({'get': 'list'}), name='simple-document-chunk'),
@@ -14,6 +19,9 @@ urlpatterns = [
 
     # Retrieval
     path('retrieve/', HybridRetrievalView.as_view({'post': 'create'}), name='retrieval'),
+    path('retrieve/async/', csrf_exempt(AsyncHybridRetrievalView.as_view()), name='retrieval-async'),
+    path('retrieve/stream/', HybridRetrievalView.as_view({'post': 'stream'}), name='retrieval-stream'),
+    path('retrieve/admission/', AdmissionStatsView.as_view(), name='retrieval-admission'),
     
     # Conversation
     path('simple-conversation/', SimpleConversationView.as_view({'get': 'list'}), name='simple-conversation'),
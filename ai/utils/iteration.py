@@ -0,0 +1,7 @@
+from itertools import islice
+
+def batched(iterable, size):
+    """Yield lists of up to size items from iterable without materializing it."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
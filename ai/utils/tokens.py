@@ -0,0 +1,23 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@lru_cache(maxsize=None)
+def _encoding(name):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # The encoding file is downloaded on first use, which fails offline
+        return None
+
+def count_tokens(text, encoding="o200k_base"):
+    """Count the tokens of text for gpt-4o models, estimating 4 characters per token when tiktoken is unavailable."""
+    enc = _encoding(encoding)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
@@ -1,53 +1,53 @@
+import logging
 from main.lib.generic_api import GenericView
 from ai.models.document import Document, DocumentChunk
+from ai.models.ingestion import IngestionJob
 from ai.serializers.document import DocumentSerializer, DocumentChunkSerializer, SimpleDocumentChunkSerializer
-from ai.lib.loader import DocumentLoader
-from ai.lib.nlp import NLPPreprocessor
+from ai.serializers.ingestion import IngestionJobSerializer
 from rest_framework.permissions import IsAdminUser
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+logger = logging.getLogger(__name__)
+
 class DocumentView(GenericView):
-    queryset = Document.objects.all()
+    queryset = Document.objects.filter(removed=False)
     serializer_class = DocumentSerializer
-    allowed_methods = ['create', 'list', 'retrieve', 'destroy']
+    allowed_methods = ['create', 'list', 'retrieve', 'update', 'destroy']
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAdminUser]
     
     def post_create(self, request, instance):
-        print("\nCREATING DOCUMENT CHUNKS\n")
-        print(f"Loading document from {instance.file_url}")
-        loader = DocumentLoader(instance.file_url)
-        print(f"Loaded {len(loader.pages)} pages")
-        nlp_processor = NLPPreprocessor()
-        pages = loader.get_pages()
-        page_count = 0
-        total_pages = len(pages)
-        
-        for page in pages:
-            page_count += 1
-            print(f"Processing page {page_count}/{total_pages}")
-
-            nlp_data = nlp_processor.preprocess(page)
-
-            DocumentChunk.objects.create(
-                document=instance,
-                text=nlp_data["original_text"],
-                tokens_json=nlp_data["preprocessed_tokens"],
-                embedding_json=nlp_data["embeddings"].tolist(),
-                pos_json=nlp_data["pos"],
-                entity_json=nlp_data["entities"]
-            )
+        # Parsing, NLP and chunk inserts run in manage.py run_ingest_worker so the upload returns immediately
+        job = IngestionJob.objects.create(document=instance)
+        logger.info("Queued ingestion job %s for %s", job.id, instance.file_url)
+    
+    def post_update(self, request, instance):
+        # Re-download the file and only rewrite the chunks of pages that changed
+        job = IngestionJob.objects.create(document=instance, kind=IngestionJob.REINGEST)
+        logger.info("Queued re-ingestion job %s for %s", job.id, instance.file_url)
+    
+    def post_destroy(self, instance):
+        # destroy() only sets removed, which hides the document from retrieval; chunks are deleted in the background
+        job = IngestionJob.objects.create(document=instance, kind=IngestionJob.PURGE)
+        logger.info("Queued purge job %s for %s", job.id, instance.file_url)
 
 class DocumentChunkView(GenericView):
-    queryset = DocumentChunk.objects.all()
+    queryset = DocumentChunk.objects.filter(document__removed=False)
     serializer_class = DocumentChunkSerializer
     allowed_methods = ['retrieve']
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAdminUser]
         
 class SimpleDocumentChunkView(GenericView):
-    queryset = DocumentChunk.objects.all()
+    queryset = DocumentChunk.objects.filter(document__removed=False)
     serializer_class = SimpleDocumentChunkSerializer
     allowed_methods = ['list']
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAdminUser]
+
+class IngestionJobView(GenericView):
+    queryset = IngestionJob.objects.all().order_by('-created_at')
+    serializer_class = IngestionJobSerializer
+    allowed_methods = ['list', 'retrieve']
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAdminUser]
@@ -1,62 +1,52 @@
 from main.lib.generic_api import GenericView
+from main.lib.tracing import current_trace, span
+from ai.lib.admission import CONTINUING, NEW, AdmissionRejected, get_admission_controller
+from ai.lib.answer_cache import AnswerCache
+from ai.lib.compressor import ContextCompressor
+from ai.lib.history import ConversationHistory
+from ai.lib.llm import LLMUnavailableError, get_chat_model
 from ai.lib.retriever import HybridRetriever
+from ai.lib.streaming import AnswerExtractor, AsyncClosingIterator, ClosingIterator, aiterate, sse_event
 from ai.models.document import DocumentChunk
-from ai.models.conversation import Message, Conversation
+from ai.models.conversation import ChatTurn, Message, Conversation
 from ai.serializers.conversation import MessageSerializer
+from ai.utils.tokens import count_tokens
 from rest_framework.response import Response
-from django.db import transaction
+from rest_framework.exceptions import AuthenticationFailed
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.db import IntegrityError, transaction
 from rest_framework import status
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 import json
+import logging
+import math
 from pydantic import ValidationError
 import re
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+logger = logging.getLogger(__name__)
+
+# Retrieval runs the NLP models and ORM queries off the event loop; a dedicated pool
+# bounds how many run at once (and how many DB connections its threads hold)
+RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_THREADS, thread_name_prefix="retrieval")
+
 class RAGResponse(BaseModel):
     answer: str
     reason: str
 
-class HybridRetrievalView(GenericView):
-    queryset = Message.objects.all()
-    serializer_class = MessageSerializer
-    allowed_methods = ['create']
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    
-    def _retrieve(self, query):
-        retriever = HybridRetriever()
-        result = retriever.retrieve(query)
-        return result
-
-    @transaction.atomic
-    def create(self, request):
-        llm = ChatOpenAI(
-            model="gpt-4o-mini", 
-            temperature=0,
-            model_kwargs={
-                "response_format": {"type": "json_object"}
-            }
-        )
-        
-        conversation = Conversation.objects.get(id=request.data.get("conversation_id"))
-        
-        message_history = conversation.messages.all().order_by('created_at')
-        
-        self.pre_create(request)
-        
-        print(f'RETRIEVING SIMILARITY FOR: {request.data.get("query")}')
+# Reasons given when the model's output could not be parsed; such answers are not cached
+UNFORMATTED_REASON = "Response was not in proper JSON format, using raw LLM output"
+UNPARSEABLE_REASON = "Response could not be parsed as JSON, using raw LLM output"
 
-        similar_text = self._retrieve(request.data.get("query"))
-        
-        document_chunks = DocumentChunk.objects.filter(id__in=[doc['id'] for doc in similar_text])
-        
-        context = "\n".join([f"Source: {doc['source']}\n\n{doc['text']}\n\n\n" for doc in similar_text])
-        
-        # Create system message with context
-        system_prompt = f"""You are an expert in all information related to UP Cebu, which is a university in the Philippines. Based on the following documents from the university, answer the user's question.
+SYSTEM_PROMPT = """You are an expert in all information related to UP Cebu, which is a university in the Philippines. Based on the following documents from the university, answer the user's question.
 
 Documents:
 {context}
@@ -89,10 +79,79 @@ Example response:
 
 REMEMBER: Your response must be valid JSON that can be parsed directly. Do not include any other text."""
 
-
-
-        # Start with system message
-        messages = [SystemMessage(content=system_prompt)]
+class RetrievalMixin:
+    """Retrieval, prompting and response parsing shared by the sync and async retrieval views"""
+    
+    # Embedding of the last retrieved query and the model that made it, for the answer cache and context compression
+    query_embedding = None
+    encoder = None
+    # Prompt tokens with the full retrieved context and after compressing it
+    prompt_tokens = None
+    # The request's stage timings, kept so stages running after the response starts (streaming) are recorded too
+    request_trace = None
+    # The conversation's history as loaded for the prompt, summarized once the answer is saved
+    history = None
+    
+    def _span(self, name):
+        return span(name, self.request_trace)
+    
+    def _retrieve(self, query):
+        retriever = HybridRetriever()
+        result = retriever.retrieve(query)
+        self.query_embedding = retriever.query_embedding
+        self.encoder = lambda texts: retriever.nlp_preprocessor.sbert_model.encode(texts, convert_to_tensor=False)
+        return result
+    
+    def _llm(self):
+        return get_chat_model(json_mode=True)
+    
+    def _priority(self, first_turn):
+        # Requests continuing a conversation are admitted ahead of new ones
+        return NEW if first_turn else CONTINUING
+    
+    def _update_summary(self, history):
+        """Fold older messages into the conversation's summary, now that the answer is saved"""
+        if not history.summary_due():
+            return
+        try:
+            # The summary is an LLM call like any other, but one that can wait, so it queues behind new conversations
+            with get_admission_controller().admit(NEW), self._span("history_summary"):
+                history.summarize()
+        except AdmissionRejected as e:
+            logger.info("Summary of conversation %s deferred: %s", history.conversation.id, e.detail)
+    
+    async def _aupdate_summary(self, history):
+        """Async version of _update_summary()"""
+        if not await history.asummary_due():
+            return
+        try:
+            async with get_admission_controller().aadmit(NEW):
+                with self._span("history_summary"):
+                    await history.asummarize()
+        except AdmissionRejected as e:
+            logger.info("Summary of conversation %s deferred: %s", history.conversation.id, e.detail)
+    
+    def _unavailable(self, error):
+        """Body and headers of the 503 returned when the LLM could not answer"""
+        logger.warning("LLM unavailable: %s", error)
+        headers = {"Retry-After": str(math.ceil(error.retry_after))} if error.retry_after else {}
+        return {"detail": "The assistant is temporarily unavailable, please try again shortly"}, headers
+    
+    def _format_context(self, similar_text):
+        return "\n".join([f"Source: {doc['source']}\n\n{doc['text']}\n\n\n" for doc in similar_text])
+    
+    def _build_messages(self, message_history, similar_text, query, summary=""):
+        # Only the sentences most relevant to the query go into the prompt
+        with self._span("context_compression"):
+            compressed = ContextCompressor(encode=self.encoder).compress(self.query_embedding, similar_text)
+        context = self._format_context(compressed)
+        
+        # Start with system message with context
+        messages = [SystemMessage(content=SYSTEM_PROMPT.format(context=context))]
+        
+        # Older turns that no longer fit in the history window are only sent as a summary
+        if summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
         
         # Add message history
         for msg in message_history:
@@ -103,63 +162,411 @@ REMEMBER: Your response must be valid JSON that can be parsed directly. Do not i
             # Skip system messages from history as we already have our context-aware system message
         
         # Add current user message
-        messages.append(HumanMessage(content=request.data.get("query")))
+        messages.append(HumanMessage(content=query))
         
-
-        # Get response from LLM
-        result = llm.invoke(messages)
+        after = sum(count_tokens(message.content) for message in messages)
+        saved = count_tokens(self._format_context(similar_text)) - count_tokens(context)
+        self.prompt_tokens = {"before": after + saved, "after": after}
         
+        return messages
+    
+    def _parse_response(self, content):
         try:
             # First try to parse the response directly as JSON
-            response_data = json.loads(result.content)
+            response_data = json.loads(content)
             structured = RAGResponse.model_validate(response_data)
             
         except (json.JSONDecodeError, ValidationError) as e:
-            print(f"\nDirect JSON parsing failed: {e}")
-            print(f"Raw response: {result.content}")
+            logger.warning("Direct JSON parsing failed: %s", e, extra={"data": {"raw_response": content}})
             
             # Fallback: Try to extract JSON from the response
             try:
                 # Look for JSON-like content between { and }
-                json_match = re.search(r'\{.*?\}', result.content, re.DOTALL)
+                json_match = re.search(r'\{.*?\}', content, re.DOTALL)
                 
                 if json_match:
                     json_str = json_match.group(0)
-                    print(f"Extracted JSON: {json_str}")
+                    logger.debug("Extracted JSON: %s", json_str)
                     response_data = json.loads(json_str)
                     structured = RAGResponse.model_validate(response_data)
                 else:
                     # Final fallback: create structured response from raw text
                     structured = RAGResponse(
-                        answer=result.content,
-                        reason="Response was not in proper JSON format, using raw LLM output"
+                        answer=content,
+                        reason=UNFORMATTED_REASON
                     )
                     
             except (json.JSONDecodeError, ValidationError) as fallback_error:
-                print(f"Fallback parsing also failed: {fallback_error}")
+                logger.warning("Fallback parsing also failed: %s", fallback_error)
                 # Ultimate fallback
                 structured = RAGResponse(
-                    answer=result.content,
-                    reason="Response could not be parsed as JSON, using raw LLM output"
+                    answer=content,
+                    reason=UNPARSEABLE_REASON
                 )
+        return structured
+    
+    def _save_messages(self, conversation, query, structured, document_chunks, idempotency_key=""):
+        """
+        Write a turn in one short transaction and return the assistant message: the
+        turn, both messages in one bulk INSERT and the turn's context links in another
+        """
+        with self._span("persist"), transaction.atomic():
+            turn = ChatTurn.objects.create(conversation=conversation)
+            # A duplicate idempotency key on the assistant message rolls back the whole turn
+            user_message, assistant_message = Message.objects.bulk_create([
+                Message(conversation=conversation, turn=turn, role="user", content=query),
+                Message(
+                    conversation=conversation,
+                    turn=turn,
+                    role="assistant",
+                    content=structured.answer,
+                    reason=structured.reason,
+                    idempotency_key=idempotency_key
+                ),
+            ])
+            ChatTurn.context.through.objects.bulk_create(
+                ChatTurn.context.through(chatturn_id=turn.id, documentchunk_id=chunk.id) for chunk in document_chunks
+            )
+        return assistant_message
+    
+    def _cached_answer(self, first_turn, document_chunks):
+        """The cached answer to a paraphrase of this first-turn question with the same context, or None"""
+        if not first_turn:
+            return None
+        with self._span("answer_cache"):
+            cached = AnswerCache().lookup(self.query_embedding, document_chunks)
+        if cached is None:
+            return None
+        logger.info("Answer cache hit", extra={"data": {"similarity": round(cached["similarity"], 3)}})
+        return RAGResponse(answer=cached["answer"], reason=cached["reason"])
+    
+    def _cache_answer(self, first_turn, document_chunks, structured):
+        # Later turns depend on the history as well as the context, so only first turns are cached
+        if first_turn and structured.reason not in (UNFORMATTED_REASON, UNPARSEABLE_REASON):
+            AnswerCache().store(self.query_embedding, document_chunks, structured.answer, structured.reason)
+    
+    def _idempotency_key(self, request):
+        """The request's Idempotency-Key header ("" without one), or None if it is too long to store"""
+        idempotency_key = request.headers.get("Idempotency-Key", "")
+        return idempotency_key if len(idempotency_key) <= Message._meta.get_field("idempotency_key").max_length else None
+    
+    def _replay(self, conversation, idempotency_key):
+        """The response already saved for a request with this Idempotency-Key, or None"""
+        if not idempotency_key:
+            return None
+        assistant_message = Message.objects.filter(conversation=conversation, idempotency_key=idempotency_key).first()
+        if assistant_message is None:
+            return None
+        chunks = assistant_message.context_chunks.select_related("document").order_by("id")
+        return {
+            "answer": assistant_message.content,
+            "reason": assistant_message.reason,
+            "context": [{"id": chunk.id, "text": chunk.text, "source": chunk.document.description} for chunk in chunks],
+            "message_id": assistant_message.id,
+        }
+
+class HybridRetrievalView(RetrievalMixin, GenericView):
+    queryset = Message.objects.all()
+    serializer_class = MessageSerializer
+    allowed_methods = ['create', 'stream']
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    
+    def _prepare(self, conversation, query):
+        """Retrieve context for the query and build the LLM messages (reads only)"""
+        history = self.history = ConversationHistory(conversation)
+        with self._span("history_load"):
+            message_history = history.load()
         
-        # Create user message
-        user_message = Message.objects.create(
-            conversation=conversation,
-            role="user",
-            content=request.data.get("query")
-        )
-        user_message.context.set(document_chunks)
+        logger.debug("Retrieving context", extra={"data": {"query": query}})
+
+        similar_text = self._retrieve(query)
         
-        # Create a new message for the assistant
-        assistant_message = Message.objects.create(
-            conversation=conversation,
-            role="assistant",
-            content=structured.answer
-        )
-        assistant_message.context.set(document_chunks)
+        with self._span("document_lookup"):
+            document_chunks = list(DocumentChunk.objects.filter(id__in=[doc['id'] for doc in similar_text]))
+        
+        messages = self._build_messages(message_history, similar_text, query, history.summary)
+        first_turn = not message_history and not history.summary
+        
+        return similar_text, document_chunks, messages, first_turn
+
+    def create(self, request):
+        """
+        Answer a query in three phases so no transaction is open while waiting on
+        retrieval or the LLM: read-only retrieval, the LLM call, then one short
+        atomic write of both messages.
+
+        A retried request with the same Idempotency-Key header gets the saved
+        response back instead of a second answer.
+        """
+        llm = self._llm()
+        self.request_trace = current_trace()
+        
+        self.pre_create(request)
+        
+        conversation = Conversation.objects.get(id=request.data.get("conversation_id"))
+        query = request.data.get("query")
+        idempotency_key = self._idempotency_key(request)
+        if idempotency_key is None:
+            return Response({"detail": "Idempotency-Key is too long"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if (replay := self._replay(conversation, idempotency_key)) is not None:
+            return Response(replay, status=status.HTTP_200_OK, headers={"Idempotent-Replayed": "true"})
+        
+        similar_text, document_chunks, messages, first_turn = self._prepare(conversation, query)
+        
+        structured = self._cached_answer(first_turn, document_chunks)
+        cache_hit = structured is not None
+        if not cache_hit:
+            # Get response from LLM
+            try:
+                with get_admission_controller().admit(self._priority(first_turn)), self._span("llm"):
+                    result = llm.invoke(messages)
+            except AdmissionRejected as e:
+                return Response({"detail": e.detail}, status=e.status, headers=e.headers)
+            except LLMUnavailableError as e:
+                body, headers = self._unavailable(e)
+                return Response(body, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
+            
+            structured = self._parse_response(result.content)
+            self._cache_answer(first_turn, document_chunks, structured)
+        
+        try:
+            assistant_message = self._save_messages(conversation, query, structured, document_chunks, idempotency_key)
+        except IntegrityError:
+            # A concurrent retry with the same key saved its answer first
+            replay = self._replay(conversation, idempotency_key)
+            if replay is None:
+                raise
+            return Response(replay, status=status.HTTP_200_OK, headers={"Idempotent-Replayed": "true"})
+        
+        self._update_summary(self.history)
         
         response = structured.model_dump()
         response["context"] = similar_text
+        response["message_id"] = assistant_message.id
+        response["metadata"] = {"cache_hit": cache_hit, "prompt_tokens": self.prompt_tokens}
 
         return Response(response, status=status.HTTP_200_OK)
+    
+    def stream(self, request):
+        """
+        Same as create, streamed as Server-Sent Events: a context event with the
+        retrieved chunks, token events carrying pieces of the answer as the model
+        writes them, then a done event with the parsed answer and reason. The
+        messages are saved once the model has finished; an error event replaces
+        done if generation fails, and nothing is saved.
+        """
+        llm = self._llm()
+        self.request_trace = current_trace()
+        
+        self.pre_create(request)
+        
+        conversation = Conversation.objects.get(id=request.data.get("conversation_id"))
+        query = request.data.get("query")
+        idempotency_key = self._idempotency_key(request)
+        if idempotency_key is None:
+            return Response({"detail": "Idempotency-Key is too long"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if (replay := self._replay(conversation, idempotency_key)) is not None:
+            replay_events = list(self._replay_events(replay))
+            return self._event_stream(aiterate(replay_events) if self._is_asgi(request) else replay_events)
+        
+        similar_text, document_chunks, messages, first_turn = self._prepare(conversation, query)
+        cached = self._cached_answer(first_turn, document_chunks)
+        
+        # The slot is taken before the response starts, so a busy server can still answer 429/503
+        slot = None
+        if cached is None:
+            try:
+                slot = get_admission_controller().enter(self._priority(first_turn))
+            except AdmissionRejected as e:
+                return Response({"detail": e.detail}, status=e.status, headers=e.headers)
+        
+        def finish(raw):
+            """The done event's payload: the answer parsed from the full output (or the cached one), once saved"""
+            structured = cached
+            if cached is None:
+                # The streamed answer is provisional; done carries the answer as parsed from the full output
+                structured = self._parse_response(raw)
+                self._cache_answer(first_turn, document_chunks, structured)
+            try:
+                assistant_message = self._save_messages(conversation, query, structured, document_chunks, idempotency_key)
+            except IntegrityError:
+                replay = self._replay(conversation, idempotency_key)
+                if replay is None:
+                    raise
+                return replay
+            response = structured.model_dump()
+            response["message_id"] = assistant_message.id
+            response["metadata"] = {"cache_hit": cached is not None, "prompt_tokens": self.prompt_tokens}
+            return response
+        
+        def events():
+            yield sse_event("context", similar_text)
+            extractor = AnswerExtractor("answer")
+            if cached is not None:
+                yield sse_event("token", {"text": cached.answer})
+            else:
+                try:
+                    with self._span("llm"):
+                        for chunk in llm.stream(messages):
+                            if text := extractor.feed(chunk.content):
+                                yield sse_event("token", {"text": text})
+                except Exception as e:
+                    logger.warning("Streaming failed: %s", e)
+                    yield sse_event("error", {"detail": "The response could not be generated"})
+                    return
+                finally:
+                    slot.release()
+            yield sse_event("done", finish(extractor.raw))
+            # The client has the whole answer by now
+            self._update_summary(self.history)
+        
+        async def aevents():
+            # Under ASGI a sync iterator would be buffered whole before sending, so tokens are
+            # awaited from the model and the ORM work in finish() runs in the request's thread
+            yield sse_event("context", similar_text)
+            extractor = AnswerExtractor("answer")
+            if cached is not None:
+                yield sse_event("token", {"text": cached.answer})
+            else:
+                try:
+                    with self._span("llm"):
+                        async for chunk in llm.astream(messages):
+                            if text := extractor.feed(chunk.content):
+                                yield sse_event("token", {"text": text})
+                except Exception as e:
+                    logger.warning("Streaming failed: %s", e)
+                    yield sse_event("error", {"detail": "The response could not be generated"})
+                    return
+                finally:
+                    slot.release()
+            yield sse_event("done", await sync_to_async(finish)(extractor.raw))
+            await self._aupdate_summary(self.history)
+        
+        if self._is_asgi(request):
+            stream, closing = aevents(), AsyncClosingIterator
+        else:
+            stream, closing = events(), ClosingIterator
+        if slot is None:
+            return self._event_stream(stream)
+        # Also frees the slot if the client goes away before the stream starts
+        return self._event_stream(closing(stream, slot.release))
+    
+    @staticmethod
+    def _is_asgi(request):
+        return isinstance(request._request, ASGIRequest)
+    
+    def _replay_events(self, replay):
+        yield sse_event("context", replay["context"])
+        yield sse_event("token", {"text": replay["answer"]})
+        yield sse_event("done", {key: value for key, value in replay.items() if key != "context"})
+    
+    def _event_stream(self, events):
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stop nginx from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+class AsyncHybridRetrievalView(RetrievalMixin, View):
+    """
+    Async version of HybridRetrievalView.create for ASGI servers.
+
+    While the LLM call is awaited the worker keeps serving other requests, so
+    concurrency is no longer capped by the number of worker processes.
+    Conversation history is read with the async ORM and retrieval (model
+    inference plus its queries) runs in RETRIEVAL_EXECUTOR. The async ORM has no
+    transactions, so the final write of both messages runs the sync view's
+    short atomic block in a thread. Idempotency-Key works as for the sync view.
+    """
+    
+    async def _authenticate(self, request):
+        try:
+            result = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
+    
+    async def post(self, request):
+        self.request_trace = current_trace()
+        user = await self._authenticate(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+        
+        try:
+            data = json.loads(request.body)
+            query = data["query"]
+            conversation = await Conversation.objects.aget(id=data["conversation_id"])
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return JsonResponse({"detail": "conversation_id and query are required"}, status=400)
+        except Conversation.DoesNotExist:
+            return JsonResponse({"detail": "Conversation not found"}, status=404)
+        
+        idempotency_key = self._idempotency_key(request)
+        if idempotency_key is None:
+            return JsonResponse({"detail": "Idempotency-Key is too long"}, status=400)
+        if (replay := await sync_to_async(self._replay)(conversation, idempotency_key)) is not None:
+            return JsonResponse(replay, status=200, headers={"Idempotent-Replayed": "true"})
+        
+        history = self.history = ConversationHistory(conversation)
+        with self._span("history_load"):
+            message_history = await history.aload()
+        
+        logger.debug("Retrieving context", extra={"data": {"query": query}})
+        
+        similar_text = await sync_to_async(self._retrieve, thread_sensitive=False, executor=RETRIEVAL_EXECUTOR)(query)
+        
+        with self._span("document_lookup"):
+            document_chunks = [chunk async for chunk in DocumentChunk.objects.filter(id__in=[doc['id'] for doc in similar_text])]
+        
+        # Compression embeds the context's sentences, so it runs off the event loop too
+        messages = await sync_to_async(self._build_messages, thread_sensitive=False, executor=RETRIEVAL_EXECUTOR)(
+            message_history, similar_text, query, history.summary
+        )
+        first_turn = not message_history and not history.summary
+        
+        structured = await sync_to_async(self._cached_answer)(first_turn, document_chunks)
+        cache_hit = structured is not None
+        if not cache_hit:
+            # Get response from LLM
+            try:
+                async with get_admission_controller().aadmit(self._priority(first_turn)):
+                    with self._span("llm"):
+                        result = await self._llm().ainvoke(messages)
+            except AdmissionRejected as e:
+                return JsonResponse({"detail": e.detail}, status=e.status, headers=e.headers)
+            except LLMUnavailableError as e:
+                body, headers = self._unavailable(e)
+                return JsonResponse(body, status=503, headers=headers)
+            
+            structured = self._parse_response(result.content)
+            await sync_to_async(self._cache_answer)(first_turn, document_chunks, structured)
+        
+        try:
+            assistant_message = await sync_to_async(self._save_messages)(
+                conversation, query, structured, document_chunks, idempotency_key
+            )
+        except IntegrityError:
+            replay = await sync_to_async(self._replay)(conversation, idempotency_key)
+            if replay is None:
+                raise
+            return JsonResponse(replay, status=200, headers={"Idempotent-Replayed": "true"})
+        
+        await self._aupdate_summary(history)
+        
+        response = structured.model_dump()
+        response["context"] = similar_text
+        response["message_id"] = assistant_message.id
+        response["metadata"] = {"cache_hit": cache_hit, "prompt_tokens": self.prompt_tokens}
+        
+        return JsonResponse(response, status=200)
+
+class AdmissionStatsView(APIView):
+    """Admission control load of this worker process: slots in use, queue depth, outcomes and wait times"""
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(get_admission_controller().stats(), status=status.HTTP_200_OK)
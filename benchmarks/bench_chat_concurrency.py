@@ -0,0 +1,157 @@
+"""
+Benchmark chat throughput of the sync retrieval view under sync workers versus
+the async retrieval view under an ASGI worker, at equal memory.
+
+Every gunicorn sync worker is a separate process holding its own copy of the
+NLP models, and serves one request at a time while it waits for the LLM. At
+the memory of one worker process the sync view therefore serves one request
+at a time, while the async view keeps --concurrency requests in flight in the
+same process. Both views run in-process through Django's test clients: the
+sync run drives /api/ai/retrieve/ from --sync-workers threads (one per
+simulated worker process), the async run drives /api/ai/retrieve/async/ from
+one event loop.
+
+The LLM is the fake backend (LLM_BACKEND=fake), answering after --llm-ms per
+call (time.sleep for invoke, asyncio.sleep for ainvoke), and retrieval is
+replaced by --retrieval-ms of CPU work, so the numbers show how well each view
+overlaps the waits, not model speed.
+
+Usage:
+    python -m benchmarks.bench_chat_concurrency --requests 200 --llm-ms 800
+    python -m benchmarks.bench_chat_concurrency --sync-workers 4 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from benchmarks.common import setup_django, peak_rss_mb
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="simulated LLM latency per call")
+    parser.add_argument("--retrieval-ms", type=float, default=20.0, help="simulated CPU time of retrieval")
+    parser.add_argument("--sync-workers", type=int, default=1, help="sync worker processes being simulated")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight against the async view")
+    parser.add_argument("--database-url", default="scratch")
+    return parser.parse_args()
+
+
+def fake_retrieve(similar_text, seconds):
+    def retrieve(self, query):
+        # Busy-wait: retrieval is model inference that holds the CPU
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+        return similar_text
+    return retrieve
+
+
+def seed(requests):
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import AccessToken
+    from ai.models.conversation import Conversation
+    from ai.models.document import Document, DocumentChunk
+
+    user = User.objects.create_user("bench", "bench@example.com", "password")
+    document = Document.objects.create(file_url="benchmarks/handbook.pdf", description="Benchmark handbook")
+    chunk = DocumentChunk.objects.create(
+        document=document, text="Enrollment opens in June.", tokens_json=[], embedding_json=[],
+        pos_json=[], entity_json=[]
+    )
+    # One conversation per request so history (and prompt size) stays the same throughout
+    conversations = Conversation.objects.bulk_create(Conversation(user=user) for _ in range(requests))
+    similar_text = [{"id": chunk.id, "source": document.description, "text": chunk.text}]
+    return f"Bearer {AccessToken.for_user(user)}", [conversation.id for conversation in conversations], similar_text
+
+
+def run_sync(args, token, conversation_ids):
+    from django.test import Client
+
+    def request(conversation_id):
+        started = time.perf_counter()
+        response = Client().post(
+            "/api/ai/retrieve/", {"conversation_id": conversation_id, "query": "When is enrollment?"},
+            content_type="application/json", secure=True, HTTP_AUTHORIZATION=token
+        )
+        return time.perf_counter() - started, response.status_code == 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sync_workers) as executor:
+        results = list(executor.map(request, conversation_ids))
+    return results, time.perf_counter() - started
+
+
+def run_async(args, token, conversation_ids):
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def request(conversation_id):
+            async with slots:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/ai/retrieve/async/", {"conversation_id": conversation_id, "query": "When is enrollment?"},
+                    content_type="application/json", secure=True, headers={"Authorization": token}
+                )
+                return time.perf_counter() - started, response.status_code == 200
+
+        return await asyncio.gather(*(request(conversation_id) for conversation_id in conversation_ids))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    return results, time.perf_counter() - started
+
+
+def report(label, in_flight, results, seconds):
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{label:<26}{in_flight:>10}{len(results) / seconds:>10.1f}"
+        f"{1000 * percentiles[49]:>10.0f}{1000 * percentiles[94]:>10.0f}{errors:>8}"
+    )
+    return len(results) / seconds
+
+
+def main():
+    args = parse_args()
+    setup_django(args.database_url)
+
+    from django.conf import settings
+    from ai.views.retrieval import RetrievalMixin
+
+    # The test clients send Host: testserver, over HTTPS so SECURE_SSL_REDIRECT doesn't redirect
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+    token, conversation_ids, similar_text = seed(args.requests * 2)
+    # A fixed delay and no per-token time, so every call waits exactly --llm-ms
+    settings.LLM_BACKEND = "fake"
+    settings.FAKE_LLM_LATENCY_MS = args.llm_ms
+    settings.FAKE_LLM_LATENCY_SIGMA = 0
+    settings.FAKE_LLM_TOKENS_PER_SECOND = 0
+
+    print(f"{args.requests} requests, LLM {args.llm_ms:.0f}ms, retrieval {args.retrieval_ms:.0f}ms CPU\n")
+    print(f"{'view':<26}{'in flight':>10}{'req/sec':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'errors':>8}")
+    with patch.object(RetrievalMixin, "_retrieve", fake_retrieve(similar_text, args.retrieval_ms / 1000)):
+        results, seconds = run_sync(args, token, conversation_ids[:args.requests])
+        sync_rate = report(f"sync x{args.sync_workers} workers", args.sync_workers, results, seconds)
+        results, seconds = run_async(args, token, conversation_ids[args.requests:])
+        async_rate = report("async x1 process", args.concurrency, results, seconds)
+
+    print(f"\nasync serves {async_rate / sync_rate:.1f}x the requests/sec of {args.sync_workers} sync worker(s)")
+    print(
+        f"Memory: {args.sync_workers} sync worker process(es) vs 1 async process; "
+        f"this process peaked at {peak_rss_mb():.1f}MB"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Benchmark end-to-end document ingestion throughput.
+
+Generates a synthetic corpus of PDFs and DOCX files with Faker, serves it from a
+local-filesystem S3 stand-in and ingests every document the way the ingestion
+worker does after an upload: DocumentLoader -> NLPPreprocessor -> bulk chunk
+inserts, run through the ingestion pipeline. Reports pages/sec, the time each
+stage was busy and its utilization, and peak RSS.
+
+--save-baseline writes the results as JSON; --baseline compares a run against
+such a file and exits with status 1 when throughput drops, or a stage's time
+per page grows, by more than --tolerance. Baselines are only comparable for the
+same corpus options and machine.
+
+--fake-nlp swaps in a model-free NLPPreprocessor of the same output shape (with
+an optional simulated per-page cost) to measure everything around the models.
+--profile writes cProfile stats covering the NLP workers and the insert stage
+and prints the top functions by cumulative time.
+
+Usage:
+    python -m benchmarks.bench_ingest --pdfs 8 --docx 4 --pages 40
+    python -m benchmarks.bench_ingest --fake-nlp --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_ingest --fake-nlp --baseline benchmarks/baseline.json
+    python -m benchmarks.bench_ingest --fake-nlp --profile /tmp/ingest.prof
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import platform
+import pstats
+import sys
+import threading
+
+from benchmarks.common import setup_django, measure, peak_rss_mb, local_s3_service
+from benchmarks.synthetic import fake_pages, build_pdf, build_docx, FakeNLPPreprocessor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=8, help="number of PDF documents")
+    parser.add_argument("--docx", type=int, default=4, help="number of DOCX documents")
+    parser.add_argument("--pages", type=int, default=40, help="pages per document")
+    parser.add_argument("--paragraphs", type=int, default=4, help="paragraphs of text per page")
+    parser.add_argument("--image-kb", type=int, default=0, help="incompressible payload per PDF page, in KB")
+    parser.add_argument("--nlp-workers", type=int, default=None)
+    parser.add_argument("--fake-nlp", action="store_true", help="use a model-free NLP stand-in")
+    parser.add_argument("--fake-nlp-ms", type=float, default=0.0, help="simulated NLP cost per page, in ms")
+    parser.add_argument("--database-url", default="scratch")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--save-baseline", help="write this run's results as JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown (0.10 = 10%%)")
+    parser.add_argument("--profile", help="write cProfile stats to this path")
+    return parser.parse_args()
+
+
+def build_corpus(args):
+    """Synthetic {key: bytes}; each document gets its own seed so pages differ across documents."""
+    corpus = {}
+    for number in range(args.pdfs):
+        pages = fake_pages(args.pages, paragraphs_per_page=args.paragraphs, seed=number)
+        corpus[f"benchmarks/corpus/{number:04d}.pdf"] = build_pdf(pages, image_bytes_per_page=args.image_kb * 1024)
+    for number in range(args.docx):
+        pages = fake_pages(args.pages, paragraphs_per_page=args.paragraphs, seed=10_000 + number)
+        corpus[f"benchmarks/corpus/{number:04d}.docx"] = build_docx(pages)
+    return corpus
+
+
+class ThreadProfiles:
+    """Collects one cProfile.Profile per thread so pipeline workers can be profiled too."""
+
+    def __init__(self):
+        self.profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, fn):
+        def profiled(*args, **kwargs):
+            profile = getattr(self._local, "profile", None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self.profiles.append(profile)
+            return profile.runcall(fn, *args, **kwargs)
+        return profiled
+
+    def dump(self, path):
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(path, stream=output).sort_stats("cumulative").print_stats(25)
+        return output.getvalue()
+
+
+def run(args, corpus, nlp_processor, profiles):
+    from ai.lib.ingestion import DocumentIngestor
+    from ai.lib.loader import DocumentLoader
+    from ai.models.document import Document
+
+    s3_service = local_s3_service(corpus)
+    stages = {}
+    pages = 0
+    with measure(trace_memory=False) as result:
+        for key in corpus:
+            document = Document.objects.create(file_url=key, description="benchmark")
+            ingestor = DocumentIngestor(
+                document,
+                loader=DocumentLoader(key, s3_service=s3_service, lazy=True),
+                nlp_processor=nlp_processor,
+                nlp_workers=args.nlp_workers
+            )
+            if profiles:
+                ingestor.preprocess = profiles.wrap(ingestor.preprocess)
+                ingestor.write_batch = profiles.wrap(ingestor.write_batch)
+                ingestor.writer.finalize = profiles.wrap(ingestor.writer.finalize)
+            pages += ingestor.ingest()
+            for stage in ingestor.metrics:
+                totals = stages.setdefault(stage["stage"], {"busy_seconds": 0.0, "blocked_seconds": 0.0})
+                totals["busy_seconds"] += stage["busy_seconds"]
+                totals["blocked_seconds"] += stage["blocked_seconds"]
+
+    for totals in stages.values():
+        totals["utilization"] = totals["busy_seconds"] / result["seconds"]
+        totals["ms_per_page"] = 1000 * totals["busy_seconds"] / pages if pages else 0.0
+    return {
+        "documents": len(corpus),
+        "pages": pages,
+        "seconds": result["seconds"],
+        "pages_per_second": pages / result["seconds"],
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against baseline."""
+    regressions = []
+    floor = baseline["pages_per_second"] * (1 - tolerance)
+    if results["pages_per_second"] < floor:
+        regressions.append(
+            f"throughput {results['pages_per_second']:.1f} pages/sec < {floor:.1f} "
+            f"(baseline {baseline['pages_per_second']:.1f})"
+        )
+    for name, stage in results["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before and before["ms_per_page"] and stage["ms_per_page"] > before["ms_per_page"] * (1 + tolerance):
+            regressions.append(
+                f"stage {name}: {stage['ms_per_page']:.2f} ms/page > baseline {before['ms_per_page']:.2f} ms/page"
+            )
+    return regressions
+
+
+def main():
+    args = parse_args()
+    setup_django(args.database_url)
+
+    if args.fake_nlp:
+        nlp_processor = FakeNLPPreprocessor(seconds_per_page=args.fake_nlp_ms / 1000)
+    else:
+        from ai.lib.nlp import NLPPreprocessor
+        nlp_processor = NLPPreprocessor()
+
+    corpus = build_corpus(args)
+    size_mb = sum(len(content) for content in corpus.values()) / (1024 * 1024)
+    print(f"Corpus: {args.pdfs} PDFs + {args.docx} DOCX x {args.pages} pages, {size_mb:.1f}MB\n")
+
+    profiles = ThreadProfiles() if args.profile else None
+    results = run(args, corpus, nlp_processor, profiles)
+    results["options"] = {
+        "pdfs": args.pdfs, "docx": args.docx, "pages": args.pages, "paragraphs": args.paragraphs,
+        "image_kb": args.image_kb, "fake_nlp": args.fake_nlp, "fake_nlp_ms": args.fake_nlp_ms,
+        "nlp_workers": args.nlp_workers,
+    }
+    results["machine"] = platform.node()
+
+    print(f"{results['pages']} pages in {results['seconds']:.2f}s: {results['pages_per_second']:.1f} pages/sec")
+    print(f"{'stage':<8}{'busy (s)':>10}{'ms/page':>10}{'utilization':>13}{'blocked (s)':>13}")
+    for name, stage in results["stages"].items():
+        print(
+            f"{name:<8}{stage['busy_seconds']:>10.2f}{stage['ms_per_page']:>10.2f}"
+            f"{stage['utilization']:>12.0%}{stage['blocked_seconds']:>13.2f}"
+        )
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f}MB")
+
+    if profiles:
+        print(f"\nProfile written to {args.profile}\n")
+        print(profiles.dump(args.profile))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("options") != results["options"]:
+            print("Warning: baseline was recorded with different corpus options")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSION")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,437 @@
+"""
+Load-test the chat and conversation endpoints end to end, to find how many
+concurrent students one instance can serve.
+
+Seeds a synthetic corpus (Faker PDFs ingested the way an upload is), --users
+students with --conversations conversations of --history-turns turns each,
+logs every student in through /api/auth/login/ for a JWT, then sends requests
+at each of --rates requests/sec for --duration seconds: POST
+/api/ai/retrieve/ and the conversation endpoints, mixed by --mix. Arrivals
+are open-loop (Poisson unless --constant-arrivals), so a slow server does not
+slow the load down, and latency runs from when a request was due, so waiting
+for a free connection counts too. A request due while --max-in-flight are
+outstanding is not sent and counted as dropped.
+
+Reports, per rate and endpoint, throughput (successful responses/sec),
+p50/p95/p99 latency of successful responses, error rate (non-2xx responses
+and failed connections over requests sent) and status codes.
+--save-baseline writes the results as JSON, with the git commit and options;
+--baseline compares a run against such a file and exits with status 1 when,
+at a rate both ran, an endpoint's p95 grows or its throughput drops by more
+than --tolerance, or its error rate rises by more than --tolerance. Baselines
+are only comparable for the same options and machine.
+
+By default the server runs in this process (main.asgi through httpx's ASGI
+transport, so every middleware and view runs as deployed) with the fake LLM
+backend answering after a median of --llm-ms, so runs need no OpenAI key and
+are reproducible. The load generator then shares the CPU with the server, so
+in-process numbers are a lower bound. With --url the load goes to a running
+server instead: seeding writes to the database given by --database-url, which
+must be the server's, and the server should run with LLM_BACKEND=fake. DRF
+throttling applies either way (per user, and per IP for logins), so keep
+--users and requests per user within its rates or expect 429s.
+
+Sparse retrieval needs PostgreSQL. On SQLite (the default scratch database)
+pass --stub-retrieval-ms to replace retrieval with that much CPU work
+returning seeded chunks; on PostgreSQL retrieval runs for real and needs the
+NLP models. --fake-nlp seeds the corpus with a model-free NLP stand-in.
+
+Usage:
+    python -m benchmarks.bench_load --stub-retrieval-ms 20 --rates 2,5,10 --duration 30
+    python -m benchmarks.bench_load --database-url postgres://localhost/bench --rates 5,10,20 \\
+        --save-baseline benchmarks/load-baseline.json
+    python -m benchmarks.bench_load --url http://localhost:8080 --database-url postgres://localhost/app \\
+        --rates 5,10 --baseline benchmarks/load-baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import httpx
+
+from benchmarks.common import BASE_DIR, setup_django, local_s3_service
+from benchmarks.synthetic import fake_pages, build_pdf, FakeNLPPreprocessor
+
+# Seeded rows are recognised by these prefixes and replaced on every run
+USER_PREFIX = "loadtest-"
+CORPUS_PREFIX = "loadtest/corpus/"
+PASSWORD = "loadtest-password"
+
+DEFAULT_MIX = "retrieve=6,conversation_detail=2,conversation_list=1,conversation_create=1"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: serve in this process)")
+    parser.add_argument("--rates", default="2,5,10", help="comma-separated request rates to run, in requests/sec")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load at each rate")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight pairs")
+    parser.add_argument("--constant-arrivals", action="store_true", help="evenly spaced instead of Poisson arrivals")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="outstanding requests before dropping")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request, in seconds")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=3, help="conversations seeded per user")
+    parser.add_argument("--history-turns", type=int, default=4, help="turns seeded per conversation")
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=20, help="pages per document")
+    parser.add_argument("--fake-nlp", action="store_true", help="seed the corpus with a model-free NLP stand-in")
+    parser.add_argument("--stub-retrieval-ms", type=float, help="replace retrieval with this much CPU work")
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="median fake LLM latency (in-process only)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default="scratch")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--save-baseline", help="write this run's results as JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown (0.10 = 10%%)")
+    return parser.parse_args()
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name.strip()!r} in --mix; choose from {', '.join(ENDPOINTS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def seed_corpus(args):
+    """Ingest --documents synthetic PDFs; return the chunks as retrieval results ({"id", "source", "text"})"""
+    from ai.lib.ingestion import DocumentIngestor
+    from ai.lib.loader import DocumentLoader
+    from ai.models.document import Document, DocumentChunk
+
+    Document.objects.filter(file_url__startswith=CORPUS_PREFIX).delete()
+    corpus = {
+        f"{CORPUS_PREFIX}{number:04d}.pdf": build_pdf(fake_pages(args.pages, seed=args.seed + number))
+        for number in range(args.documents)
+    }
+    s3_service = local_s3_service(corpus)
+    if args.fake_nlp:
+        nlp_processor = FakeNLPPreprocessor()
+    else:
+        from ai.lib.nlp import NLPPreprocessor
+        nlp_processor = NLPPreprocessor()
+    for number, key in enumerate(corpus):
+        document = Document.objects.create(file_url=key, description=f"Load test handbook {number}")
+        DocumentIngestor(
+            document, loader=DocumentLoader(key, s3_service=s3_service, lazy=True), nlp_processor=nlp_processor
+        ).ingest()
+    chunks = DocumentChunk.objects.filter(document__file_url__startswith=CORPUS_PREFIX).select_related("document")
+    return [{"id": chunk.id, "source": chunk.document.description, "text": chunk.text} for chunk in chunks]
+
+
+def seed_students(args, chunks, rng):
+    """Create --users students with conversation history; return {username: [conversation ids]}"""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from ai.models.conversation import ChatTurn, Conversation, Message
+
+    User.objects.filter(username__startswith=USER_PREFIX).delete()
+    # Hashing is deliberately slow, so every student shares one hash
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        User(username=f"{USER_PREFIX}{number}", email=f"{USER_PREFIX}{number}@example.com", password=password)
+        for number in range(args.users)
+    )
+    users = list(User.objects.filter(username__startswith=USER_PREFIX))
+    conversations = Conversation.objects.bulk_create(
+        Conversation(user=user, title=f"Load test conversation {number}")
+        for user in users for number in range(args.conversations)
+    )
+    turns = ChatTurn.objects.bulk_create(
+        ChatTurn(conversation=conversation) for conversation in conversations for _ in range(args.history_turns)
+    )
+    messages = []
+    for turn in turns:
+        chunk = rng.choice(chunks)
+        messages.append(Message(conversation_id=turn.conversation_id, turn=turn, role="user", content=question_about(chunk, rng)))
+        messages.append(Message(conversation_id=turn.conversation_id, turn=turn, role="assistant", content=chunk["text"][:400]))
+    Message.objects.bulk_create(messages)
+    ChatTurn.context.through.objects.bulk_create(
+        ChatTurn.context.through(chatturn_id=turn.id, documentchunk_id=rng.choice(chunks)["id"]) for turn in turns
+    )
+    return {
+        user.username: [conversation.id for conversation in conversations if conversation.user_id == user.id]
+        for user in users
+    }
+
+
+def question_about(chunk, rng):
+    words = [word.strip(".,;:").lower() for word in chunk["text"].split() if len(word) > 5] or ["enrollment"]
+    return f"What does the handbook say about {' '.join(rng.sample(words, min(2, len(words))))}?"
+
+
+def stub_retrieve(chunks, seconds):
+    def retrieve(self, query):
+        # Busy-wait: retrieval is model inference and ranking that holds the CPU
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+        return random.Random(query).sample(chunks, min(3, len(chunks)))
+    return retrieve
+
+
+class Student:
+    def __init__(self, username, user_id, token, conversation_ids):
+        self.username = username
+        self.user_id = user_id
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.conversation_ids = conversation_ids
+
+
+async def log_in(client, seeded):
+    """Log every student in for a JWT"""
+    students = []
+    for username, conversation_ids in seeded.items():
+        response = await client.post("/api/auth/login/", json={"username": username, "password": PASSWORD})
+        if response.status_code != 200:
+            raise SystemExit(f"Login of {username} failed with {response.status_code}: {response.text[:200]}")
+        body = response.json()
+        students.append(Student(username, body["user"]["pk"], body["access"], list(conversation_ids)))
+    return students
+
+
+# Each endpoint builds (method, path, JSON body) for a student
+ENDPOINTS = {
+    "retrieve": lambda student, rng, questions: (
+        "POST", "/api/ai/retrieve/",
+        {"conversation_id": rng.choice(student.conversation_ids), "query": rng.choice(questions)}
+    ),
+    "conversation_detail": lambda student, rng, questions: (
+        "GET", f"/api/ai/conversation/{rng.choice(student.conversation_ids)}/", None
+    ),
+    "conversation_list": lambda student, rng, questions: ("GET", "/api/ai/simple-conversation/", None),
+    "conversation_create": lambda student, rng, questions: (
+        "POST", "/api/ai/conversation/", {"user": student.user_id, "title": "Load test conversation"}
+    ),
+}
+
+
+async def send(client, endpoint, student, rng, questions, due, records):
+    method, path, body = ENDPOINTS[endpoint](student, rng, questions)
+    loop = asyncio.get_running_loop()
+    try:
+        response = await client.request(method, path, json=body, headers=student.headers)
+        status = response.status_code
+        if endpoint == "conversation_create" and status == 201:
+            # Later chat requests may start the new conversation
+            student.conversation_ids.append(response.json()["id"])
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    records.append((endpoint, loop.time() - due, status))
+
+
+async def run_rate(client, args, rate, weights, students, questions, rng):
+    """Send requests at rate for --duration seconds; return records, drops per endpoint and elapsed seconds"""
+    loop = asyncio.get_running_loop()
+    records = []
+    dropped = Counter()
+    tasks = set()
+    started = due = loop.time()
+    names, endpoint_weights = list(weights), list(weights.values())
+    while True:
+        due += 1 / rate if args.constant_arrivals else rng.expovariate(rate)
+        if due - started >= args.duration:
+            break
+        await asyncio.sleep(max(due - loop.time(), 0))
+        endpoint = rng.choices(names, endpoint_weights)[0]
+        if len(tasks) >= args.max_in_flight:
+            dropped[endpoint] += 1
+            continue
+        task = asyncio.create_task(send(client, endpoint, rng.choice(students), rng, questions, due, records))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    # Requests still outstanding finish before the next rate starts
+    await asyncio.gather(*tasks)
+    return records, dropped, loop.time() - started
+
+
+def percentile(values, q):
+    return values[min(int(len(values) * q / 100), len(values) - 1)] if values else None
+
+
+def summarize(records, dropped, seconds):
+    """Per endpoint, and over all endpoints ("all"), throughput, latency percentiles and errors"""
+    by_endpoint = {}
+    for endpoint, latency, status in records:
+        by_endpoint.setdefault(endpoint, []).append((latency, status))
+    by_endpoint["all"] = [(latency, status) for _, latency, status in records]
+    dropped = {**dropped, "all": sum(dropped.values())}
+
+    summary = {}
+    for endpoint, results in by_endpoint.items():
+        latencies = sorted(latency for latency, status in results if isinstance(status, int) and status < 400)
+        errors = len(results) - len(latencies)
+        summary[endpoint] = {
+            "sent": len(results),
+            "ok": len(latencies),
+            "errors": errors,
+            "error_rate": errors / len(results) if results else 0.0,
+            "dropped": dropped.get(endpoint, 0),
+            "throughput": len(latencies) / seconds,
+            "latency_ms": {
+                name: None if percentile(latencies, q) is None else round(1000 * percentile(latencies, q), 1)
+                for name, q in (("p50", 50), ("p95", 95), ("p99", 99))
+            },
+            "statuses": dict(Counter(str(status) for _, status in results)),
+        }
+    return summary
+
+
+def report(step):
+    print(f"\n{step['rate']:g} req/sec for {step['duration']:g}s (finished in {step['seconds']:.1f}s)")
+    print(
+        f"{'endpoint':<22}{'sent':>7}{'ok/sec':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}"
+        f"{'errors':>8}{'dropped':>9}  statuses"
+    )
+    for endpoint, stats in step["endpoints"].items():
+        latency = {name: "-" if value is None else f"{value:.0f}" for name, value in stats["latency_ms"].items()}
+        statuses = " ".join(f"{status}:{count}" for status, count in sorted(stats["statuses"].items()))
+        print(
+            f"{endpoint:<22}{stats['sent']:>7}{stats['throughput']:>9.1f}{latency['p50']:>10}{latency['p95']:>10}"
+            f"{latency['p99']:>10}{stats['error_rate']:>8.1%}{stats['dropped']:>9}  {statuses}"
+        )
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against baseline, at the rates both ran"""
+    regressions = []
+    baseline_steps = {step["rate"]: step for step in baseline["steps"]}
+    for step in results["steps"]:
+        before_step = baseline_steps.get(step["rate"])
+        if before_step is None:
+            continue
+        for endpoint, stats in step["endpoints"].items():
+            before = before_step["endpoints"].get(endpoint)
+            if before is None:
+                continue
+            label = f"{step['rate']:g} req/sec {endpoint}"
+            p95, before_p95 = stats["latency_ms"]["p95"], before["latency_ms"]["p95"]
+            if p95 is not None and before_p95 and p95 > before_p95 * (1 + tolerance):
+                regressions.append(f"{label}: p95 {p95:.0f}ms > baseline {before_p95:.0f}ms")
+            if stats["throughput"] < before["throughput"] * (1 - tolerance):
+                regressions.append(
+                    f"{label}: throughput {stats['throughput']:.2f}/sec < baseline {before['throughput']:.2f}/sec"
+                )
+            if stats["error_rate"] > before["error_rate"] + tolerance:
+                regressions.append(
+                    f"{label}: error rate {stats['error_rate']:.1%} > baseline {before['error_rate']:.1%}"
+                )
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_client(args):
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    if args.url:
+        return httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout)
+    from main.asgi import application
+    # HTTPS so SECURE_SSL_REDIRECT doesn't redirect; the ASGI transport sends Host: testserver
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=application), base_url="https://testserver", limits=limits,
+        timeout=args.timeout
+    )
+
+
+async def run(args, weights, seeded, questions, rng):
+    async with build_client(args) as client:
+        students = await log_in(client, seeded)
+        steps = []
+        for rate in [float(rate) for rate in args.rates.split(",")]:
+            records, dropped, seconds = await run_rate(client, args, rate, weights, students, questions, rng)
+            step = {
+                "rate": rate, "duration": args.duration, "seconds": seconds,
+                "endpoints": summarize(records, dropped, seconds),
+            }
+            report(step)
+            steps.append(step)
+    return steps
+
+
+def main():
+    args = parse_args()
+    weights = parse_mix(args.mix)
+    setup_django(args.database_url)
+
+    from django.conf import settings
+    from django.db import connection
+    from ai.views.retrieval import RetrievalMixin
+
+    if args.stub_retrieval_ms is None and connection.vendor != "postgresql":
+        print("Sparse retrieval needs PostgreSQL: pass --database-url postgres://... or --stub-retrieval-ms")
+        return 2
+    if not args.url:
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        settings.LLM_BACKEND = "fake"
+        settings.FAKE_LLM_LATENCY_MS = args.llm_ms
+
+    rng = random.Random(args.seed)
+    print(f"Seeding {args.documents} documents x {args.pages} pages and {args.users} students...")
+    chunks = seed_corpus(args)
+    seeded = seed_students(args, chunks, rng)
+    questions = [question_about(rng.choice(chunks), rng) for _ in range(200)]
+
+    target = args.url or "in-process"
+    print(f"Target: {target}, LLM: {'fake' if not args.url else 'as configured on the server'}, mix: {args.mix}")
+    started_at = datetime.now(timezone.utc).isoformat()
+    if args.stub_retrieval_ms is not None and not args.url:
+        with patch.object(RetrievalMixin, "_retrieve", stub_retrieve(chunks, args.stub_retrieval_ms / 1000)):
+            steps = asyncio.run(run(args, weights, seeded, questions, rng))
+    else:
+        steps = asyncio.run(run(args, weights, seeded, questions, rng))
+
+    results = {
+        "commit": git_commit(),
+        "started_at": started_at,
+        "machine": platform.node(),
+        "target": target,
+        "options": {
+            "mix": weights, "duration": args.duration, "constant_arrivals": args.constant_arrivals,
+            "max_in_flight": args.max_in_flight, "users": args.users, "conversations": args.conversations,
+            "history_turns": args.history_turns, "documents": args.documents, "pages": args.pages,
+            "fake_nlp": args.fake_nlp, "stub_retrieval_ms": args.stub_retrieval_ms,
+            "llm_ms": None if args.url else args.llm_ms, "seed": args.seed,
+        },
+        "steps": steps,
+    }
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("options") != results["options"] or baseline.get("target") != results["target"]:
+            print("Warning: baseline was recorded with different options or against a different target")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSION")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Benchmark DocumentLoader ingest time and peak memory on large synthetic PDFs.
+
+Compares the previous temp-file round trip (download to memory, write a
+NamedTemporaryFile, reopen it with LangChain's PyPDFLoader) against parsing
+straight from the spooled in-memory download.
+
+Usage:
+    python -m benchmarks.bench_loader --pages 200 --image-kb 256 --repeat 3
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+
+from benchmarks.common import setup_django, measure, peak_rss_mb, local_s3_service
+from benchmarks.synthetic import fake_pages, build_pdf
+
+setup_django()
+
+from langchain_community.document_loaders import PyPDFLoader  # noqa: E402
+from ai.lib.loader import DocumentLoader  # noqa: E402
+
+
+def legacy_load_pdf(s3_service, key):
+    """The pre-streaming implementation: bytes -> NamedTemporaryFile -> PyPDFLoader."""
+    file_content = s3_service.download_file_to_memory(key)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+        temp_file.write(file_content)
+        temp_file_path = temp_file.name
+    try:
+        documents = PyPDFLoader(temp_file_path).load()
+        return [doc.page_content.strip() for doc in documents if doc.page_content.strip()]
+    finally:
+        os.unlink(temp_file_path)
+
+
+def in_memory_load_pdf(s3_service, key, spool_threshold):
+    return DocumentLoader(key, s3_service=s3_service, spool_threshold=spool_threshold).get_pages()
+
+
+def run(label, fn, repeat):
+    timings, heaps = [], []
+    pages = None
+    for _ in range(repeat):
+        with measure() as result:
+            pages = fn()
+        timings.append(result["seconds"])
+        heaps.append(result["peak_heap_mb"])
+    print(
+        f"{label:<28} pages={len(pages):<5} "
+        f"median={statistics.median(timings):.3f}s "
+        f"min={min(timings):.3f}s "
+        f"peak_heap={max(heaps):.1f}MB"
+    )
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=256, help="incompressible payload per page, in KB")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--spool-threshold-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    content = build_pdf(fake_pages(args.pages), image_bytes_per_page=args.image_kb * 1024)
+    key = "benchmarks/synthetic.pdf"
+    s3_service = local_s3_service({key: content})
+    cached_s3_service = local_s3_service({key: content}, cache_max_bytes=4 * len(content))
+    print(f"Synthetic PDF: {args.pages} pages, {len(content) / (1024 * 1024):.1f}MB\n")
+
+    legacy = run("temp file + PyPDFLoader", lambda: legacy_load_pdf(s3_service, key), args.repeat)
+    in_memory = run(
+        "in-memory BytesIO",
+        lambda: in_memory_load_pdf(s3_service, key, args.spool_threshold_mb * 1024 * 1024),
+        args.repeat,
+    )
+    spilled = run("spooled, spills to disk", lambda: in_memory_load_pdf(s3_service, key, 1), args.repeat)
+    # The first run fills the disk cache; later runs are revalidated with If-None-Match
+    cached = run("S3 object cache", lambda: in_memory_load_pdf(cached_s3_service, key, 0), args.repeat)
+
+    assert legacy == in_memory == spilled == cached, "loaders disagree on extracted pages"
+    print(f"\nProcess peak RSS: {peak_rss_mb():.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark parallel PDF page extraction against the worker count.
+
+Each run parses the same in-memory synthetic PDF with DocumentLoader using a
+process pool of the given size (1 = serial extraction in this process) and
+reports pages/sec and speedup over serial.
+
+Usage:
+    python -m benchmarks.bench_pdf_extract --pages 500 --workers 1,2,4,8
+"""
+
+import argparse
+import os
+import statistics
+
+from benchmarks.common import setup_django, measure, local_s3_service
+from benchmarks.synthetic import fake_pages, build_pdf
+
+setup_django()
+
+from django.test import override_settings  # noqa: E402
+from ai.lib.loader import DocumentLoader  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs of text per page")
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    content = build_pdf(fake_pages(args.pages, paragraphs_per_page=args.paragraphs))
+    s3_service = local_s3_service({"benchmarks/synthetic.pdf": content})
+    print(f"Synthetic PDF: {args.pages} pages, {len(content) / (1024 * 1024):.1f}MB, {os.cpu_count()} CPUs\n")
+
+    serial_seconds = None
+    expected = None
+    for workers in [int(value) for value in args.workers.split(",")]:
+        timings = []
+        for _ in range(args.repeat):
+            with override_settings(DOCUMENT_EXTRACT_MIN_PAGES=1), measure(trace_memory=False) as result:
+                pages = DocumentLoader("benchmarks/synthetic.pdf", s3_service=s3_service, workers=workers).get_pages()
+            timings.append(result["seconds"])
+
+        expected = expected or pages
+        assert pages == expected, f"page order differs with {workers} workers"
+
+        seconds = statistics.median(timings)
+        serial_seconds = serial_seconds or seconds
+        print(
+            f"workers={workers:<3} median={seconds:.2f}s "
+            f"pages/sec={len(pages) / seconds:8.1f} "
+            f"speedup={serial_seconds / seconds:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
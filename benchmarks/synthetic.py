@@ -0,0 +1,171 @@
+"""
+Synthetic PDF and DOCX documents for the benchmarks.
+
+The PDF writer emits plain PDF 1.4 with the standard Helvetica font, so pypdf can
+extract the text back without any extra dependencies. Optional incompressible image
+payloads per page mimic the size of scanned-then-OCRed catalogs.
+"""
+
+import io
+import os
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+from faker import Faker
+
+
+def fake_pages(page_count, paragraphs_per_page=4, seed=0):
+    """Generate deterministic pages of Faker text."""
+    faker = Faker()
+    Faker.seed(seed)
+    return [
+        "\n".join(faker.paragraph(nb_sentences=5) for _ in range(paragraphs_per_page))
+        for _ in range(page_count)
+    ]
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text, width=95):
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    return lines
+
+
+def build_pdf(pages, image_bytes_per_page=0):
+    """Build a PDF whose pages contain the given texts and return its bytes."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for text in pages:
+        commands = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        for line in _wrap(text):
+            commands.append(f"({_pdf_escape(line)}) Tj T*")
+        commands.append("ET")
+
+        resources = f"/Font << /F1 {font_id} 0 R >>"
+        if image_bytes_per_page:
+            side = max(1, int(image_bytes_per_page ** 0.5))
+            payload = os.urandom(side * side)
+            image_id = add(
+                f"<< /Type /XObject /Subtype /Image /Width {side} /Height {side} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Length {len(payload)} >>\nstream\n".encode()
+                + payload + b"\nendstream"
+            )
+            resources += f" /XObject << /Im1 {image_id} 0 R >>"
+            commands = ["q 100 0 0 100 450 20 cm /Im1 Do Q"] + commands
+
+        stream = "\n".join(commands).encode("latin-1", "replace")
+        content_id = add(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << {resources} >> /Contents {content_id} 0 R >>".encode()
+        ))
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref_offset = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n".encode()
+    )
+    return out.getvalue()
+
+
+def build_docx(pages):
+    """Build a DOCX with a page break between the given texts and return its bytes."""
+    body = []
+    for index, text in enumerate(pages):
+        for paragraph in text.split("\n"):
+            body.append(f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(paragraph)}</w:t></w:r></w:p>")
+        if index < len(pages) - 1:
+            body.append("<w:p><w:r><w:br w:type=\"page\"/></w:r></w:p>")
+
+    document = (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"yes\"?>"
+        "<w:document xmlns:w=\"http://schemas.openxmlformats.org/wordprocessingml/2006/main\">"
+        f"<w:body>{''.join(body)}</w:body></w:document>"
+    )
+    content_types = (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"yes\"?>"
+        "<Types xmlns=\"http://schemas.openxmlformats.org/package/2006/content-types\">"
+        "<Default Extension=\"rels\" ContentType=\"application/vnd.openxmlformats-package.relationships+xml\"/>"
+        "<Default Extension=\"xml\" ContentType=\"application/xml\"/>"
+        "<Override PartName=\"/word/document.xml\" "
+        "ContentType=\"application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml\"/>"
+        "</Types>"
+    )
+    rels = (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"yes\"?>"
+        "<Relationships xmlns=\"http://schemas.openxmlformats.org/package/2006/relationships\">"
+        "<Relationship Id=\"rId1\" "
+        "Type=\"http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument\" "
+        "Target=\"word/document.xml\"/></Relationships>"
+    )
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", content_types)
+        archive.writestr("_rels/.rels", rels)
+        archive.writestr("word/document.xml", document)
+    return out.getvalue()
+
+
+class FakeNLPPreprocessor:
+    """
+    Stand-in for NLPPreprocessor that returns output of the same shape without
+    loading spaCy or SBERT, so the rest of the ingestion path can be measured
+    on machines without the models. seconds_per_page simulates model cost.
+    """
+
+    def __init__(self, seconds_per_page=0.0, dimensions=384):
+        self.seconds_per_page = seconds_per_page
+        self.dimensions = dimensions
+
+    def preprocess_batch(self, original_texts, batch_size=32):
+        if self.seconds_per_page:
+            time.sleep(self.seconds_per_page * len(original_texts))
+        results = []
+        for text in original_texts:
+            tokens = text.split()
+            results.append({
+                "original_text": text,
+                "original_tokens": tokens,
+                "embeddings": np.full(self.dimensions, len(tokens) / 1000.0, dtype=np.float32),
+                "pos": [[token, "NOUN", "NN"] for token in tokens],
+                "entities": [],
+                "preprocessed_tokens": [token.lower() for token in tokens],
+                "preprocessed_text": text.lower(),
+            })
+        return results
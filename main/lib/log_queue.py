@@ -0,0 +1,56 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; a record's extra={"data": {...}} is included as is"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if data := getattr(record, "data", None):
+            entry["data"] = data
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class QueueLogHandler(QueueHandler):
+    """
+    Hands records to a background thread that writes them to stdout as JSON,
+    so logging never blocks a request on a slow stream. The queue is bounded
+    by max_size; records that would overflow it are dropped rather than
+    waited for.
+    """
+
+    def __init__(self, max_size=10000):
+        super().__init__(queue.Queue(max_size))
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, stream_handler, respect_handler_level=True)
+        self.listener.start()
+        self._stopped = False
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write out the records still queued and stop the writer thread; called at exit"""
+        if self._stopped:
+            return
+        self._stopped = True
+        try:
+            self.listener.stop()
+        except queue.Full:
+            # No room for the stop sentinel; the writer is a daemon thread and ends with the process
+            pass
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
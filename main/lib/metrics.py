@@ -0,0 +1,239 @@
+import atexit
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds: from a cache lookup to a slow LLM answer or ingestion job
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+class Counter(_Metric):
+    """A total that only goes up, per label combination"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.registry._fork_check()
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry._maybe_flush()
+
+    def _snapshot(self):
+        return dict(self.values)
+
+    @staticmethod
+    def _merge(total, value):
+        return (total or 0) + value
+
+    def _samples(self, key, value):
+        yield self.name, (), value
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, with their sum, per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.registry._fork_check()
+            state = self.values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), made cumulative when rendered
+                state = self.values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            state["counts"][index] += 1
+            state["sum"] += value
+        self.registry._maybe_flush()
+
+    def _snapshot(self):
+        return {key: {"counts": list(state["counts"]), "sum": state["sum"]} for key, state in self.values.items()}
+
+    @staticmethod
+    def _merge(total, value):
+        if total is None:
+            return {"counts": list(value["counts"]), "sum": value["sum"]}
+        return {"counts": [a + b for a, b in zip(total["counts"], value["counts"])], "sum": total["sum"] + value["sum"]}
+
+    def _samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), value["counts"]):
+            cumulative += count
+            yield f"{self.name}_bucket", (("le", _format_value(bound)),), cumulative
+        yield f"{self.name}_sum", (), value["sum"]
+        yield f"{self.name}_count", (), cumulative
+
+class Registry:
+    """
+    Counters and histograms of this process, rendered in the Prometheus text format.
+
+    With directory set (METRICS_DIR by default), every worker process writes
+    its values to <directory>/<pid>.json, at most every METRICS_FLUSH_SECONDS
+    and at exit, and rendering adds up the files of all workers, so whichever
+    gunicorn worker answers the scrape reports the whole server. Files are
+    written to a temporary name and renamed, so a reader never sees half of
+    one. The directory should be emptied when the server starts, as files of
+    processes from an earlier run would still be counted.
+
+    Without a directory, each process reports only its own values.
+    """
+
+    def __init__(self, directory=None, flush_seconds=None):
+        self._directory = directory
+        self._flush_seconds = flush_seconds
+        self.metrics = {}
+        self.lock = threading.RLock()
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+        # Scripts using a module (e.g. the S3 service) without Django keep their metrics in memory
+        return settings.METRICS_DIR if settings.configured else ""
+
+    @property
+    def flush_seconds(self):
+        return settings.METRICS_FLUSH_SECONDS if self._flush_seconds is None else self._flush_seconds
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(self, name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def _fork_check(self):
+        # A worker forked from a process that already counted (gunicorn --preload) starts from zero,
+        # or the parent's values would be reported once per worker
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._last_flush = 0.0
+            for metric in self.metrics.values():
+                metric.values = {}
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def _snapshot(self):
+        with self.lock:
+            self._fork_check()
+            return {name: metric._snapshot() for name, metric in self.metrics.items()}
+
+    def flush(self):
+        """Write this process's values to the metrics directory (if any)"""
+        directory = self.directory
+        if not directory:
+            return
+        self._last_flush = time.monotonic()
+        data = {name: [[list(key), value] for key, value in values.items()] for name, values in self._snapshot().items()}
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                json.dump(data, file)
+            os.replace(temporary, os.path.join(directory, f"{os.getpid()}.json"))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def collect(self):
+        """Values per metric and label combination, added up over all processes sharing the directory"""
+        snapshots = [self._snapshot()]
+        directory = self.directory
+        if directory:
+            own = os.path.join(directory, f"{os.getpid()}.json")
+            for path in glob.glob(os.path.join(directory, "*.json")):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as file:
+                        data = json.load(file)
+                except (OSError, ValueError):
+                    # Removed since it was listed
+                    continue
+                snapshots.append({
+                    name: {tuple(key): value for key, value in values} for name, values in data.items()
+                })
+        totals = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in values.items():
+                    totals[name][key] = metric._merge(totals[name].get(key), value)
+        return totals
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key in sorted(values):
+                labels = tuple(zip(metric.labelnames, key))
+                for sample, extra, value in metric._samples(key, values[key]):
+                    lines.append(f"{sample}{_format_labels(labels + extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+def counter(name, help, labelnames=()):
+    """A counter of the process-wide registry; registering the same name again returns the same counter"""
+    return REGISTRY.counter(name, help, labelnames)
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """A histogram of the process-wide registry; registering the same name again returns the same histogram"""
+    return REGISTRY.histogram(name, help, labelnames, buckets)
@@ -0,0 +1,146 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from main.lib import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Time to answer a request, by route pattern, method and status", ["route", "method", "status"]
+)
+STAGE_SECONDS = metrics.histogram(
+    "request_stage_duration_seconds", "Time spent in a traced stage of a request, by route pattern", ["route", "stage"]
+)
+
+_current_trace = ContextVar("trace", default=None)
+
+class Trace:
+    """
+    Stage timings of one request, in milliseconds.
+
+    A stage timed more than once (e.g. one lookup per document) adds up under
+    its name. Threads started with sync_to_async copy the request's context,
+    so stages run in executor threads land in the same trace.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+
+    def record(self, name, milliseconds):
+        self.durations[name] = self.durations.get(name, 0.0) + milliseconds
+
+    @property
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """The stages, and the total so far, formatted as a Server-Timing header value"""
+        metrics = [f"{name};dur={duration:.1f}" for name, duration in self.durations.items()]
+        metrics.append(f"total;dur={self.total:.1f}")
+        return ", ".join(metrics)
+
+    def finish(self, request, response):
+        """Log the finished request and add its timings to the metrics"""
+        self.log(request, response)
+        match = getattr(request, "resolver_match", None)
+        # The URL pattern rather than the path, so /conversation/1/ and /conversation/2/ are one series
+        route = "/" + match.route if match is not None else "unmatched"
+        REQUEST_SECONDS.observe(self.total / 1000, route=route, method=request.method, status=response.status_code)
+        for name, duration in self.durations.items():
+            STAGE_SECONDS.observe(duration / 1000, route=route, stage=name)
+
+    def log(self, request, response):
+        logger.info("request", extra={"data": {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(self.total, 1),
+            "stages_ms": {name: round(duration, 1) for name, duration in self.durations.items()},
+        }})
+
+def current_trace():
+    return _current_trace.get()
+
+@contextmanager
+def span(name, trace=None):
+    """
+    Time the enclosed block as stage name of trace, by default the current
+    request's (a no-op outside a request). Code running after the response was
+    returned, such as a streaming generator, passes the trace it captured.
+    """
+    trace = trace or _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, (time.perf_counter() - started) * 1000)
+
+class ServerTimingMiddleware:
+    """
+    Traces every request: stages timed with span() are returned in a
+    Server-Timing header (when SERVER_TIMING is on), logged as one
+    structured record and added to the request metrics. A streamed response gets the header with the stages
+    finished before streaming began, and is logged once the stream ends.
+    Should be the first middleware, so total covers the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+        return self._finish(trace, request, response)
+
+    async def __acall__(self, request):
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+        return self._finish(trace, request, response)
+
+    def _finish(self, trace, request, response):
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = trace.server_timing()
+        if not response.streaming:
+            trace.finish(request, response)
+        elif response.is_async:
+            response.streaming_content = self._alog_when_done(response.streaming_content, trace, request, response)
+        else:
+            response.streaming_content = self._log_when_done(response.streaming_content, trace, request, response)
+        return response
+
+    @staticmethod
+    def _log_when_done(content, trace, request, response):
+        try:
+            yield from content
+        finally:
+            trace.finish(request, response)
+
+    @staticmethod
+    async def _alog_when_done(content, trace, request, response):
+        try:
+            async for part in content:
+                yield part
+        finally:
+            trace.finish(request, response)
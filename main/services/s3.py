@@ -1,32 +1,322 @@
+import io
 import os
+import glob
+import hashlib
 import logging
-from typing import Optional
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import IO, Callable, List, Optional, Tuple
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
+from botocore.response import StreamingBody
 from dotenv import load_dotenv
+from main.lib import metrics
 
 logger = logging.getLogger(__name__)
 
+CACHE_REQUESTS = metrics.counter("cache_requests_total", "Cache lookups by cache and result (hit or miss)", ["cache", "result"])
+
+# One boto3 client per process: clients are thread-safe and own the connection pool,
+# so sharing one keeps TLS connections warm across S3Service instances and threads
+_shared_client = None
+_shared_client_pid = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client(aws_access_key_id=None, aws_secret_access_key=None, region_name=None):
+    """
+    Return the process-wide S3 client, creating it on first use.
+
+    The connection pool is sized by S3_MAX_POOL_CONNECTIONS and must be at least
+    S3_RANGED_CONCURRENCY for ranged downloads to run fully in parallel. A forked
+    child builds its own client, since connections can't be shared across processes.
+    """
+    global _shared_client, _shared_client_pid
+    with _shared_client_lock:
+        if _shared_client is None or _shared_client_pid != os.getpid():
+            if os.getenv("S3_BACKEND") == "local":
+                _shared_client = LocalFilesystemClient(os.getenv("S3_LOCAL_ROOT", "."))
+            else:
+                _shared_client = boto3.session.Session().client(
+                    's3',
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                    region_name=region_name,
+                    config=Config(
+                        max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", 32)),
+                        retries={'max_attempts': 5, 'mode': 'standard'},
+                        tcp_keepalive=True
+                    )
+                )
+            _shared_client_pid = os.getpid()
+        return _shared_client
+
+
+def split_byte_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """
+    Split [0, size) into inclusive (start, end) byte ranges of at most part_size bytes.
+    """
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+class LocalFilesystemClient:
+    """
+    Stand-in for the boto3 S3 client backed by a local directory, for tests,
+    benchmarks and offline development. Each bucket is a subdirectory of root.
+
+    Only the calls S3Service makes are implemented, with boto3's request and
+    response shapes and ClientError codes.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def _error(self, code: str, message: str, operation: str) -> ClientError:
+        return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+    def _stat(self, bucket: str, key: str, operation: str):
+        if not os.path.isdir(os.path.join(self.root, bucket)):
+            raise self._error('NoSuchBucket', 'The specified bucket does not exist', operation)
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise self._error('NoSuchKey', 'The specified key does not exist.', operation)
+        stat = os.stat(path)
+        # Changes whenever the file is rewritten, like a real ETag changes with the content
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        return path, stat, etag
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(Body)
+        return {'ETag': self._stat(Bucket, Key, 'PutObject')[2]}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', MaxKeys: int = 1000,
+                        ContinuationToken: Optional[str] = None):
+        bucket_root = os.path.join(self.root, Bucket)
+        if not os.path.isdir(bucket_root):
+            raise self._error('NoSuchBucket', 'The specified bucket does not exist', 'ListObjectsV2')
+
+        keys = []
+        for directory, _, files in os.walk(bucket_root):
+            for name in files:
+                key = os.path.relpath(os.path.join(directory, name), bucket_root).replace(os.sep, '/')
+                if key.startswith(Prefix):
+                    keys.append(key)
+        keys.sort()
+        # The continuation token is simply the offset of the next page
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+
+        response = {
+            'Contents': [{'Key': key, 'Size': os.path.getsize(self._path(Bucket, key))} for key in page],
+            'KeyCount': len(page),
+            'IsTruncated': start + MaxKeys < len(keys),
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def head_object(self, Bucket: str, Key: str):
+        _, stat, etag = self._stat(Bucket, Key, 'HeadObject')
+        return {
+            'ContentLength': stat.st_size,
+            'ETag': etag,
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def get_object(self, Bucket: str, Key: str, IfNoneMatch: Optional[str] = None,
+                   IfMatch: Optional[str] = None, Range: Optional[str] = None):
+        path, stat, etag = self._stat(Bucket, Key, 'GetObject')
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            # boto3 surfaces a 304 Not Modified response as a ClientError with code '304'
+            raise self._error('304', 'Not Modified', 'GetObject')
+        if IfMatch is not None and IfMatch != etag:
+            raise self._error('PreconditionFailed', 'At least one of the pre-conditions you specified did not hold', 'GetObject')
+
+        start, end = 0, stat.st_size - 1
+        if Range is not None:
+            first, last = Range.removeprefix('bytes=').split('-')
+            start, end = int(first), min(int(last), stat.st_size - 1)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            content = f.read(end - start + 1)
+
+        response = {
+            'Body': StreamingBody(io.BytesIO(content), len(content)),
+            'ContentLength': len(content),
+            'ETag': etag,
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+        if Range is not None:
+            response['ContentRange'] = f"bytes {start}-{end}/{stat.st_size}"
+        return response
+
+
+class S3ObjectCache:
+    """
+    Size-bounded on-disk cache of S3 objects keyed by bucket, key and ETag.
+
+    Each cached version is a single file named after hashes of bucket/key and
+    of the ETag, written to a temporary file and moved into place with
+    os.replace, so readers never see partial content and concurrent processes
+    can share the directory. Hits refresh the file's mtime; when the cache
+    grows past max_bytes the least recently used files are evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional['S3ObjectCache']:
+        """
+        Build the cache from S3_CACHE_DIR / S3_CACHE_MAX_BYTES; it is off unless S3_CACHE_MAX_BYTES is set.
+        """
+        max_bytes = int(os.getenv("S3_CACHE_MAX_BYTES", 0))
+        if max_bytes <= 0:
+            return None
+        directory = os.getenv("S3_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "upc-s3-cache")
+        return cls(directory, max_bytes)
+
+    def _prefix(self, bucket: str, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest())
+
+    def _path(self, bucket: str, key: str, etag: str) -> str:
+        return f"{self._prefix(bucket, key)}.{hashlib.sha256(etag.encode()).hexdigest()[:32]}"
+
+    def lookup(self, bucket: str, key: str) -> Optional[Tuple[str, str]]:
+        """
+        Return (etag, path) of the cached version of an object, or None.
+        """
+        for path in glob.glob(f"{self._prefix(bucket, key)}.*.etag"):
+            with open(path) as f:
+                etag = f.read()
+            data_path = path[:-len(".etag")]
+            if os.path.exists(data_path):
+                return etag, data_path
+        return None
+
+    def open(self, path: str) -> IO[bytes]:
+        """
+        Open a cached file and mark it as recently used.
+        """
+        f = open(path, 'rb')
+        os.utime(path)
+        return f
+
+    def store(self, bucket: str, key: str, etag: str, fill: Callable[[IO[bytes]], None]) -> str:
+        """
+        Atomically write a new version of an object, drop older versions, and enforce the size bound.
+
+        fill(file) writes the object's content into an open temporary file.
+        """
+        path = self._path(bucket, key, etag)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                fill(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        self._write_etag(path, etag)
+        for stale in glob.glob(f"{self._prefix(bucket, key)}.*"):
+            if not stale.startswith(path):
+                self._remove(stale)
+        # The new entry is about to be opened by the caller, so older ones make room for it
+        self.evict(keep=path)
+        return path
+
+    def _write_etag(self, path: str, etag: str):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            f.write(etag)
+        os.replace(temp_path, f"{path}.etag")
+
+    def _remove(self, path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def discard(self, bucket: str, key: str):
+        """
+        Remove every cached version of an object.
+        """
+        for path in glob.glob(f"{self._prefix(bucket, key)}.*"):
+            self._remove(path)
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Remove least recently used objects until the cache fits in max_bytes, never the one at keep.
+        """
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*")):
+            if path.endswith((".etag", ".tmp")) or path == keep:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if keep is not None:
+            try:
+                total += os.path.getsize(keep)
+            except FileNotFoundError:
+                pass
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(f"{path}.etag")
+            self._remove(path)
+            total -= size
+
 
 class S3Service:
     """
     Service class for handling AWS S3 operations including file downloads.
     """
-    
-    def __init__(self):
+
+    def __init__(self, client=None, cache: Optional[S3ObjectCache] = None, use_cache: bool = True):
         """
         Initialize S3 service with AWS credentials and configuration.
+
+        Args:
+            client: S3 client to use instead of the shared boto3 client, e.g. a LocalFilesystemClient.
+                Setting S3_BACKEND=local with S3_LOCAL_ROOT selects one from the environment.
+            cache (S3ObjectCache, optional): On-disk object cache. Defaults to S3ObjectCache.from_env(),
+                which is off unless S3_CACHE_MAX_BYTES is set.
+            use_cache (bool): Set to False to always download from S3.
         """
 
         load_dotenv()
-        
+
         self.aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
         self.aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
         self.aws_region = os.getenv("AWS_REGION")
         self.aws_s3_bucket = os.getenv("AWS_S3_BUCKET")
-        
-        self._client = None
-    
+
+        # Objects of at least this many bytes are fetched as parallel ranged GETs; 0 (the default) disables it,
+        # sparing every other download the HEAD request that sizes the object
+        self.ranged_threshold = int(os.getenv("S3_RANGED_THRESHOLD", 0))
+        self.ranged_concurrency = int(os.getenv("S3_RANGED_CONCURRENCY", 8))
+        self.ranged_part_size = int(os.getenv("S3_RANGED_PART_SIZE", 8 * 1024 * 1024))
+
+        self._client = client
+        self.cache = (cache or S3ObjectCache.from_env()) if use_cache else None
+
     @property
     def client(self):
         """
@@ -34,8 +324,7 @@ class S3Service:
         """
         if self._client is None:
             try:
-                self._client = boto3.client(
-                    's3',
+                self._client = get_shared_client(
                     aws_access_key_id=self.aws_access_key_id,
                     aws_secret_access_key=self.aws_secret_access_key,
                     region_name=self.aws_region
@@ -44,45 +333,259 @@ class S3Service:
                 logger.error("AWS credentials not found. Please set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY.")
                 raise
         return self._client
-    
-    def download_file_to_memory(self, 
-                              key: str, 
+
+    def _log_download_error(self, key: str, error: Exception):
+        if isinstance(error, ClientError):
+            error_code = error.response['Error']['Code']
+            if error_code == 'NoSuchKey':
+                logger.error(f"File {key} not found in bucket {self.aws_s3_bucket}")
+            elif error_code == 'NoSuchBucket':
+                logger.error(f"Bucket {self.aws_s3_bucket} not found")
+            else:
+                logger.error(f"Error downloading file {key}: {error}")
+        else:
+            logger.error(f"Unexpected error downloading file {key}: {error}")
+
+    def _use_ranged(self, size: int) -> bool:
+        return bool(self.ranged_threshold) and size >= self.ranged_threshold and size > self.ranged_part_size
+
+    def _download_into(self, key: str, size: int, etag: str, write: Callable[[int, bytes], None], chunk_size: int):
+        """
+        Download an object of known size and ETag, passing each chunk to write(offset, chunk).
+
+        Large objects are split into byte ranges fetched concurrently over the shared
+        connection pool, so write must be safe to call from several threads for
+        disjoint offsets. IfMatch pins every range to the same version of the object.
+        """
+        if not self._use_ranged(size):
+            response = self.client.get_object(Bucket=self.aws_s3_bucket, Key=key, IfMatch=etag)
+            offset = 0
+            for chunk in response['Body'].iter_chunks(chunk_size):
+                write(offset, chunk)
+                offset += len(chunk)
+            return
+
+        def fetch(byte_range):
+            start, end = byte_range
+            response = self.client.get_object(
+                Bucket=self.aws_s3_bucket, Key=key, IfMatch=etag, Range=f"bytes={start}-{end}"
+            )
+            offset = start
+            for chunk in response['Body'].iter_chunks(chunk_size):
+                write(offset, chunk)
+                offset += len(chunk)
+            if offset != end + 1:
+                raise IOError(f"Short read for {key} range {start}-{end}: got {offset - start} bytes")
+
+        byte_ranges = split_byte_ranges(size, self.ranged_part_size)
+        with ThreadPoolExecutor(max_workers=min(self.ranged_concurrency, len(byte_ranges))) as executor:
+            # list() re-raises the first failed range
+            list(executor.map(fetch, byte_ranges))
+        logger.info(f"Downloaded {key} as {len(byte_ranges)} ranged parts")
+
+    def _download_to_buffer(self, buffer, key: str, size: int, etag: str, chunk_size: int):
+        """
+        Download into a writable buffer preallocated to the object size, writing ranges in place.
+        """
+        with memoryview(buffer) as view:
+            def write(offset, chunk):
+                view[offset:offset + len(chunk)] = chunk
+            self._download_into(key, size, etag, write, chunk_size)
+
+    def _download_to_stream(self, key: str, size: int, etag: str, chunk_size: int) -> io.BytesIO:
+        """
+        Download into a BytesIO whose own buffer is preallocated and filled in place.
+        """
+        stream = io.BytesIO()
+        if size:
+            stream.seek(size - 1)
+            stream.write(b'\0')
+        # The stream can't be resized while its buffer is exported, so release it before returning
+        with stream.getbuffer() as buffer:
+            self._download_to_buffer(buffer, key, size, etag, chunk_size)
+        stream.seek(0)
+        return stream
+
+    def _download_to_file(self, f: IO[bytes], key: str, size: int, etag: str, chunk_size: int):
+        """
+        Download into an open file preallocated to the object size, writing ranges at their offsets.
+        """
+        f.truncate(size)
+        fd = f.fileno()
+
+        def write(offset, chunk):
+            os.pwrite(fd, chunk, offset)
+        self._download_into(key, size, etag, write, chunk_size)
+        f.seek(0)
+
+    def _open_cached(self, key: str, size: int, etag: str, chunk_size: int) -> IO[bytes]:
+        """
+        Return the object from the disk cache if its ETag still matches, downloading it into the cache otherwise.
+        """
+        cached = self.cache.lookup(self.aws_s3_bucket, key)
+        if cached and cached[0] == etag:
+            logger.info(f"Serving {key} from the S3 object cache")
+            CACHE_REQUESTS.inc(cache="s3_object", result="hit")
+            return self.cache.open(cached[1])
+        CACHE_REQUESTS.inc(cache="s3_object", result="miss")
+
+        if size > self.cache.max_bytes:
+            # Caching it would evict everything else, so it goes to an anonymous temporary file instead
+            stream = tempfile.TemporaryFile()
+            try:
+                self._download_to_file(stream, key, size, etag, chunk_size)
+            except Exception:
+                stream.close()
+                raise
+            return stream
+
+        path = self.cache.store(
+            self.aws_s3_bucket, key, etag, lambda f: self._download_to_file(f, key, size, etag, chunk_size)
+        )
+        return self.cache.open(path)
+
+    def evict_cached(self, key: str):
+        """
+        Drop an object from the local cache, e.g. once its document has been deleted.
+        """
+        if self.cache:
+            self.cache.discard(self.aws_s3_bucket, key)
+
+    def list_keys(self, prefix: str = '') -> List[str]:
+        """
+        List every object key under a prefix, following ListObjectsV2 pagination.
+
+        Args:
+            prefix (str): Key prefix, e.g. 'knowledge-base/'
+
+        Returns:
+            list: Object keys in lexicographic order
+        """
+        keys = []
+        kwargs = {'Bucket': self.aws_s3_bucket, 'Prefix': prefix}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            keys.extend(item['Key'] for item in response.get('Contents', []))
+            if not response.get('IsTruncated'):
+                return keys
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def download_file_to_memory(self,
+                              key: str,
                               bucket_name: Optional[str] = None) -> Optional[bytes]:
         """
         Download a file from S3 to memory.
-        
+
         Args:
             key (str): The S3 object key (file path in S3)
             bucket_name (str, optional): S3 bucket name. If not provided, uses default bucket.
-            
+
         Returns:
-            bytes: File content as bytes if successful, None otherwise
-            
+            bytes: File content as bytes if successful (a bytearray for ranged downloads), None otherwise
+
         Example:
             s3_service = S3Service()
             content = s3_service.download_file_to_memory('documents/file.pdf')
         """
-        
+
         if not self.aws_s3_bucket:
             logger.error("No bucket specified and no default bucket configured.")
             return None
-        
+
         try:
-            response = self.client.get_object(Bucket=self.aws_s3_bucket, Key=key)
-            content = response['Body'].read()
+            if self.cache or self.ranged_threshold:
+                head = self.client.head_object(Bucket=self.aws_s3_bucket, Key=key)
+                size, etag = head['ContentLength'], head['ETag']
+            if self.cache:
+                with self._open_cached(key, size, etag, 1024 * 1024) as f:
+                    content = f.read()
+            elif self.ranged_threshold and self._use_ranged(size):
+                # The filled bytearray is returned as is rather than copied into a bytes object
+                content = bytearray(size)
+                self._download_to_buffer(content, key, size, etag, 1024 * 1024)
+            else:
+                response = self.client.get_object(Bucket=self.aws_s3_bucket, Key=key)
+                content = response['Body'].read()
             logger.info(f"Successfully downloaded {key} from {self.aws_s3_bucket} to memory")
             return content
-            
-        except ClientError as e:
-            error_code = e.response['Error']['Code']
-            if error_code == 'NoSuchKey':
-                logger.error(f"File {key} not found in bucket {self.aws_s3_bucket}")
-            elif error_code == 'NoSuchBucket':
-                logger.error(f"Bucket {self.aws_s3_bucket} not found")
-            else:
-                logger.error(f"Error downloading file {key}: {e}")
+
+        except Exception as e:
+            self._log_download_error(key, e)
             return None
-            
+
+    def download_file_to_stream(self,
+                                key: str,
+                                spool_threshold: int = 0,
+                                chunk_size: int = 1024 * 1024) -> Optional[IO[bytes]]:
+        """
+        Download a file from S3 into a seekable stream without a round trip through disk.
+
+        When the object cache is enabled, objects up to spool_threshold bytes are read from
+        the cached file into memory and larger ones are served from the cached file itself.
+        Otherwise objects up to spool_threshold bytes are read in one go and wrapped in a BytesIO,
+        which shares the downloaded buffer instead of copying it, and larger objects are
+        copied chunk by chunk into an anonymous temporary file so they never sit in memory.
+        Objects of at least S3_RANGED_THRESHOLD bytes are fetched as parallel ranged GETs
+        written straight into the preallocated buffer or file.
+
+        Args:
+            key (str): The S3 object key (file path in S3)
+            spool_threshold (int): Size in bytes above which the stream spills to disk.
+                0 keeps every object in memory.
+            chunk_size (int): Size of the chunks copied when spilling to disk.
+
+        Returns:
+            IO[bytes]: Stream positioned at the start of the content if successful, None otherwise.
+            The caller is responsible for closing it.
+
+        Example:
+            s3_service = S3Service()
+            with s3_service.download_file_to_stream('documents/file.pdf') as stream:
+                reader = PdfReader(stream)
+        """
+
+        if not self.aws_s3_bucket:
+            logger.error("No bucket specified and no default bucket configured.")
+            return None
+
+        try:
+            if self.cache or self.ranged_threshold:
+                head = self.client.head_object(Bucket=self.aws_s3_bucket, Key=key)
+                size, etag = head['ContentLength'], head['ETag']
+            if self.cache:
+                stream = self._open_cached(key, size, etag, chunk_size)
+                if not spool_threshold or size <= spool_threshold:
+                    with stream:
+                        stream = io.BytesIO(stream.read())
+            elif self.ranged_threshold and self._use_ranged(size):
+                if not spool_threshold or size <= spool_threshold:
+                    stream = self._download_to_stream(key, size, etag, chunk_size)
+                else:
+                    stream = tempfile.TemporaryFile()
+                    try:
+                        self._download_to_file(stream, key, size, etag, chunk_size)
+                    except Exception:
+                        stream.close()
+                        raise
+            else:
+                response = self.client.get_object(Bucket=self.aws_s3_bucket, Key=key)
+                content_length = response.get('ContentLength', 0)
+
+                if not spool_threshold or content_length <= spool_threshold:
+                    stream = io.BytesIO(response['Body'].read())
+                else:
+                    stream = tempfile.TemporaryFile()
+                    try:
+                        for chunk in response['Body'].iter_chunks(chunk_size):
+                            stream.write(chunk)
+                        stream.seek(0)
+                    except Exception:
+                        stream.close()
+                        raise
+
+            logger.info(f"Successfully downloaded {key} from {self.aws_s3_bucket} to stream")
+            return stream
+
         except Exception as e:
-            logger.error(f"Unexpected error downloading file {key}: {e}")
+            self._log_download_error(key, e)
             return None
@@ -61,6 +61,7 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'main.lib.tracing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -244,3 +245,95 @@ SECURE_SSL_REDIRECT = not DEBUG
 SECURE_HSTS_SECONDS = 31536000  # 1 year
 SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 SECURE_HSTS_PRELOAD = True
+
+# Document ingestion
+# Downloaded documents are parsed from memory; objects larger than this (bytes) spill to a temp file
+DOCUMENT_SPOOL_THRESHOLD = int(os.getenv("DOCUMENT_SPOOL_THRESHOLD", 64 * 1024 * 1024))
+# Number of pages preprocessed and inserted together when streaming a document into chunks
+DOCUMENT_INGEST_BATCH_SIZE = int(os.getenv("DOCUMENT_INGEST_BATCH_SIZE", 16))
+# Process pool size for PDF page extraction, and the page count from which it is used
+DOCUMENT_EXTRACT_WORKERS = int(os.getenv("DOCUMENT_EXTRACT_WORKERS", 1))
+DOCUMENT_EXTRACT_MIN_PAGES = int(os.getenv("DOCUMENT_EXTRACT_MIN_PAGES", 50))
+# Background ingestion jobs (manage.py run_ingest_worker)
+# A running job that has not reported progress for this long is reclaimed by another worker
+INGEST_JOB_LEASE_SECONDS = int(os.getenv("INGEST_JOB_LEASE_SECONDS", 600))
+# Base delay before retrying a failed job, doubled after every attempt
+INGEST_JOB_RETRY_DELAY_SECONDS = int(os.getenv("INGEST_JOB_RETRY_DELAY_SECONDS", 30))
+# Number of chunk rows accumulated and written per bulk_create INSERT
+DOCUMENT_CHUNK_INSERT_BATCH_SIZE = int(os.getenv("DOCUMENT_CHUNK_INSERT_BATCH_SIZE", 64))
+# Ingestion pipeline: items buffered between stages, and threads running NLP. The threads share one
+# NLPPreprocessor (and its models); preprocess_batch keeps no per-call state, so they don't interfere
+DOCUMENT_PIPELINE_QUEUE_SIZE = int(os.getenv("DOCUMENT_PIPELINE_QUEUE_SIZE", 4))
+DOCUMENT_NLP_WORKERS = int(os.getenv("DOCUMENT_NLP_WORKERS", 1))
+
+# Chat
+# LLM provider: "openai", "fake" (a local stand-in for load testing) or the dotted path of a factory
+# called with model and json_mode
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+# Fake provider: median time to first token and the spread of its lognormal distribution (0 is fixed),
+# tokens per second after that (0 is instant), answer length in words and the latency seed
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 800))
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", 0.3))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 60))
+FAKE_LLM_ANSWER_WORDS = int(os.getenv("FAKE_LLM_ANSWER_WORDS", 60))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", 0))
+# LLM clients are shared per process: connections kept alive to the provider, overall deadline of a
+# call, and retries of timeouts, connection errors, 429s and 5xx with jittered exponential backoff
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", 60))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", 30))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BASE_DELAY_MS = float(os.getenv("LLM_RETRY_BASE_DELAY_MS", 250))
+# Hedging: send a second request when the first is slower than the p95 of recent calls (once this many
+# calls have been timed), and use whichever answers first
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+# Circuit breaker: after this many consecutive failures, LLM calls fail fast for LLM_BREAKER_RESET_SECONDS
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+# Admission control, per worker process: LLM calls running at once, requests that may wait for a slot
+# (beyond that new conversations get 429) and how long one may wait before a 503. Requests continuing
+# a conversation are admitted ahead of new ones
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", 32))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", 10))
+# Threads running retrieval for the async retrieval view (each may hold a DB connection)
+RETRIEVAL_THREADS = int(os.getenv("RETRIEVAL_THREADS", 4))
+# Conversation history sent to the LLM: at most this many recent turns, within this many tokens
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", 6))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))
+# Older messages are folded into the conversation summary once this many are waiting
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", 4))
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+# Semantic answer cache for first-turn questions: minimum cosine similarity to reuse an answer
+# retrieved with the same context, entry lifetime in seconds (0 disables it) and entries per context
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 24 * 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 50))
+# Retrieved context is compressed to the sentences most relevant to the query within this many tokens
+# (0 sends chunks whole); sentences at least this similar to one already kept are dropped as duplicates
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1200))
+CONTEXT_DEDUPE_THRESHOLD = float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", 0.95))
+
+# Observability
+# Per-stage request timings are returned in a Server-Timing header (turn off to hide them from clients)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+# Application logs are written as JSON lines to stdout by a background thread, so requests never block on them
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "queue": {"()": "main.lib.log_queue.QueueLogHandler"},
+    },
+    "loggers": {
+        "ai": {"handlers": ["queue"], "level": LOG_LEVEL, "propagate": False},
+        "main": {"handlers": ["queue"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
+# Metrics served at /api/metrics/ in the Prometheus text format. With METRICS_DIR set, each process (gunicorn
+# worker, ingestion worker) writes its values there at most every METRICS_FLUSH_SECONDS and the endpoint adds
+# them all up; empty the directory when the server starts. Unset, each worker reports only its own metrics
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 5))
@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from main.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/ai/', include('ai.urls')),
     path("api/auth/", include("dj_rest_auth.urls")),
     path("api/auth/register/", include("dj_rest_auth.registration.urls")),
+    path("api/metrics/", MetricsView.as_view(), name="metrics"),
 ]
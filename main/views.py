@@ -0,0 +1,13 @@
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from main.lib import metrics
+
+class MetricsView(APIView):
+    """Request, retrieval, LLM, cache and ingestion metrics of all workers, in the Prometheus text format"""
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
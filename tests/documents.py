@@ -0,0 +1,87 @@
+"""
+Small PDF and DOCX documents built in memory for the loader and corpus tests.
+The PDF uses the standard Helvetica font, so pypdf extracts the text back as written.
+"""
+
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+TOPICS = ["Admissions", "Tuition", "Housing", "Advising", "Graduation", "Scholarships", "Library", "Parking", "Dining"]
+
+
+def sample_pages(page_count, paragraphs_per_page=3, seed=0):
+    """Return page_count distinct pages of short, deterministic text."""
+    pages = []
+    for page in range(page_count):
+        topic = TOPICS[(page + seed) % len(TOPICS)]
+        pages.append("\n".join(
+            f"{topic} policy {seed}.{page}.{paragraph} applies to every enrolled student this term."
+            for paragraph in range(paragraphs_per_page)
+        ))
+    return pages
+
+
+def build_pdf(pages):
+    """Build a PDF with one page per text and return its bytes."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        lines = " T*\n".join(f"({line.replace('(', '[').replace(')', ']')}) Tj" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td\n{lines}\nET".encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>".encode()
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref_offset = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    out.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def build_docx(pages):
+    """Build a DOCX with a page break between texts and return its bytes."""
+    body = []
+    for index, text in enumerate(pages):
+        body.extend(f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' for line in text.split("\n"))
+        if index < len(pages) - 1:
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'
+        )
+        archive.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        )
+        archive.writestr(
+            "word/document.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{"".join(body)}</w:body></w:document>'
+        )
+    return out.getvalue()
@@ -0,0 +1,217 @@
+"""
+Test file for admission control of LLM calls.
+Tests slot limits, the bounded priority queue, deadlines, async waiters, and 429/503 responses and stats from the views.
+"""
+
+import asyncio
+import threading
+import time
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from unittest.mock import Mock, patch
+from ai.lib.admission import CONTINUING, NEW, AdmissionController, AdmissionRejected, get_admission_controller
+from ai.models.conversation import Conversation, Message
+from ai.views.retrieval import HybridRetrievalView
+
+ANSWER = '{"answer": "Enrollment opens in June.", "reason": "Handbook"}'
+
+
+class AdmissionControllerTestCase(SimpleTestCase):
+    @override_settings(LLM_CONCURRENCY=3, LLM_QUEUE_SIZE=0)
+    def test_controller_follows_settings(self):
+        """Test that the process-wide controller is rebuilt when its settings change."""
+        self.assertEqual(get_admission_controller().max_concurrent, 3)
+        self.assertEqual(get_admission_controller().max_queue, 0)
+        self.assertIs(get_admission_controller(), get_admission_controller())
+
+    def _wait_in_thread(self, controller, priority, outcomes, name, waiting):
+        """Start a request in a thread and return once waiting requests (queued or finished) are accounted for"""
+        def wait():
+            try:
+                slot = controller.enter(priority)
+            except AdmissionRejected as e:
+                outcomes.append((name, e.status))
+            else:
+                outcomes.append((name, "admitted"))
+                slot.release()
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        # Let the thread reach the queue
+        while controller.stats()["queued"] + len(outcomes) < waiting:
+            time.sleep(0.001)
+        return thread
+
+    def test_slots_are_limited(self):
+        """Test that up to max_concurrent requests are admitted at once and released slots are reused."""
+        controller = AdmissionController(max_concurrent=2, max_queue=0, timeout=1)
+
+        first = controller.enter()
+        controller.enter()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.enter()
+        first.release()
+        first.release()
+
+        self.assertEqual(rejected.exception.status, 429)
+        self.assertGreaterEqual(int(rejected.exception.headers["Retry-After"]), 1)
+        self.assertEqual(controller.stats()["in_flight"], 1)
+        controller.enter()
+
+    def test_continuing_conversations_go_first(self):
+        """Test that a waiting follow-up turn gets the next slot before an earlier new conversation."""
+        controller = AdmissionController(max_concurrent=1, max_queue=2, timeout=5)
+        slot = controller.enter()
+        outcomes = []
+        new = self._wait_in_thread(controller, NEW, outcomes, "new", waiting=1)
+        continuing = self._wait_in_thread(controller, CONTINUING, outcomes, "continuing", waiting=2)
+
+        slot.release()
+        new.join()
+        continuing.join()
+
+        self.assertEqual(outcomes, [("continuing", "admitted"), ("new", "admitted")])
+
+    def test_full_queue_rejects_new_and_evicts_for_continuing(self):
+        """Test that a full queue turns away new conversations, but a follow-up takes the newest new one's place."""
+        controller = AdmissionController(max_concurrent=1, max_queue=1, timeout=5)
+        slot = controller.enter()
+        outcomes = []
+        new = self._wait_in_thread(controller, NEW, outcomes, "new", waiting=1)
+
+        with self.assertRaises(AdmissionRejected):
+            controller.enter(NEW)
+        continuing = self._wait_in_thread(controller, CONTINUING, outcomes, "continuing", waiting=2)
+        new.join()
+        slot.release()
+        continuing.join()
+
+        self.assertEqual(outcomes, [("new", 429), ("continuing", "admitted")])
+        stats = controller.stats()
+        self.assertEqual((stats["rejected"], stats["evicted"]), (2, 1))
+
+    def test_wait_deadline(self):
+        """Test that a request waiting longer than the timeout gets 503 and leaves the queue."""
+        controller = AdmissionController(max_concurrent=1, max_queue=5, timeout=0.05)
+        controller.enter()
+
+        started = time.perf_counter()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.enter(CONTINUING)
+
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+        self.assertEqual(rejected.exception.status, 503)
+        self.assertEqual(controller.stats()["queued"], 0)
+        self.assertEqual(controller.stats()["timed_out"], 1)
+
+    def test_async_waiters(self):
+        """Test that async requests wait without blocking the loop, and a cancelled waiter gives its place back."""
+        controller = AdmissionController(max_concurrent=1, max_queue=5, timeout=5)
+
+        async def run():
+            order = []
+
+            async def request(name, hold):
+                async with controller.aadmit():
+                    order.append(name)
+                    await asyncio.sleep(hold)
+
+            await asyncio.gather(request("a", 0.05), request("b", 0), request("c", 0))
+            cancelled = asyncio.ensure_future(request("d", 0))
+            async with controller.aadmit():
+                await asyncio.sleep(0.01)
+                cancelled.cancel()
+            return order
+
+        self.assertEqual(asyncio.run(run()), ["a", "b", "c"])
+        stats = controller.stats()
+        self.assertEqual((stats["in_flight"], stats["queued"]), (0, 0))
+        self.assertGreaterEqual(stats["wait_seconds"]["max"], 0.05)
+        self.assertIsNotNone(stats["service_seconds"])
+
+
+@patch("ai.views.retrieval.get_chat_model")
+class AdmissionViewTestCase(TestCase):
+    def setUp(self):
+        """Set up a user, a conversation, a retriever stub and a controller with one slot and no queue."""
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.conversation = Conversation.objects.create(user=self.user)
+        retrieve = patch.object(HybridRetrievalView, "_retrieve", return_value=[])
+        retrieve.start()
+        self.addCleanup(retrieve.stop)
+        self.controller = AdmissionController(max_concurrent=1, max_queue=0)
+        controller = patch("ai.views.retrieval.get_admission_controller", return_value=self.controller)
+        controller.start()
+        self.addCleanup(controller.stop)
+
+    def _post(self, path="/api/ai/retrieve/"):
+        return self.client.post(
+            path, {"conversation_id": self.conversation.id, "query": "When is enrollment?"}, format="json"
+        )
+
+    def test_saturated_server_answers_429(self, mock_get_chat_model):
+        """Test that with every slot taken and no queue the chat endpoints refuse at once without calling the LLM."""
+        slot = self.controller.enter()
+        self.addCleanup(slot.release)
+
+        for path in ("/api/ai/retrieve/", "/api/ai/retrieve/stream/"):
+            response = self._post(path)
+            self.assertEqual(response.status_code, 429)
+            self.assertIn("Retry-After", response)
+        self.assertFalse(mock_get_chat_model.return_value.invoke.called)
+        self.assertFalse(Message.objects.exists())
+
+    def test_slot_is_released_after_answering(self, mock_get_chat_model):
+        """Test that sync and streamed answers give their slot back."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content=ANSWER)
+        mock_get_chat_model.return_value.stream.return_value = [Mock(content=ANSWER)]
+
+        self.assertEqual(self._post().status_code, 200)
+        response = self._post("/api/ai/retrieve/stream/")
+        b"".join(response.streaming_content)
+        response.close()
+
+        self.assertEqual(self.controller.stats()["in_flight"], 0)
+        self.assertEqual(self.controller.stats()["admitted"], 2)
+
+    @override_settings(HISTORY_MAX_TURNS=1, HISTORY_SUMMARY_BATCH=2)
+    def test_summary_runs_after_the_answer_under_a_slot(self, mock_get_chat_model):
+        """Test that a request due a history summary makes that LLM call after saving the answer, holding a slot."""
+        for number in range(3):
+            Message.objects.create(conversation=self.conversation, role="user", content=f"Question {number}")
+            Message.objects.create(conversation=self.conversation, role="assistant", content=f"Answer {number}")
+        calls = []
+
+        def answer(messages):
+            calls.append(("answer", self.controller.stats()["in_flight"], Message.objects.count()))
+            return Mock(content=ANSWER)
+
+        def summarize(messages):
+            calls.append(("summary", self.controller.stats()["in_flight"], Message.objects.count()))
+            return Mock(content="Summary so far")
+
+        mock_get_chat_model.return_value.invoke.side_effect = answer
+        with patch("ai.lib.history.get_chat_model") as mock_summary_model:
+            mock_summary_model.return_value.invoke.side_effect = summarize
+            self.assertEqual(self._post().status_code, 200)
+
+        self.assertEqual(calls, [("answer", 1, 6), ("summary", 1, 8)])
+        self.assertEqual(self.controller.stats()["admitted"], 2)
+        self.assertEqual(self.controller.stats()["in_flight"], 0)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "Summary so far")
+
+    def test_stats_are_admin_only(self, mock_get_chat_model):
+        """Test that queue depth and wait times are served to admins only."""
+        self.assertEqual(self.client.get("/api/ai/retrieve/admission/").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+
+        response = self.client.get("/api/ai/retrieve/admission/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["max_concurrent"], 1)
+        self.assertIn("p95", response.data["wait_seconds"])
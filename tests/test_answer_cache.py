@@ -0,0 +1,134 @@
+"""
+Test file for the semantic answer cache.
+Tests similarity matching, context signatures, invalidation on chunk changes and cache hits in the retrieval view.
+"""
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from unittest.mock import Mock, patch
+from ai.lib.answer_cache import AnswerCache
+from ai.models.conversation import Conversation, Message
+from ai.models.document import Document, DocumentChunk
+from ai.views.retrieval import HybridRetrievalView
+
+
+def make_chunk(document, text):
+    return DocumentChunk.objects.create(
+        document=document, text=text, tokens_json=[], embedding_json=[], pos_json=[], entity_json=[],
+        content_hash=str(hash(text))
+    )
+
+
+class AnswerCacheTestCase(TestCase):
+    def setUp(self):
+        """Set up two chunks and an empty cache."""
+        cache.clear()
+        document = Document.objects.create(file_url="knowledge-base/handbook.pdf")
+        self.chunks = [make_chunk(document, "Enrollment opens in June."), make_chunk(document, "Fees are due in July.")]
+        self.answer_cache = AnswerCache(threshold=0.9, ttl=60, max_entries=2)
+
+    def test_paraphrase_with_same_context_hits(self):
+        """Test that a nearby query embedding with the same chunks returns the stored answer."""
+        self.answer_cache.store([1.0, 0.0, 0.0], self.chunks, "In June.", "Handbook")
+
+        cached = self.answer_cache.lookup([0.98, 0.1, 0.0], list(reversed(self.chunks)))
+
+        self.assertEqual(cached["answer"], "In June.")
+        self.assertEqual(cached["reason"], "Handbook")
+        self.assertGreater(cached["similarity"], 0.9)
+
+    def test_distant_query_or_other_context_misses(self):
+        """Test that a different question or a different set of chunks does not match."""
+        self.answer_cache.store([1.0, 0.0, 0.0], self.chunks, "In June.", "Handbook")
+
+        self.assertIsNone(self.answer_cache.lookup([0.0, 1.0, 0.0], self.chunks))
+        self.assertIsNone(self.answer_cache.lookup([1.0, 0.0, 0.0], self.chunks[:1]))
+        self.assertIsNone(self.answer_cache.lookup([1.0, 0.0, 0.0], []))
+
+    def test_changed_chunk_invalidates_entries(self):
+        """Test that re-ingesting one of the chunks stops the entry from matching."""
+        self.answer_cache.store([1.0, 0.0, 0.0], self.chunks, "In June.", "Handbook")
+        self.chunks[0].text = "Enrollment opens in May."
+        self.chunks[0].content_hash = "updated"
+        self.chunks[0].save()
+
+        self.assertIsNone(self.answer_cache.lookup([1.0, 0.0, 0.0], self.chunks))
+
+    def test_keeps_newest_entries(self):
+        """Test that only max_entries questions are kept per context."""
+        for number, embedding in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])):
+            self.answer_cache.store(embedding, self.chunks, f"Answer {number}", "Handbook")
+
+        self.assertIsNone(self.answer_cache.lookup([1.0, 0.0, 0.0], self.chunks))
+        self.assertEqual(self.answer_cache.lookup([0.0, 0.0, 1.0], self.chunks)["answer"], "Answer 2")
+
+    def test_zero_ttl_disables_cache(self):
+        """Test that ttl=0 neither stores nor matches."""
+        answer_cache = AnswerCache(threshold=0.9, ttl=0)
+        answer_cache.store([1.0, 0.0, 0.0], self.chunks, "In June.", "Handbook")
+
+        self.assertIsNone(answer_cache.lookup([1.0, 0.0, 0.0], self.chunks))
+
+
+@patch("ai.views.retrieval.get_chat_model")
+class AnswerCacheViewTestCase(TestCase):
+    def setUp(self):
+        """Set up a user, a retrievable chunk and a retriever stub that reports a query embedding."""
+        cache.clear()
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        document = Document.objects.create(file_url="knowledge-base/handbook.pdf", description="Handbook")
+        self.chunk = make_chunk(document, "Enrollment opens in June.")
+        similar_text = [{"id": self.chunk.id, "text": self.chunk.text, "source": "Handbook"}]
+
+        def retrieve(view, query):
+            view.query_embedding = [1.0, 0.0] if "enrol" in query.lower() else [0.0, 1.0]
+            return similar_text
+
+        patcher = patch.object(HybridRetrievalView, "_retrieve", retrieve)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _ask(self, query, conversation=None):
+        conversation = conversation or Conversation.objects.create(user=self.user)
+        return self.client.post(
+            "/api/ai/retrieve/", {"conversation_id": conversation.id, "query": query}, format="json"
+        )
+
+    def test_paraphrase_is_answered_from_cache(self, mock_get_chat_model):
+        """Test that a paraphrased first question reuses the answer and reports the hit."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content='{"answer": "In June.", "reason": "Handbook"}')
+
+        first = self._ask("When is enrollment?")
+        second = self._ask("When does enrolment open?")
+
+        self.assertFalse(first.data["metadata"]["cache_hit"])
+        self.assertTrue(second.data["metadata"]["cache_hit"])
+        self.assertEqual(second.data["answer"], "In June.")
+        self.assertEqual(mock_get_chat_model.return_value.invoke.call_count, 1)
+        # The cached turn is still saved to its conversation
+        self.assertEqual(Message.objects.get(id=second.data["message_id"]).content, "In June.")
+
+    def test_follow_up_questions_skip_cache(self, mock_get_chat_model):
+        """Test that a question with history always goes to the LLM."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content='{"answer": "In June.", "reason": "Handbook"}')
+        self._ask("When is enrollment?")
+        conversation = Conversation.objects.create(user=self.user)
+        Message.objects.create(conversation=conversation, role="user", content="Hi")
+
+        response = self._ask("When is enrollment?", conversation=conversation)
+
+        self.assertFalse(response.data["metadata"]["cache_hit"])
+        self.assertEqual(mock_get_chat_model.return_value.invoke.call_count, 2)
+
+    def test_unparsed_answers_are_not_cached(self, mock_get_chat_model):
+        """Test that raw output the view could not parse is never served from the cache."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content="Sorry, something went wrong")
+
+        self._ask("When is enrollment?")
+        response = self._ask("When is enrollment?")
+
+        self.assertFalse(response.data["metadata"]["cache_hit"])
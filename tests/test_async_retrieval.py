@@ -0,0 +1,75 @@
+"""
+Test file for the async retrieval view.
+Tests authentication, validation, awaiting the LLM and persisting messages with the async ORM.
+"""
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from unittest.mock import AsyncMock, Mock, patch
+from ai.models.conversation import Conversation, Message
+from ai.models.document import Document, DocumentChunk
+
+
+class AsyncHybridRetrievalViewTestCase(TestCase):
+    def setUp(self):
+        """Set up a user with a JWT, a conversation with history and one retrievable chunk."""
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.conversation = Conversation.objects.create(user=self.user)
+        Message.objects.create(conversation=self.conversation, role="user", content="Hi")
+        Message.objects.create(conversation=self.conversation, role="assistant", content="Hello!")
+        document = Document.objects.create(file_url="knowledge-base/handbook.pdf")
+        self.chunk = DocumentChunk.objects.create(
+            document=document, text="Enrollment opens in June.", tokens_json=[], embedding_json=[],
+            pos_json=[], entity_json=[]
+        )
+        self.similar_text = [{"id": self.chunk.id, "source": document.file_url, "text": self.chunk.text}]
+
+    async def _post(self, data, headers=None):
+        return await self.async_client.post(
+            "/api/ai/retrieve/async/", data, content_type="application/json",
+            headers=self.headers if headers is None else headers
+        )
+
+    @patch("ai.views.retrieval.get_chat_model")
+    async def test_answers_and_saves_messages(self, mock_get_chat_model):
+        """Test that the view awaits the LLM with the history and saves both messages with their context."""
+        mock_get_chat_model.return_value.ainvoke = AsyncMock(
+            return_value=Mock(content='{"answer": "In June.", "reason": "Handbook"}')
+        )
+
+        with patch("ai.views.retrieval.AsyncHybridRetrievalView._retrieve", return_value=self.similar_text):
+            response = await self._post({"conversation_id": self.conversation.id, "query": "When is enrollment?"})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["answer"], "In June.")
+        for stage in ("history_load", "document_lookup", "llm", "persist"):
+            self.assertIn(f"{stage};dur=", response["Server-Timing"])
+        self.assertEqual(body["context"], self.similar_text)
+
+        messages = mock_get_chat_model.return_value.ainvoke.call_args.args[0]
+        self.assertEqual([message.content for message in messages[1:]], ["Hi", "Hello!", "When is enrollment?"])
+        assistant_message = await Message.objects.filter(conversation=self.conversation).order_by("-id").afirst()
+        self.assertEqual(assistant_message.content, "In June.")
+        self.assertEqual([chunk async for chunk in DocumentChunk.objects.filter(chatturn=assistant_message.turn_id)], [self.chunk])
+        self.assertEqual(await Message.objects.filter(conversation=self.conversation).acount(), 4)
+
+    async def test_requires_authentication(self):
+        """Test that requests without a valid JWT are rejected."""
+        response = await self._post({"conversation_id": self.conversation.id, "query": "Hi"}, headers={})
+        self.assertEqual(response.status_code, 401)
+
+        response = await self._post(
+            {"conversation_id": self.conversation.id, "query": "Hi"}, headers={"Authorization": "Bearer invalid"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_validates_request(self):
+        """Test that a missing field or an unknown conversation is reported without calling the LLM."""
+        response = await self._post({"query": "Hi"})
+        self.assertEqual(response.status_code, 400)
+
+        response = await self._post({"conversation_id": 999999, "query": "Hi"})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,94 @@
+"""
+Test file for the ContextCompressor.
+Tests sentence splitting, relevance-ranked selection within a token budget, deduplication and prompt token reporting.
+"""
+
+import numpy as np
+from django.test import SimpleTestCase
+from unittest.mock import patch
+from ai.lib.compressor import ContextCompressor, split_sentences
+from ai.views.retrieval import RetrievalMixin
+
+VOCABULARY = ["enrollment", "june", "fees", "july", "library", "hours", "parking"]
+
+
+def bag_of_words(texts):
+    """A stand-in sentence encoder: one dimension per vocabulary word."""
+    return np.array([[float(word in text.lower()) for word in VOCABULARY] for text in texts])
+
+
+def word_count(text):
+    return len(text.split())
+
+
+@patch("ai.lib.compressor.count_tokens", side_effect=word_count)
+class ContextCompressorTestCase(SimpleTestCase):
+    def setUp(self):
+        """Set up two chunks with mostly irrelevant sentences."""
+        self.chunks = [
+            {"id": 1, "source": "Handbook", "text": "The library hours are long. Enrollment opens in June.\nParking is limited."},
+            {"id": 2, "source": "Calendar", "text": "Enrollment opens in June. Fees are due in July. Library hours vary."},
+        ]
+        self.query = bag_of_words(["enrollment june fees"])[0]
+
+    def test_split_sentences(self, mock_count_tokens):
+        """Test that sentences split on terminal punctuation and line breaks."""
+        self.assertEqual(
+            split_sentences("First one. Second one?\n\n• Bullet item\nThird!"),
+            ["First one.", "Second one?", "• Bullet item", "Third!"]
+        )
+
+    def test_keeps_most_relevant_sentences_within_budget(self, mock_count_tokens):
+        """Test that the most similar sentences are kept, in reading order, within the budget."""
+        compressor = ContextCompressor(token_budget=9, dedupe_threshold=0.95, encode=bag_of_words)
+
+        compressed = compressor.compress(self.query, self.chunks)
+
+        self.assertEqual([chunk["id"] for chunk in compressed], [1, 2])
+        self.assertEqual(compressed[0]["text"], "Enrollment opens in June.")
+        self.assertEqual(compressed[1]["text"], "Fees are due in July.")
+        self.assertLessEqual(sum(word_count(chunk["text"]) for chunk in compressed), 9)
+        self.assertEqual(compressed[0]["source"], "Handbook")
+
+    def test_repeated_sentences_are_kept_once(self, mock_count_tokens):
+        """Test that a sentence present in two chunks only appears in the first, even when all text fits."""
+        compressor = ContextCompressor(token_budget=1000, encode=bag_of_words)
+
+        compressed = compressor.compress(self.query, self.chunks)
+
+        text = " ".join(chunk["text"] for chunk in compressed)
+        self.assertEqual(text.count("Enrollment opens in June."), 1)
+        self.assertIn("Parking is limited.", text)
+
+    def test_near_duplicates_are_dropped(self, mock_count_tokens):
+        """Test that a sentence too similar to a kept one is skipped in favour of new information."""
+        chunks = [{"id": 1, "source": "A", "text": "Enrollment opens in June. Enrollment for June opens soon. Fees due July."}]
+        compressor = ContextCompressor(token_budget=10, dedupe_threshold=0.95, encode=bag_of_words)
+
+        compressed = compressor.compress(self.query, chunks)
+
+        self.assertEqual(compressed[0]["text"], "Enrollment opens in June. Fees due July.")
+
+    def test_without_encoder_keeps_reading_order(self, mock_count_tokens):
+        """Test that without sentence embeddings the first sentences that fit are kept."""
+        compressed = ContextCompressor(token_budget=8).compress(None, self.chunks)
+
+        self.assertEqual(compressed, [{"id": 1, "source": "Handbook", "text": "The library hours are long. Parking is limited."}])
+
+    def test_zero_budget_disables_compression(self, mock_count_tokens):
+        """Test that a budget of 0 returns the chunks unchanged."""
+        self.assertIs(ContextCompressor(token_budget=0).compress(self.query, self.chunks), self.chunks)
+
+    def test_prompt_tokens_reported(self, mock_count_tokens):
+        """Test that building the prompt records token counts before and after compression."""
+        view = RetrievalMixin()
+        view.query_embedding = self.query
+        view.encoder = bag_of_words
+
+        with self.settings(CONTEXT_TOKEN_BUDGET=9), patch("ai.views.retrieval.count_tokens", side_effect=word_count):
+            messages = view._build_messages([], self.chunks, "When is enrollment?")
+
+        self.assertIn("Enrollment opens in June.", messages[0].content)
+        self.assertNotIn("Parking", messages[0].content)
+        self.assertEqual(view.prompt_tokens["after"], sum(word_count(message.content) for message in messages))
+        self.assertGreater(view.prompt_tokens["before"], view.prompt_tokens["after"])
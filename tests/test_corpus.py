@@ -0,0 +1,132 @@
+"""
+Test file for bulk corpus ingestion.
+Tests source resolution, checkpointed resume and the ingest_corpus command.
+"""
+
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import Mock, patch
+from django.core.management import call_command
+from django.test import TestCase
+from ai.lib.corpus import CorpusCheckpoint, CorpusIngestor, resolve_sources
+from ai.models.document import Document, DocumentChunk
+from tests.documents import sample_pages, build_pdf, build_docx
+from main.services.s3 import S3Service, LocalFilesystemClient
+from tests.test_ingestion import fake_nlp_batch
+
+
+class CorpusIngestionTestCase(TestCase):
+    def setUp(self):
+        """Write a small corpus of synthetic documents to a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.corpus = os.path.join(self.directory.name, "corpus")
+        os.makedirs(os.path.join(self.corpus, "policies"))
+
+        self.files = {
+            os.path.join(self.corpus, "catalog.pdf"): build_pdf(sample_pages(4, seed=1)),
+            os.path.join(self.corpus, "policies", "handbook.docx"): build_docx(sample_pages(3, seed=2)),
+            os.path.join(self.corpus, "policies", "schedule.pdf"): build_pdf(sample_pages(2, seed=3)),
+        }
+        for path, content in self.files.items():
+            with open(path, "wb") as f:
+                f.write(content)
+        with open(os.path.join(self.corpus, "notes.txt"), "w") as f:
+            f.write("not a document")
+
+        self.checkpoint_path = os.path.join(self.directory.name, "checkpoint.jsonl")
+        self.nlp_processor = Mock()
+        self.nlp_processor.preprocess_batch.side_effect = fake_nlp_batch
+
+    def _ingestor(self, sources=None):
+        return CorpusIngestor(
+            sources or resolve_sources([self.corpus]),
+            CorpusCheckpoint(self.checkpoint_path),
+            workers=2,
+            nlp_processor=self.nlp_processor
+        )
+
+    def test_resolve_sources(self):
+        """Test that directories, manifests and S3 prefixes expand to supported documents only."""
+        manifest = os.path.join(self.directory.name, "manifest.txt")
+        with open(manifest, "w") as f:
+            f.write("# knowledge base\nknowledge-base/a.pdf\n\nknowledge-base/a.pdf\n")
+
+        client = LocalFilesystemClient(self.directory.name)
+        os.makedirs(os.path.join(self.directory.name, "bucket"))
+        client.put_object(Bucket="bucket", Key="kb/b.docx", Body=b"")
+        client.put_object(Bucket="bucket", Key="kb/c.png", Body=b"")
+        s3_service = S3Service(client=client, use_cache=False)
+        s3_service.aws_s3_bucket = "bucket"
+
+        sources = resolve_sources([self.corpus], manifest=manifest, prefix="kb/", s3_service=s3_service)
+
+        self.assertEqual(sources, ["knowledge-base/a.pdf", *sorted(self.files), "kb/b.docx"])
+
+    def test_ingest_corpus_writes_every_document(self):
+        """Test that every document is ingested, chunked and checkpointed."""
+        ingestor = self._ingestor()
+        ingestor.run()
+
+        self.assertEqual(len(ingestor.succeeded), 3)
+        self.assertEqual(Document.objects.count(), 3)
+        pdf = Document.objects.get(file_url=os.path.join(self.corpus, "catalog.pdf"))
+        self.assertEqual(DocumentChunk.objects.filter(document=pdf).count(), 4)
+        self.assertEqual(len(CorpusCheckpoint(self.checkpoint_path).completed), 3)
+        self.assertEqual(ingestor.pages_ingested, DocumentChunk.objects.count())
+        metrics = {stage["stage"]: stage for stage in ingestor.metrics}
+        self.assertEqual(metrics["download"]["items"], 3)
+        self.assertEqual(metrics["insert"]["items"], 3)
+
+    def test_resume_skips_checkpointed_documents(self):
+        """Test that a second run only processes documents missing from the checkpoint."""
+        sources = resolve_sources([self.corpus])
+        self._ingestor(sources[:1]).run()
+        calls = self.nlp_processor.preprocess_batch.call_count
+
+        ingestor = self._ingestor(sources)
+        ingestor.run()
+
+        self.assertEqual(ingestor.skipped, sources[:1])
+        self.assertEqual(len(ingestor.succeeded), 2)
+        self.assertEqual(Document.objects.count(), 3)
+        self.assertGreater(self.nlp_processor.preprocess_batch.call_count, calls)
+
+    def test_interrupted_document_is_completed_in_place(self):
+        """Test that a document left half-written by an interrupted run is completed, not duplicated."""
+        source = os.path.join(self.corpus, "catalog.pdf")
+        self._ingestor([source]).run()
+        document = Document.objects.get(file_url=source)
+        DocumentChunk.objects.filter(document=document, page_number__gte=2).delete()
+        os.unlink(self.checkpoint_path)
+
+        self._ingestor([source]).run()
+
+        self.assertEqual(Document.objects.filter(file_url=source).count(), 1)
+        self.assertEqual(DocumentChunk.objects.filter(document=document).count(), 4)
+
+    def test_failed_document_is_not_checkpointed(self):
+        """Test that a document that fails to parse is reported and retried on the next run."""
+        broken = os.path.join(self.corpus, "broken.pdf")
+        with open(broken, "wb") as f:
+            f.write(b"not a pdf")
+
+        ingestor = self._ingestor()
+        ingestor.run()
+
+        self.assertEqual([source for source, _ in ingestor.failed], [broken])
+        self.assertNotIn(broken, CorpusCheckpoint(self.checkpoint_path))
+
+    @patch("ai.lib.corpus.NLPPreprocessor")
+    def test_command_prints_stage_throughput(self, mock_nlp_class):
+        """Test that the management command reports per-stage throughput."""
+        mock_nlp_class.return_value = self.nlp_processor
+        stdout = StringIO()
+
+        call_command("ingest_corpus", self.corpus, checkpoint=self.checkpoint_path, workers=2, stdout=stdout)
+
+        output = stdout.getvalue()
+        self.assertIn("3 ingested, 0 skipped, 0 failed", output)
+        for stage in ("download", "parse", "nlp", "insert"):
+            self.assertIn(stage, output)
@@ -0,0 +1,164 @@
+"""
+Test file for the conversation history window.
+Tests turn and token limits, incremental rolling summaries and token counting.
+"""
+
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from unittest.mock import Mock, patch
+from ai.lib.history import ConversationHistory
+from ai.models.conversation import Conversation, Message
+from ai.utils.tokens import count_tokens
+
+
+def word_count(text):
+    return len(text.split())
+
+
+@patch("ai.lib.history.count_tokens", side_effect=word_count)
+class ConversationHistoryTestCase(TestCase):
+    def setUp(self):
+        """Set up a conversation and a stubbed summary model."""
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.conversation = Conversation.objects.create(user=self.user)
+        self.llm = Mock()
+        self.llm.invoke.return_value = Mock(content="Summary so far")
+        self.started = timezone.now() - timedelta(hours=1)
+        self.count = 0
+
+    def _add_turns(self, turns, words=3, same_time=False):
+        for _ in range(turns):
+            for role in ("user", "assistant"):
+                message = Message.objects.create(
+                    conversation=self.conversation, role=role, content=" ".join([f"m{self.count}"] * words)
+                )
+                # Distinct, increasing timestamps regardless of clock resolution, or all the same
+                offset = timedelta(seconds=0 if same_time else self.count)
+                Message.objects.filter(id=message.id).update(created_at=self.started + offset)
+                self.count += 1
+
+    def _history(self, **kwargs):
+        options = {"max_turns": 2, "token_budget": 100, "summary_batch": 2, "llm": self.llm, **kwargs}
+        return ConversationHistory(self.conversation, **options)
+
+    def _load(self, **kwargs):
+        """Load the window, then summarize as the views do once the answer is saved"""
+        history = self._history(**kwargs)
+        window = history.load()
+        history.summarize()
+        return window
+
+    def test_short_conversation_is_sent_verbatim(self, mock_count_tokens):
+        """Test that a conversation within the window is loaded in one query without summarizing."""
+        self._add_turns(2)
+        history = self._history()
+
+        with self.assertNumQueries(1):
+            window = history.load()
+            self.assertFalse(history.summarize())
+
+        self.assertEqual([message.content.split()[0] for message in window], ["m0", "m1", "m2", "m3"])
+        self.llm.invoke.assert_not_called()
+
+    def test_window_keeps_last_turns(self, mock_count_tokens):
+        """Test that only the last max_turns turns are kept and older ones are summarized."""
+        self._add_turns(5)
+
+        window = self._load()
+
+        self.assertEqual([message.content.split()[0] for message in window], ["m6", "m7", "m8", "m9"])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "Summary so far")
+        self.assertEqual(self.conversation.summarized_until, self.started + timedelta(seconds=5))
+        prompt = self.llm.invoke.call_args.args[0][1].content
+        self.assertIn("user: m0", prompt)
+        self.assertIn("assistant: m5", prompt)
+        self.assertNotIn("m6", prompt)
+
+    def test_window_respects_token_budget(self, mock_count_tokens):
+        """Test that the window stops at the token budget even within max_turns."""
+        self._add_turns(2, words=10)
+
+        window = self._load(token_budget=25)
+
+        self.assertEqual([message.content.split()[0] for message in window], ["m2", "m3"])
+
+    def test_summary_is_extended_incrementally(self, mock_count_tokens):
+        """Test that later updates only send the new messages along with the previous summary."""
+        self._add_turns(3)
+        self._load()
+        self._add_turns(1)
+        self.llm.invoke.return_value = Mock(content="Updated summary")
+
+        self._load()
+
+        prompt = self.llm.invoke.call_args.args[0][1].content
+        self.assertIn("Summary so far", prompt)
+        self.assertNotIn("m0", prompt)
+        self.assertIn("user: m2", prompt)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "Updated summary")
+
+    def test_messages_with_equal_timestamps(self, mock_count_tokens):
+        """Test that messages saved at the same time are each summarized exactly once."""
+        self._add_turns(5, same_time=True)
+
+        window = self._load()
+
+        self.assertEqual([message.content.split()[0] for message in window], ["m6", "m7", "m8", "m9"])
+        prompt = self.llm.invoke.call_args.args[0][1].content
+        self.assertIn("user: m0", prompt)
+        self.assertIn("assistant: m5", prompt)
+        self.assertNotIn("m6", prompt)
+
+        self._add_turns(1, same_time=True)
+        self._load()
+
+        prompt = self.llm.invoke.call_args.args[0][1].content
+        self.assertNotIn("m5", prompt)
+        self.assertIn("user: m6", prompt)
+        self.assertIn("assistant: m7", prompt)
+        self.assertEqual(self.llm.invoke.call_count, 2)
+
+    def test_load_does_not_summarize(self, mock_count_tokens):
+        """Test that loading the window never calls the LLM, and only reports that a summary is due."""
+        self._add_turns(5)
+        history = self._history()
+
+        history.load()
+
+        self.llm.invoke.assert_not_called()
+        self.assertTrue(history.summary_due())
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "")
+
+    def test_summary_waits_for_a_batch(self, mock_count_tokens):
+        """Test that fewer than summary_batch pending messages don't trigger an update."""
+        self._add_turns(3)
+
+        self._load(summary_batch=4)
+
+        self.llm.invoke.assert_not_called()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "")
+
+    def test_failed_summary_keeps_window(self, mock_count_tokens):
+        """Test that a failing summary model still returns the window and leaves the summary for later."""
+        self._add_turns(4)
+        self.llm.invoke.side_effect = TimeoutError("timed out")
+
+        window = self._load()
+
+        self.assertEqual(len(window), 4)
+        self.conversation.refresh_from_db()
+        self.assertIsNone(self.conversation.summarized_until)
+
+
+class CountTokensTestCase(TestCase):
+    @patch("ai.utils.tokens._encoding", return_value=None)
+    def test_estimate_without_tiktoken(self, mock_encoding):
+        """Test that token counts fall back to four characters per token."""
+        self.assertEqual(count_tokens("a" * 10), 3)
+        self.assertEqual(count_tokens(""), 0)
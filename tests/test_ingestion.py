@@ -0,0 +1,316 @@
+"""
+Test file for the DocumentIngestor class.
+Tests batched streaming of pages through NLP and bulk chunk writes through ChunkWriter.
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from django.test import TestCase
+from unittest.mock import Mock, patch
+import numpy as np
+import spacy
+from ai.lib.ingestion import DocumentIngestor, ChunkWriter
+from ai.lib.nlp import NLPPreprocessor
+from ai.models.document import Document, DocumentChunk
+
+
+def fake_nlp_batch(texts, batch_size=None):
+    """Mimic NLPPreprocessor.preprocess_batch without loading any models."""
+    return [
+        {
+            "original_text": text,
+            "preprocessed_tokens": text.lower().split(),
+            "embeddings": np.ones(384),
+            "pos": [[token, "NOUN", "NN"] for token in text.split()],
+            "entities": [],
+        }
+        for text in texts
+    ]
+
+
+class DocumentIngestorTestCase(TestCase):
+    def setUp(self):
+        """Set up a document, a lazy page source and a stubbed NLP preprocessor."""
+        self.document = Document.objects.create(
+            file_url="knowledge-base/catalog.pdf",
+            description="Course catalog"
+        )
+        self.pages = [f"Page {number} about Computer Science" for number in range(1, 8)]
+        self.loader = Mock()
+        self.loader.iter_pages.side_effect = lambda: iter(self.pages)
+        self.nlp_processor = Mock()
+        self.nlp_processor.preprocess_batch.side_effect = fake_nlp_batch
+
+    def _ingestor(self, batch_size=3, insert_batch_size=None):
+        return DocumentIngestor(
+            self.document,
+            loader=self.loader,
+            nlp_processor=self.nlp_processor,
+            batch_size=batch_size,
+            insert_batch_size=insert_batch_size or batch_size
+        )
+
+    def test_ingest_writes_every_page(self):
+        """Test that every page becomes a chunk, in page order."""
+        written = self._ingestor().ingest()
+
+        self.assertEqual(written, len(self.pages))
+        chunks = DocumentChunk.objects.filter(document=self.document).order_by("id")
+        self.assertEqual([chunk.text for chunk in chunks], self.pages)
+        self.assertEqual(len(chunks[0].embedding_json), 384)
+
+    def test_ingest_processes_pages_in_batches(self):
+        """Test that NLP runs once per batch rather than once per page."""
+        self._ingestor(batch_size=3).ingest()
+
+        batch_sizes = [len(call.args[0]) for call in self.nlp_processor.preprocess_batch.call_args_list]
+        self.assertEqual(batch_sizes, [3, 3, 1])
+
+    def test_chunks_are_visible_before_last_batch(self):
+        """Test that earlier batches are committed while later ones are still being processed."""
+        seen_counts = []
+        ingestor = self._ingestor(batch_size=2)
+        ingestor.on_progress = lambda processed, total: seen_counts.append(
+            DocumentChunk.objects.filter(document=self.document).count()
+        )
+
+        ingestor.ingest()
+
+        self.assertEqual(seen_counts, [2, 4, 6, 6])
+        self.assertEqual(DocumentChunk.objects.filter(document=self.document).count(), 7)
+
+    def test_ingest_reports_stage_metrics(self):
+        """Test that ingest() runs as a pipeline and reports load, NLP and insert stages."""
+        ingestor = self._ingestor(batch_size=3)
+        ingestor.ingest()
+
+        self.assertEqual([stage["stage"] for stage in ingestor.metrics], ["load", "nlp", "insert"])
+        self.assertEqual([stage["items"] for stage in ingestor.metrics], [3, 3, 3])
+
+    def test_ingest_empty_document(self):
+        """Test that a document without text writes no chunks."""
+        self.pages = []
+
+        self.assertEqual(self._ingestor().ingest(), 0)
+        self.assertFalse(DocumentChunk.objects.filter(document=self.document).exists())
+
+    def test_inserts_are_decoupled_from_nlp_batches(self):
+        """Test that chunks accumulate across NLP batches until an insert batch is full."""
+        seen_counts = []
+        ingestor = self._ingestor(batch_size=2, insert_batch_size=5)
+        ingestor.on_progress = lambda processed, total: seen_counts.append(
+            DocumentChunk.objects.filter(document=self.document).count()
+        )
+
+        ingestor.ingest()
+
+        self.assertEqual(seen_counts, [0, 0, 6, 6])
+        self.assertEqual(DocumentChunk.objects.filter(document=self.document).count(), 7)
+
+
+def blank_nlp_processor():
+    """An NLPPreprocessor with a blank spaCy pipeline and a stub sentence encoder, so no models are loaded."""
+    nlp_processor = NLPPreprocessor.__new__(NLPPreprocessor)
+    nlp_processor.nlp_model = spacy.blank("en")
+    nlp_processor.sbert_model = Mock()
+    nlp_processor.sbert_model.encode.side_effect = lambda texts, **kwargs: np.zeros((len(texts), 384))
+    return nlp_processor
+
+
+class SharedNLPPreprocessorTestCase(TestCase):
+    def setUp(self):
+        self.pages = [f"Page {number} covers topic{number} and section{number * 7}" for number in range(240)]
+        # Switch threads as often as possible so any state shared between batches gets overwritten
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def test_concurrent_batches_keep_their_own_results(self):
+        """Test that threads sharing one preprocessor each get the analysis of their own texts."""
+        nlp_processor = blank_nlp_processor()
+        batches = [self.pages[start:start + 2] for start in range(0, len(self.pages), 2)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(nlp_processor.preprocess_batch, batches))
+
+        for batch, batch_results in zip(batches, results):
+            for text, result in zip(batch, batch_results):
+                self.assertEqual(result["original_text"], text)
+                self.assertEqual(result["original_tokens"], text.split())
+                self.assertEqual([token for token, _, _ in result["pos"]], text.split())
+
+    def test_nlp_workers_store_each_page_with_its_own_tokens(self):
+        """Test that ingesting with several NLP workers writes every chunk with the tags of its own page."""
+        document = Document.objects.create(file_url="knowledge-base/catalog.pdf", description="Course catalog")
+        loader = Mock()
+        loader.iter_pages.side_effect = lambda: iter(self.pages)
+
+        DocumentIngestor(
+            document, loader=loader, nlp_processor=blank_nlp_processor(), batch_size=2, insert_batch_size=16,
+            nlp_workers=4
+        ).ingest()
+
+        chunks = DocumentChunk.objects.filter(document=document)
+        self.assertEqual(chunks.count(), len(self.pages))
+        for chunk in chunks:
+            self.assertEqual([token for token, _, _ in chunk.pos_json], chunk.text.split())
+
+
+class ChunkWriterTestCase(TestCase):
+    def setUp(self):
+        """Set up a document and unsaved chunk rows."""
+        self.document = Document.objects.create(file_url="knowledge-base/catalog.pdf")
+        self.chunks = [
+            DocumentChunk(
+                document=self.document, text=f"Page {number}", tokens_json=["page"],
+                embedding_json=[0.1] * 384, pos_json=[], entity_json=[]
+            )
+            for number in range(10)
+        ]
+
+    def test_add_flushes_full_batches(self):
+        """Test that rows are only written once a full insert batch has accumulated."""
+        writer = ChunkWriter(self.document, batch_size=4)
+
+        writer.add(self.chunks[:3])
+        self.assertEqual(DocumentChunk.objects.count(), 0)
+
+        writer.add(self.chunks[3:6])
+        self.assertEqual(DocumentChunk.objects.count(), 6)
+        self.assertEqual(writer.pending, [])
+
+    def test_finalize_writes_remaining_rows(self):
+        """Test that finalize writes the partial last batch."""
+        writer = ChunkWriter(self.document, batch_size=4)
+        writer.add(self.chunks[:7])
+        writer.finalize()
+
+        self.assertEqual(writer.rows_written, 7)
+        self.assertEqual(DocumentChunk.objects.count(), 7)
+
+    @patch("ai.lib.ingestion.refresh_search_vectors")
+    def test_flush_builds_search_vectors_per_batch(self, mock_refresh_search_vectors):
+        """Test that each batch's search vectors are written along with it, not after the whole document."""
+        writer = ChunkWriter(self.document, batch_size=4)
+        writer.add(self.chunks[:4])
+
+        mock_refresh_search_vectors.assert_called_once()
+        refreshed = mock_refresh_search_vectors.call_args.args[0]
+        self.assertEqual(sorted(refreshed.values_list("id", flat=True)), [chunk.id for chunk in self.chunks[:4]])
+
+    def test_flush_uses_batched_inserts(self):
+        """Test that a flush issues one INSERT per insert batch rather than per row."""
+        writer = ChunkWriter(self.document, batch_size=5)
+        writer.pending = list(self.chunks)
+
+        # SAVEPOINT/RELEASE around two INSERTs of five rows each
+        with self.assertNumQueries(4):
+            writer.flush()
+        self.assertEqual(DocumentChunk.objects.count(), 10)
+
+
+class DocumentReingestTestCase(TestCase):
+    def setUp(self):
+        """Ingest a five page document to diff against."""
+        self.document = Document.objects.create(file_url="knowledge-base/catalog.pdf")
+        self.pages = [f"Page {number} about the BS Computer Science curriculum" for number in range(5)]
+        self.loader = Mock()
+        self.loader.iter_pages.side_effect = lambda: iter(self.pages)
+        self.nlp_processor = Mock()
+        self.nlp_processor.preprocess_batch.side_effect = fake_nlp_batch
+        self._ingestor().ingest()
+        self.original_ids = self._chunk_ids()
+        self.nlp_processor.preprocess_batch.reset_mock()
+
+    def _ingestor(self):
+        return DocumentIngestor(self.document, loader=self.loader, nlp_processor=self.nlp_processor, batch_size=2)
+
+    def _chunk_ids(self):
+        chunks = DocumentChunk.objects.filter(document=self.document).order_by("page_number")
+        return [chunk.id for chunk in chunks]
+
+    def _reingested_pages(self):
+        chunks = DocumentChunk.objects.filter(document=self.document).order_by("page_number")
+        return [chunk.text for chunk in chunks]
+
+    def test_unchanged_document_is_a_no_op(self):
+        """Test that re-ingesting identical pages runs no NLP and keeps every chunk id."""
+        ingestor = self._ingestor()
+        ingestor.reingest()
+
+        self.nlp_processor.preprocess_batch.assert_not_called()
+        self.assertEqual(self._chunk_ids(), self.original_ids)
+        self.assertEqual(ingestor.stats["unchanged"], 5)
+
+    def test_edited_page_gets_a_new_chunk(self):
+        """Test that an edited page is reprocessed alone and replaces its chunk, leaving the other ids alone."""
+        self.pages[2] = "Page 2 now covers the revised BS Computer Science curriculum"
+
+        ingestor = self._ingestor()
+        ingestor.reingest()
+
+        self.assertEqual(self.nlp_processor.preprocess_batch.call_count, 1)
+        self.assertEqual(self.nlp_processor.preprocess_batch.call_args.args[0], [self.pages[2]])
+        ids = self._chunk_ids()
+        self.assertEqual(ids[:2] + ids[3:], self.original_ids[:2] + self.original_ids[3:])
+        self.assertNotIn(ids[2], self.original_ids)
+        self.assertEqual(self._reingested_pages(), self.pages)
+        self.assertEqual((ingestor.stats["inserted"], ingestor.stats["deleted"]), (1, 1))
+
+    def test_inserted_page_keeps_other_ids(self):
+        """Test that inserting a page shifts page numbers without touching unchanged chunks."""
+        self.pages.insert(0, "A new foreword page")
+
+        ingestor = self._ingestor()
+        ingestor.reingest()
+
+        ids = self._chunk_ids()
+        self.assertEqual(ids[1:], self.original_ids)
+        self.assertNotIn(ids[0], self.original_ids)
+        self.assertEqual(self._reingested_pages(), self.pages)
+        self.assertEqual(ingestor.stats, {"unchanged": 5, "moved": 5, "inserted": 1, "deleted": 0})
+
+    def test_removed_page_is_deleted(self):
+        """Test that a page missing from the new file has its chunk deleted."""
+        del self.pages[3]
+
+        ingestor = self._ingestor()
+        ingestor.reingest()
+
+        self.assertEqual(self._chunk_ids(), self.original_ids[:3] + self.original_ids[4:])
+        self.assertEqual(ingestor.stats["deleted"], 1)
+        self.nlp_processor.preprocess_batch.assert_not_called()
+
+    def test_message_context_links_survive(self):
+        """Test that context links to unchanged chunks are kept and links to the edited page's old chunk dropped."""
+        from django.contrib.auth.models import User
+        from ai.models.conversation import Conversation, Message
+
+        user = User.objects.create_user("student", "student@example.com", "password")
+        message = Message.objects.create(
+            conversation=Conversation.objects.create(user=user), role="assistant", content="Answer"
+        )
+        message.context.set(DocumentChunk.objects.filter(id__in=self.original_ids[:3]))
+        self.pages[1] = "Page 1 was rewritten"
+
+        self._ingestor().reingest()
+
+        self.assertEqual(sorted(message.context.values_list("id", flat=True)), [self.original_ids[0], self.original_ids[2]])
+
+    def test_turn_context_keeps_its_text(self):
+        """Test that an answer's recorded context still holds the text it was generated from after a reingest."""
+        from django.contrib.auth.models import User
+        from ai.models.conversation import ChatTurn, Conversation
+
+        user = User.objects.create_user("student", "student@example.com", "password")
+        turn = ChatTurn.objects.create(conversation=Conversation.objects.create(user=user))
+        turn.context.set(DocumentChunk.objects.filter(id__in=self.original_ids))
+        cited = {chunk.id: chunk.text for chunk in turn.context.all()}
+        self.pages[1] = "Page 1 was rewritten"
+        self.pages.append("A new appendix page")
+
+        self._ingestor().reingest()
+
+        for chunk in turn.context.all():
+            self.assertEqual(chunk.text, cited[chunk.id])
+        self.assertEqual(turn.context.count(), 4)
@@ -0,0 +1,276 @@
+"""
+Test file for background document ingestion.
+Tests job claiming, retries, lease recovery, progress reporting, background deletion and the upload/status endpoints.
+"""
+
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from unittest.mock import Mock, patch
+from ai.lib.jobs import IngestionWorker
+from ai.models.conversation import ChatTurn, Conversation, Message
+from ai.models.document import Document, DocumentChunk
+from ai.models.ingestion import IngestionJob
+
+
+class IngestionWorkerTestCase(TestCase):
+    def setUp(self):
+        """Set up a queued document and a worker with a stubbed NLP model."""
+        self.document = Document.objects.create(file_url="knowledge-base/catalog.pdf", description="Catalog")
+        self.job = IngestionJob.objects.create(document=self.document)
+        self.worker = IngestionWorker(name="test-worker", lease_seconds=60, retry_delay_seconds=10)
+        self.worker._nlp_processor = Mock()
+
+    @patch("ai.lib.jobs.DocumentIngestor")
+    def test_run_once_processes_job(self, mock_ingestor_class):
+        """Test that a claimed job runs the ingestor and is marked as succeeded."""
+        mock_ingestor_class.return_value.pages_processed = 12
+
+        job = self.worker.run_once()
+
+        self.assertEqual(job.id, self.job.id)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, IngestionJob.SUCCEEDED)
+        self.assertEqual(self.job.attempts, 1)
+        self.assertEqual(self.job.pages_processed, 12)
+        self.assertEqual(self.job.worker, "test-worker")
+        self.assertIsNotNone(self.job.finished_at)
+        mock_ingestor_class.return_value.ingest.assert_called_once()
+
+    def test_run_once_with_empty_queue(self):
+        """Test that the worker returns None when nothing is runnable."""
+        self.job.run_after = timezone.now() + timedelta(minutes=5)
+        self.job.save()
+
+        self.assertIsNone(self.worker.run_once())
+
+    def test_claim_is_exclusive(self):
+        """Test that a claimed job cannot be claimed again while its lease is fresh."""
+        self.assertEqual(self.worker.claim().id, self.job.id)
+        self.assertIsNone(IngestionWorker(name="other-worker", lease_seconds=60).claim())
+
+    def test_stale_running_job_is_reclaimed(self):
+        """Test that a job abandoned by a crashed worker is picked up again."""
+        self.worker.claim()
+        IngestionJob.objects.filter(id=self.job.id).update(updated_at=timezone.now() - timedelta(minutes=5))
+
+        job = IngestionWorker(name="other-worker", lease_seconds=60).claim()
+
+        self.assertEqual(job.id, self.job.id)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.worker, "other-worker")
+
+    def test_stale_job_without_attempts_left_fails(self):
+        """Test that a job abandoned on its last attempt is marked as failed instead of being reclaimed forever."""
+        self.worker.claim()
+        IngestionJob.objects.filter(id=self.job.id).update(
+            max_attempts=1, updated_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        with self.assertLogs("ai.lib.jobs", level="WARNING"):
+            self.assertIsNone(IngestionWorker(name="other-worker", lease_seconds=60).claim())
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, IngestionJob.FAILED)
+        self.assertEqual(self.job.attempts, 1)
+        self.assertEqual(self.job.worker, "test-worker")
+        self.assertIn("Lease expired", self.job.error)
+        self.assertIsNotNone(self.job.finished_at)
+
+    @patch("ai.lib.jobs.DocumentIngestor")
+    def test_failed_job_is_retried_with_backoff(self, mock_ingestor_class):
+        """Test that a failure reschedules the job and clears partially written chunks."""
+        mock_ingestor_class.return_value.ingest.side_effect = RuntimeError("S3 timeout")
+
+        before = timezone.now()
+        self.worker.run_once()
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, IngestionJob.PENDING)
+        self.assertIn("S3 timeout", self.job.error)
+        self.assertGreaterEqual(self.job.run_after, before + timedelta(seconds=10))
+
+        DocumentChunk.objects.create(
+            document=self.document, text="partial", tokens_json=[], embedding_json=[],
+            pos_json=[], entity_json=[]
+        )
+        IngestionJob.objects.filter(id=self.job.id).update(run_after=timezone.now())
+        self.worker.run_once()
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.attempts, 2)
+        self.assertGreaterEqual(self.job.run_after, before + timedelta(seconds=20))
+        self.assertFalse(DocumentChunk.objects.filter(document=self.document).exists())
+
+    @patch("ai.lib.jobs.purge_chunks", side_effect=RuntimeError("database went away"))
+    @patch("ai.lib.jobs.DocumentIngestor")
+    def test_failed_cleanup_is_retried(self, mock_ingestor_class, mock_purge_chunks):
+        """Test that a failure clearing an earlier attempt's chunks reschedules the job instead of leaving it running."""
+        with self.assertLogs("ai.lib.jobs", level="WARNING") as logs:
+            self.worker.run_once()
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, IngestionJob.PENDING)
+        self.assertIn("database went away", self.job.error)
+        self.assertIn(f"Job {self.job.id} failed on attempt 1", logs.output[0])
+        mock_ingestor_class.return_value.ingest.assert_not_called()
+
+    @patch("ai.lib.jobs.DocumentIngestor")
+    def test_job_fails_after_max_attempts(self, mock_ingestor_class):
+        """Test that the job is marked as failed once its attempts are exhausted."""
+        mock_ingestor_class.return_value.ingest.side_effect = ValueError("Unsupported file extension: pptx")
+        IngestionJob.objects.filter(id=self.job.id).update(max_attempts=1)
+
+        self.worker.run_once()
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, IngestionJob.FAILED)
+
+    @patch("ai.lib.jobs.DocumentIngestor")
+    def test_reingest_job_keeps_existing_chunks(self, mock_ingestor_class):
+        """Test that a re-ingestion job diffs against existing chunks instead of clearing them."""
+        mock_ingestor_class.return_value.pages_processed = 1
+        DocumentChunk.objects.create(
+            document=self.document, text="Page 0", tokens_json=[], embedding_json=[],
+            pos_json=[], entity_json=[]
+        )
+        IngestionJob.objects.filter(id=self.job.id).update(kind=IngestionJob.REINGEST)
+
+        self.worker.run_once()
+
+        mock_ingestor_class.return_value.reingest.assert_called_once()
+        mock_ingestor_class.return_value.ingest.assert_not_called()
+        self.assertTrue(DocumentChunk.objects.filter(document=self.document).exists())
+
+    def test_progress_reports_rate_and_eta(self):
+        """Test that progress updates feed pages/sec and ETA."""
+        job = self.worker.claim()
+        IngestionJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(seconds=10))
+        job.refresh_from_db()
+
+        self.worker._report_progress(job, 20, 100)
+
+        job.refresh_from_db()
+        self.assertEqual(job.pages_processed, 20)
+        self.assertAlmostEqual(job.pages_per_second, 2.0, delta=0.2)
+        self.assertAlmostEqual(job.eta_seconds, 40.0, delta=5.0)
+
+
+class DocumentUploadTestCase(TestCase):
+    def setUp(self):
+        """Set up an authenticated admin client."""
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    @patch("ai.lib.ingestion.DocumentIngestor.ingest")
+    def test_upload_queues_job_without_ingesting(self, mock_ingest):
+        """Test that creating a document only enqueues an ingestion job."""
+        response = self.client.post("/api/ai/document/", {"file_url": "knowledge-base/catalog.pdf"}, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        job = IngestionJob.objects.get(document_id=response.data["id"])
+        self.assertEqual(job.status, IngestionJob.PENDING)
+        mock_ingest.assert_not_called()
+
+    def test_update_queues_reingest_job(self):
+        """Test that updating a document enqueues a page-diffing re-ingestion."""
+        document = Document.objects.create(file_url="knowledge-base/catalog.pdf")
+
+        response = self.client.put(
+            f"/api/ai/document/{document.id}/",
+            {"file_url": "knowledge-base/catalog-2025.pdf", "description": "Updated catalog"},
+            format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        job = IngestionJob.objects.get(document=document)
+        self.assertEqual(job.kind, IngestionJob.REINGEST)
+
+    def test_job_status_endpoint(self):
+        """Test that the status endpoint reports progress fields."""
+        document = Document.objects.create(file_url="knowledge-base/catalog.pdf")
+        job = IngestionJob.objects.create(
+            document=document, status=IngestionJob.RUNNING, pages_total=50, pages_processed=10,
+            started_at=timezone.now() - timedelta(seconds=5)
+        )
+
+        response = self.client.get(f"/api/ai/ingestion-job/{job.id}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], IngestionJob.RUNNING)
+        self.assertAlmostEqual(response.data["pages_per_second"], 2.0, delta=0.2)
+        self.assertAlmostEqual(response.data["eta_seconds"], 20.0, delta=3.0)
+
+
+class DocumentDeletionTestCase(TestCase):
+    def setUp(self):
+        """Set up an ingested document whose chunks are cited by a message."""
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.document = Document.objects.create(file_url="knowledge-base/catalog.pdf")
+        DocumentChunk.objects.bulk_create(
+            DocumentChunk(
+                document=self.document, text=f"Page {number}", tokens_json=["page"],
+                embedding_json=[0.1] * 384, pos_json=[], entity_json=[], page_number=number
+            )
+            for number in range(1, 8)
+        )
+        self.message = Message.objects.create(
+            conversation=Conversation.objects.create(user=self.admin), role="assistant", content="Answer"
+        )
+        self.message.context.set(DocumentChunk.objects.all()[:3])
+        self.turn = ChatTurn.objects.create(conversation=self.message.conversation)
+        self.turn.context.set(DocumentChunk.objects.all()[:3])
+        self.worker = IngestionWorker(name="test-worker")
+
+    def test_delete_hides_document_and_queues_purge(self):
+        """Test that DELETE returns at once, hides the document and leaves the chunks to a purge job."""
+        response = self.client.delete(f"/api/ai/document/{self.document.id}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.document.refresh_from_db()
+        self.assertTrue(self.document.removed)
+        self.assertEqual(DocumentChunk.objects.filter(document=self.document).count(), 7)
+        job = IngestionJob.objects.get(document=self.document)
+        self.assertEqual(job.kind, IngestionJob.PURGE)
+        self.assertEqual(self.client.get(f"/api/ai/document/{self.document.id}/").status_code, 404)
+        chunk = DocumentChunk.objects.filter(document=self.document).first()
+        self.assertEqual(self.client.get(f"/api/ai/document-chunk/{chunk.id}/").status_code, 404)
+
+    @patch("ai.lib.jobs.S3Service")
+    def test_purge_job_deletes_chunks_in_batches(self, mock_s3_service_class):
+        """Test that the purge job deletes chunks and their message links in batches and evicts the cached file."""
+        self.document.removed = True
+        self.document.save()
+        job = IngestionJob.objects.create(document=self.document, kind=IngestionJob.PURGE)
+
+        with self.settings(DOCUMENT_CHUNK_INSERT_BATCH_SIZE=3):
+            with patch.object(self.worker, "_report_progress") as mock_report_progress:
+                self.worker.run_once()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.SUCCEEDED)
+        self.assertEqual(job.pages_processed, 7)
+        self.assertEqual([c.args[1] for c in mock_report_progress.call_args_list], [3, 6, 7])
+        self.assertFalse(DocumentChunk.objects.filter(document=self.document).exists())
+        self.assertEqual(self.message.context.count(), 0)
+        self.assertEqual(self.turn.context.count(), 0)
+        self.assertTrue(Message.objects.filter(id=self.message.id).exists())
+        mock_s3_service_class.return_value.evict_cached.assert_called_once_with("knowledge-base/catalog.pdf")
+
+    @patch("ai.lib.jobs.DocumentIngestor")
+    def test_jobs_for_removed_document_are_skipped(self, mock_ingestor_class):
+        """Test that an ingestion job queued before the delete does not write the document back."""
+        job = IngestionJob.objects.create(document=self.document, kind=IngestionJob.REINGEST)
+        self.document.removed = True
+        self.document.save()
+
+        self.worker.run_once()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.SUCCEEDED)
+        mock_ingestor_class.assert_not_called()
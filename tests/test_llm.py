@@ -0,0 +1,348 @@
+"""
+Test file for the LLM provider settings and the fake chat model.
+Tests backend selection, deterministic replies, streaming, latency, an end-to-end request on the fake backend,
+and the shared client's retries, deadlines, hedging and circuit breaker.
+"""
+
+import asyncio
+import json
+import time
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+from rest_framework.test import APIClient
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+from ai.lib.llm import (
+    CircuitBreaker, FakeChatModel, LLMClient, LLMClientManager, LLMUnavailableError, build_chat_model, get_chat_model
+)
+from ai.models.conversation import Conversation, Message
+from ai.views.retrieval import HybridRetrievalView
+
+MESSAGES = [SystemMessage(content="Documents: Enrollment opens in June."), HumanMessage(content="When is enrollment?")]
+
+
+def stub_factory(model, json_mode):
+    return {"model": model, "json_mode": json_mode}
+
+
+class ChatModelSettingsTestCase(SimpleTestCase):
+    @override_settings(LLM_BACKEND="openai", LLM_MODEL="gpt-4o-mini", OPENAI_API_KEY="test")
+    def test_openai_backend(self):
+        """Test that the openai backend asks for JSON only in json_mode."""
+        with patch.dict("os.environ", {"OPENAI_API_KEY": "test"}):
+            model = build_chat_model(json_mode=True)
+            summary_model = build_chat_model(model="gpt-4o")
+
+        self.assertIsInstance(model, ChatOpenAI)
+        self.assertEqual(model.model_name, "gpt-4o-mini")
+        self.assertEqual(model.model_kwargs, {"response_format": {"type": "json_object"}})
+        self.assertEqual(summary_model.model_name, "gpt-4o")
+        self.assertEqual(summary_model.model_kwargs, {})
+        self.assertEqual(model.max_retries, 0)
+
+    @override_settings(LLM_BACKEND="openai", LLM_MODEL="gpt-4o-mini")
+    def test_clients_are_shared_per_process(self):
+        """Test that every call for the same model gets one client, built on the manager's connection pool."""
+        with patch.dict("os.environ", {"OPENAI_API_KEY": "test"}):
+            client = get_chat_model(json_mode=True)
+
+            self.assertIs(get_chat_model(json_mode=True), client)
+            self.assertIsNot(get_chat_model(), client)
+            self.assertIs(client.model.http_client, LLMClientManager.instance().http_client)
+
+    @override_settings(LLM_BACKEND="openai", LLM_MODEL="gpt-4o-mini")
+    def test_async_connections_are_per_event_loop(self):
+        """Test that async calls use a connection pool of their own event loop, shared within the loop."""
+        async def async_pool(client):
+            model = client.async_model()
+            self.assertIs(client.async_model(), model)
+            self.assertIs(get_chat_model(json_mode=True).async_model().http_async_client, model.http_async_client)
+            return model.http_async_client
+
+        with patch.dict("os.environ", {"OPENAI_API_KEY": "test"}):
+            client = get_chat_model()
+            first, second = asyncio.run(async_pool(client)), asyncio.run(async_pool(client))
+
+        self.assertIsNot(first, second)
+
+    def test_reset_closes_connection_pools(self):
+        """Test that discarding the manager closes its sync pool and the async pool of each live loop."""
+        async def open_and_reset():
+            manager = LLMClientManager.instance()
+            http_async_client = manager.async_http_client()
+            LLMClientManager.reset()
+            # The async pool is closed by a task scheduled on this loop
+            await asyncio.sleep(0.01)
+            return manager.http_client, http_async_client
+
+        http_client, http_async_client = asyncio.run(open_and_reset())
+
+        self.assertTrue(http_client.is_closed)
+        self.assertTrue(http_async_client.is_closed)
+
+    @override_settings(LLM_BACKEND="fake", FAKE_LLM_LATENCY_MS=5, FAKE_LLM_TOKENS_PER_SECOND=0)
+    def test_fake_backend(self):
+        """Test that the fake backend is built from the FAKE_LLM settings."""
+        model = build_chat_model(json_mode=True)
+
+        self.assertIsInstance(model, FakeChatModel)
+        self.assertTrue(model.json_mode)
+        self.assertEqual(model.latency_ms, 5)
+
+    @override_settings(LLM_BACKEND="tests.test_llm.stub_factory", LLM_MODEL="local-model")
+    def test_dotted_path_backend(self):
+        """Test that any other backend is imported and called with the model and json_mode."""
+        self.assertEqual(build_chat_model(json_mode=True), {"model": "local-model", "json_mode": True})
+
+
+class FakeChatModelTestCase(SimpleTestCase):
+    def test_reply_is_deterministic_json(self):
+        """Test that json_mode replies parse, and the same prompt always gets the same reply."""
+        model = FakeChatModel(json_mode=True, latency_ms=0, answer_words=12)
+
+        first = model.invoke(MESSAGES)
+        second = model.invoke(MESSAGES)
+
+        reply = json.loads(first.content)
+        self.assertEqual(len(reply["answer"].split()), 12)
+        self.assertIn("When is enrollment?", reply["reason"])
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.usage_metadata["output_tokens"], len(first.content.split()))
+
+    def test_stream_matches_invoke(self):
+        """Test that streamed pieces join up to the invoked reply."""
+        model = FakeChatModel(json_mode=True, latency_ms=0)
+
+        pieces = [chunk.content for chunk in model.stream(MESSAGES)]
+
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces), model.invoke(MESSAGES).content)
+
+    def test_latency_and_token_rate(self):
+        """Test that a call waits for the first token and then for every further token."""
+        model = FakeChatModel(latency_ms=50, tokens_per_second=200, answer_words=10)
+
+        started = time.perf_counter()
+        model.invoke(MESSAGES)
+        elapsed = time.perf_counter() - started
+
+        # 50ms to the first word, 9 more at 5ms each
+        self.assertGreaterEqual(elapsed, 0.095)
+        self.assertLess(elapsed, 0.5)
+
+    def test_latency_distribution_is_seeded(self):
+        """Test that latencies vary around the median and repeat for the same seed."""
+        def sample(seed):
+            model = FakeChatModel(latency_ms=100, latency_sigma=0.5, seed=seed)
+            with patch.dict("ai.lib.llm._latency_rngs", clear=True):
+                return [model._first_token_delay() for _ in range(200)]
+
+        delays = sample(7)
+
+        self.assertEqual(delays, sample(7))
+        self.assertNotEqual(delays, sample(8))
+        self.assertLess(min(delays), 0.1)
+        self.assertGreater(max(delays), 0.1)
+        self.assertAlmostEqual(sorted(delays)[100], 0.1, delta=0.02)
+
+    def test_async_calls_do_not_block_the_loop(self):
+        """Test that concurrent ainvoke and astream calls wait at the same time."""
+        model = FakeChatModel(json_mode=True, latency_ms=100)
+
+        async def run():
+            async def stream():
+                return "".join([chunk.content async for chunk in model.astream(MESSAGES)])
+            return await asyncio.gather(*(model.ainvoke(MESSAGES) for _ in range(5)), stream())
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+
+        self.assertLess(time.perf_counter() - started, 0.3)
+        self.assertEqual(results[-1], results[0].content)
+
+
+@override_settings(LLM_BACKEND="fake", FAKE_LLM_LATENCY_MS=1, FAKE_LLM_TOKENS_PER_SECOND=0)
+class FakeBackendViewTestCase(TestCase):
+    def test_retrieval_view_runs_on_fake_backend(self):
+        """Test that a chat request completes end to end with no API key."""
+        user = User.objects.create_user("student", "student@example.com", "password")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        conversation = Conversation.objects.create(user=user)
+        similar_text = [{"id": 0, "text": "Enrollment opens in June.", "source": "Handbook"}]
+
+        with patch.object(HybridRetrievalView, "_retrieve", return_value=similar_text):
+            response = client.post(
+                "/api/ai/retrieve/", {"conversation_id": conversation.id, "query": "When is enrollment?"}, format="json"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("When is enrollment?", response.data["reason"])
+        self.assertEqual(Message.objects.get(id=response.data["message_id"]).content, response.data["answer"])
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures(self):
+        """Test that the breaker opens after the threshold and a success in between resets the count."""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 10)
+
+    def test_half_open_allows_one_trial(self):
+        """Test that after the reset time one call is let through, and its outcome closes or reopens the breaker."""
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now = 10
+
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+        self.now = 20
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+
+class LLMClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+        self.breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+
+    def _client(self, model, **options):
+        options = {"deadline": 1.0, "max_retries": 2, "retry_base_delay": 0.001, "hedge": False, **options}
+        return LLMClient(model, breaker=self.breaker, executor=self.executor, **options)
+
+    def test_retries_transient_errors(self):
+        """Test that timeouts and connection errors are retried and the first success is returned."""
+        model = Mock()
+        model.invoke.side_effect = [TimeoutError(), ConnectionError(), "answer"]
+
+        self.assertEqual(self._client(model).invoke(MESSAGES), "answer")
+        self.assertEqual(model.invoke.call_count, 3)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_gives_up_after_max_retries(self):
+        """Test that a provider that keeps failing raises LLMUnavailableError after max_retries."""
+        model = Mock()
+        model.invoke.side_effect = TimeoutError()
+
+        with self.assertRaises(LLMUnavailableError):
+            self._client(model).invoke(MESSAGES)
+        self.assertEqual(model.invoke.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        """Test that an error the provider answered with is raised as is and does not count as an outage."""
+        model = Mock()
+        model.invoke.side_effect = ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            self._client(model).invoke(MESSAGES)
+        self.assertEqual(model.invoke.call_count, 1)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_deadline(self):
+        """Test that a call slower than the deadline fails at the deadline."""
+        client = self._client(FakeChatModel(latency_ms=500), deadline=0.05)
+
+        started = time.perf_counter()
+        with self.assertRaises(LLMUnavailableError):
+            client.invoke(MESSAGES)
+        self.assertLess(time.perf_counter() - started, 0.3)
+        with self.assertRaises(LLMUnavailableError):
+            asyncio.run(client.ainvoke(MESSAGES))
+
+    def test_open_breaker_fails_fast(self):
+        """Test that once the breaker is open no request reaches the provider."""
+        model = Mock()
+        for _ in range(5):
+            self.breaker.record_failure()
+
+        with self.assertRaises(LLMUnavailableError) as raised:
+            self._client(model).invoke(MESSAGES)
+        self.assertFalse(model.invoke.called)
+        self.assertGreater(raised.exception.retry_after, 0)
+
+    def test_hedged_request_beats_slow_outlier(self):
+        """Test that a call slower than the p95 is hedged with a second request that answers first."""
+        calls = []
+
+        def invoke(messages):
+            calls.append(time.perf_counter())
+            # The first call is an outlier, the hedge is as fast as usual
+            time.sleep(0.5 if len(calls) == 1 else 0.01)
+            return f"answer {len(calls)}"
+
+        model = Mock()
+        model.invoke.side_effect = invoke
+        client = self._client(model, hedge=True)
+        for _ in range(client.latencies.min_samples):
+            client.latencies.record(0.02)
+
+        started = time.perf_counter()
+        result = client.invoke(MESSAGES)
+
+        self.assertEqual(result, "answer 2")
+        self.assertLess(time.perf_counter() - started, 0.3)
+
+    def test_async_hedged_request(self):
+        """Test that ainvoke hedges too and cancels the losing request."""
+        model = FakeChatModel(latency_ms=200)
+        client = self._client(model, hedge=True)
+        for _ in range(client.latencies.min_samples):
+            client.latencies.record(0.02)
+        delays = iter([0.2, 0.01])
+
+        with patch.object(FakeChatModel, "_first_token_delay", side_effect=lambda: next(delays)):
+            started = time.perf_counter()
+            asyncio.run(client.ainvoke(MESSAGES))
+
+        self.assertLess(time.perf_counter() - started, 0.15)
+
+    def test_stream_retries_before_first_chunk(self):
+        """Test that a stream that fails before sending anything is retried."""
+        model = Mock()
+        model.stream.side_effect = [ConnectionError(), iter(["a", "b"])]
+
+        self.assertEqual(list(self._client(model).stream(MESSAGES)), ["a", "b"])
+
+
+@override_settings(LLM_BACKEND="fake")
+class LLMUnavailableViewTestCase(TestCase):
+    def test_unavailable_llm_returns_503(self):
+        """Test that an LLM outage is reported as 503 with Retry-After, and nothing is saved."""
+        user = User.objects.create_user("student", "student@example.com", "password")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        conversation = Conversation.objects.create(user=user)
+        similar_text = [{"id": 0, "text": "Enrollment opens in June.", "source": "Handbook"}]
+        breaker = LLMClientManager.instance().breaker
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        with patch.object(HybridRetrievalView, "_retrieve", return_value=similar_text):
+            response = client.post(
+                "/api/ai/retrieve/", {"conversation_id": conversation.id, "query": "When is enrollment?"}, format="json"
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(int(breaker.reset_seconds)))
+        self.assertFalse(Message.objects.exists())
@@ -1,12 +1,88 @@
-from django.test import TestCase
-from ai.lib.loader import DocumentLoader
+import io
+from unittest.mock import Mock
+from django.test import TestCase, override_settings
+from ai.lib.loader import DocumentLoader, _split_page_ranges
+from tests.documents import sample_pages, build_pdf, build_docx
 
 class DocumentLoaderTestCase(TestCase):
     def test_document_loader(self):
         loader = DocumentLoader("knowledge-base/Student-Handbook-2022.pdf")
         self.assertIsNotNone(loader.pages)
         self.assertGreater(len(loader.pages), 0)
-        
+
         pages = loader.get_pages()
         for i, page in enumerate(pages):
             print(f"Page {i + 1} (first 100 chars): {page[:100]}")
+
+
+class InMemoryDocumentLoaderTestCase(TestCase):
+    def setUp(self):
+        """Serve synthetic documents from a stubbed S3 service."""
+        self.page_texts = sample_pages(5)
+        self.s3_service = Mock()
+
+    def _serve(self, content):
+        self.s3_service.download_file_to_stream.side_effect = lambda key, spool_threshold: io.BytesIO(content)
+
+    def test_pdf_is_parsed_from_stream(self):
+        """Test that PDF pages are extracted without writing a temporary file."""
+        self._serve(build_pdf(self.page_texts))
+
+        loader = DocumentLoader("docs/catalog.pdf", s3_service=self.s3_service, spool_threshold=0)
+
+        self.assertEqual(len(loader.get_pages()), 5)
+        self.assertIn(self.page_texts[0].split()[0], loader.get_pages()[0])
+        self.s3_service.download_file_to_stream.assert_called_once_with("docs/catalog.pdf", spool_threshold=0)
+        self.s3_service.download_file_to_memory.assert_not_called()
+
+    def test_docx_is_parsed_from_stream(self):
+        """Test that DOCX sections are extracted from the downloaded stream."""
+        self._serve(build_docx(self.page_texts))
+
+        loader = DocumentLoader("docs/handbook.docx", s3_service=self.s3_service)
+
+        self.assertGreaterEqual(len(loader.get_pages()), 5)
+        self.assertTrue(loader.get_pages()[0].startswith(self.page_texts[0].split("\n")[0][:40]))
+
+    def test_failed_download_raises(self):
+        """Test that a failed download surfaces as ValueError."""
+        self.s3_service.download_file_to_stream.return_value = None
+
+        with self.assertRaises(ValueError):
+            DocumentLoader("docs/missing.pdf", s3_service=self.s3_service)
+
+    def test_unsupported_extension_raises(self):
+        """Test that unsupported extensions are rejected."""
+        with self.assertRaises(ValueError):
+            DocumentLoader("docs/slides.pptx", s3_service=self.s3_service)
+
+    def test_lazy_loader_defers_download(self):
+        """Test that lazy mode only downloads and parses when pages are iterated."""
+        self._serve(build_pdf(self.page_texts))
+
+        loader = DocumentLoader("docs/catalog.pdf", s3_service=self.s3_service, lazy=True)
+        self.s3_service.download_file_to_stream.assert_not_called()
+
+        pages = loader.iter_pages()
+        first_page = next(pages)
+        self.assertIn(self.page_texts[0].split()[0], first_page)
+        self.assertEqual(len(list(pages)), 4)
+        self.s3_service.download_file_to_stream.assert_called_once()
+
+    @override_settings(DOCUMENT_EXTRACT_MIN_PAGES=2)
+    def test_parallel_extraction_preserves_page_order(self):
+        """Test that splitting extraction across processes returns pages in document order."""
+        self.page_texts = sample_pages(9)
+        self._serve(build_pdf(self.page_texts))
+
+        serial = DocumentLoader("docs/catalog.pdf", s3_service=self.s3_service, workers=1).get_pages()
+        parallel = DocumentLoader("docs/catalog.pdf", s3_service=self.s3_service, workers=2).get_pages()
+
+        self.assertEqual(len(parallel), 9)
+        self.assertEqual(parallel, serial)
+
+    def test_split_page_ranges(self):
+        """Test that page ranges are contiguous, ordered and cover every page once."""
+        self.assertEqual(_split_page_ranges(10, 4), [(0, 3), (3, 6), (6, 9), (9, 10)])
+        self.assertEqual(_split_page_ranges(2, 8), [(0, 1), (1, 2)])
+        self.assertEqual(_split_page_ranges(0, 4), [])
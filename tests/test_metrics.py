@@ -0,0 +1,210 @@
+"""
+Test file for the metrics registry.
+Tests counters and histograms, the Prometheus text format, aggregation across processes, instrumentation and the admin-only endpoint.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+from unittest.mock import Mock
+from ai.lib.answer_cache import AnswerCache
+from ai.lib.llm import CircuitBreaker, FakeChatModel, LLMClient
+from main.lib import metrics
+from main.lib.metrics import Registry
+from langchain_core.messages import HumanMessage, SystemMessage
+
+
+def sample(name, labels):
+    """Current value of a process-wide counter, or count of a histogram, for one label combination"""
+    metric = metrics.REGISTRY.metrics[name]
+    value = metrics.REGISTRY.collect()[name].get(tuple(str(labels[label]) for label in metric.labelnames))
+    if isinstance(value, dict):
+        return sum(value["counts"])
+    return value or 0
+
+
+class RegistryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry(directory="")
+
+    def test_counter_renders_per_label(self):
+        """Test that counters add up per label combination and render with HELP and TYPE lines."""
+        counter = self.registry.counter("jobs_total", "Jobs run", ["kind"])
+        counter.inc(kind="ingest")
+        counter.inc(2, kind="ingest")
+        counter.inc(kind="purge")
+
+        text = self.registry.render()
+
+        self.assertIn("# HELP jobs_total Jobs run\n# TYPE jobs_total counter\n", text)
+        self.assertIn('jobs_total{kind="ingest"} 3\n', text)
+        self.assertIn('jobs_total{kind="purge"} 1\n', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets count observations up to their bound, with sum, count and +Inf."""
+        histogram = self.registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value)
+
+        text = self.registry.render()
+
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn("latency_seconds_sum 4.25\n", text)
+        self.assertIn("latency_seconds_count 4\n", text)
+
+    def test_labels_must_match(self):
+        """Test that missing or unknown labels are refused, and label values are escaped."""
+        counter = self.registry.counter("requests_total", "Requests", ["route"])
+
+        with self.assertRaises(ValueError):
+            counter.inc()
+        with self.assertRaises(ValueError):
+            counter.inc(route="/", status=200)
+        counter.inc(route='say "hi"\\')
+        self.assertIn('requests_total{route="say \\"hi\\"\\\\"} 1\n', self.registry.render())
+
+    def test_registering_twice_returns_the_same_metric(self):
+        """Test that modules declaring the same metric share it, and a kind clash is refused."""
+        counter = self.registry.counter("cache_total", "Cache", ["result"])
+
+        self.assertIs(self.registry.counter("cache_total", "Cache", ["result"]), counter)
+        with self.assertRaises(ValueError):
+            self.registry.histogram("cache_total", "Cache")
+
+    def test_concurrent_updates_are_not_lost(self):
+        """Test that increments from many threads all count."""
+        counter = self.registry.counter("hits_total", "Hits")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(8):
+                executor.submit(lambda: [counter.inc() for _ in range(1000)])
+
+        self.assertIn("hits_total 8000\n", self.registry.render())
+
+
+class MultiprocessRegistryTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_workers_are_added_up(self):
+        """Test that a forked worker starts from zero and its flushed values are added to this process's."""
+        registry = Registry(directory=self.directory, flush_seconds=3600)
+        counter = registry.counter("requests_total", "Requests", ["route"])
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(1.0,))
+        counter.inc(2, route="/chat")
+        histogram.observe(0.5)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                counter.inc(3, route="/chat")
+                histogram.observe(2.0)
+                registry.flush()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        text = registry.render()
+        self.assertIn('requests_total{route="/chat"} 5\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 1\n', text)
+        self.assertIn("latency_seconds_count 2\n", text)
+
+    def test_flush_is_throttled(self):
+        """Test that updates write this process's file at most every flush_seconds."""
+        registry = Registry(directory=self.directory, flush_seconds=3600)
+        counter = registry.counter("requests_total", "Requests")
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+
+        counter.inc()
+        with open(path) as file:
+            first = file.read()
+        counter.inc()
+        with open(path) as file:
+            self.assertEqual(file.read(), first)
+
+        registry.flush()
+        with open(path) as file:
+            self.assertNotEqual(file.read(), first)
+        self.assertEqual(os.listdir(self.directory), [f"{os.getpid()}.json"])
+
+
+class InstrumentationTestCase(TestCase):
+    def test_llm_calls_count_tokens_and_latency(self):
+        """Test that LLM calls are counted by outcome with their token usage, streamed or not."""
+        client = LLMClient(
+            FakeChatModel(latency_ms=0, answer_words=5), breaker=CircuitBreaker(5, 30), executor=ThreadPoolExecutor(1),
+            deadline=5, max_retries=0, retry_base_delay=0, hedge=False, name="test-model"
+        )
+        messages = [SystemMessage(content="Enrollment opens in June."), HumanMessage(content="When?")]
+        calls = sample("llm_requests_total", {"model": "test-model", "mode": "invoke", "outcome": "success"})
+        output_tokens = sample("llm_tokens_total", {"model": "test-model", "type": "output"})
+
+        client.invoke(messages)
+        list(client.stream(messages))
+
+        self.assertEqual(sample("llm_requests_total", {"model": "test-model", "mode": "invoke", "outcome": "success"}), calls + 1)
+        self.assertEqual(sample("llm_requests_total", {"model": "test-model", "mode": "stream", "outcome": "success"}), 1)
+        self.assertEqual(sample("llm_tokens_total", {"model": "test-model", "type": "output"}), output_tokens + 10)
+        self.assertGreater(sample("llm_tokens_total", {"model": "test-model", "type": "input"}), 0)
+        self.assertEqual(sample("llm_first_token_seconds", {"model": "test-model"}), 1)
+
+    def test_failed_llm_call_is_counted(self):
+        """Test that an error from the provider is counted as such."""
+        model = Mock(model_name="broken-model")
+        model.invoke.side_effect = ValueError("bad request")
+        client = LLMClient(
+            model, breaker=CircuitBreaker(5, 30), executor=ThreadPoolExecutor(1),
+            deadline=5, max_retries=0, retry_base_delay=0, hedge=False
+        )
+
+        with self.assertRaises(ValueError):
+            client.invoke([])
+
+        self.assertEqual(sample("llm_requests_total", {"model": "broken-model", "mode": "invoke", "outcome": "error"}), 1)
+
+    def test_answer_cache_hits_and_misses(self):
+        """Test that answer cache lookups are counted as hits or misses."""
+        cache.clear()
+        chunk = Mock(id=1, content_hash="a", updated_at=Mock(isoformat=Mock(return_value="2024-01-01")))
+        answer_cache = AnswerCache(threshold=0.9, ttl=60, max_entries=2)
+        hits = sample("cache_requests_total", {"cache": "answer", "result": "hit"})
+        misses = sample("cache_requests_total", {"cache": "answer", "result": "miss"})
+
+        answer_cache.lookup([1.0, 0.0], [chunk])
+        answer_cache.store([1.0, 0.0], [chunk], "In June.", "Handbook")
+        answer_cache.lookup([1.0, 0.0], [chunk])
+        answer_cache.lookup([0.0, 1.0], [chunk])
+
+        self.assertEqual(sample("cache_requests_total", {"cache": "answer", "result": "hit"}), hits + 1)
+        self.assertEqual(sample("cache_requests_total", {"cache": "answer", "result": "miss"}), misses + 2)
+
+
+class MetricsViewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_metrics_are_admin_only(self):
+        """Test that only admins can scrape the metrics, which include the requests made so far by route."""
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+
+        self.client.get("/api/ai/conversation/12345/")
+        response = self.client.get("/api/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn('route="/api/metrics/",method="GET",status="403"', text)
+        self.assertIn('route="/api/ai/conversation/<int:pk>/",method="GET"', text)
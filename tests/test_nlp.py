@@ -223,3 +223,16 @@ class NLPPreprocessorTestCase(TestCase):
         # Assertions for chatbot-specific requirements
         self.assertGreater(len(data['preprocessed_tokens']), 0)
         self.assertEqual(len(data['embeddings']), 384)  # SBERT embedding dimension 
+    
+    def test_preprocess_batch_matches_preprocess(self):
+        """Test that batched preprocessing yields the same data as one text at a time."""
+        texts = [self.test_text, "What are the admission requirements for Computer Science?"]
+        batch_data = self.nlp_processor.preprocess_batch(texts, batch_size=2)
+        
+        self.assertEqual(len(batch_data), len(texts))
+        for text, data in zip(texts, batch_data):
+            single_data = NLPPreprocessor().preprocess(text)
+            self.assertEqual(data["original_text"], text)
+            self.assertEqual(data["preprocessed_tokens"], single_data["preprocessed_tokens"])
+            self.assertEqual(data["entities"], single_data["entities"])
+            np.testing.assert_array_almost_equal(data["embeddings"], single_data["embeddings"], decimal=5)
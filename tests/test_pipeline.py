@@ -0,0 +1,123 @@
+"""
+Test file for the ingestion Pipeline.
+Tests ordering, backpressure, error handling, process stages and stage metrics.
+"""
+
+import math
+import time
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from django.test import SimpleTestCase
+from unittest.mock import patch
+from ai.lib.pipeline import Pipeline, Stage
+
+
+class PipelineTestCase(SimpleTestCase):
+    def _collect(self, stages, items, **kwargs):
+        results = []
+        pipeline = Pipeline(stages, sink=Stage("sink", results.append), **kwargs)
+        pipeline.run(items)
+        return pipeline, results
+
+    def test_items_reach_sink_in_input_order(self):
+        """Test that several workers per stage still deliver results in input order."""
+        def jittered_square(value):
+            time.sleep(0.001 * (value % 3))
+            return value * value
+
+        pipeline, results = self._collect([Stage("square", jittered_square, workers=4)], range(30))
+
+        self.assertEqual(results, [value * value for value in range(30)])
+
+    def test_sink_runs_in_calling_thread(self):
+        """Test that the sink stays on the caller's thread (and so its DB connection)."""
+        threads = set()
+        pipeline = Pipeline([Stage("noop", lambda item: item)], sink=Stage("sink", lambda item: threads.add(threading.get_ident())))
+        pipeline.run(range(5))
+
+        self.assertEqual(threads, {threading.get_ident()})
+
+    def test_bounded_queues_apply_backpressure(self):
+        """Test that a slow sink stops upstream stages from running far ahead."""
+        produced = []
+        consumed = []
+        max_ahead = []
+
+        def produce(item):
+            produced.append(item)
+            max_ahead.append(len(produced) - len(consumed))
+            return item
+
+        def slow_sink(item):
+            time.sleep(0.005)
+            consumed.append(item)
+
+        pipeline = Pipeline([Stage("produce", produce)], sink=Stage("sink", slow_sink), queue_size=2)
+        pipeline.run(range(40))
+
+        self.assertEqual(consumed, list(range(40)))
+        # Bounded by both queues plus the items held by the producer and the sink
+        self.assertLessEqual(max(max_ahead), 2 * 2 + 2)
+        self.assertGreater(pipeline.metrics()[1]["blocked_seconds"], 0)
+
+    def test_failed_items_go_to_on_error(self):
+        """Test that with on_error one failing item is reported and the rest continue."""
+        errors = []
+
+        def invert(value):
+            return 1 / value
+
+        pipeline, results = self._collect(
+            [Stage("invert", invert, workers=2)], [1, 0, 2], on_error=lambda item, error: errors.append((item, error))
+        )
+
+        self.assertEqual(results, [1.0, 0.5])
+        self.assertEqual(errors[0][0], 0)
+        self.assertIsInstance(errors[0][1], ZeroDivisionError)
+
+    def test_failure_without_on_error_raises(self):
+        """Test that without on_error the first failure stops the pipeline and is raised."""
+        with self.assertRaises(ZeroDivisionError):
+            self._collect([Stage("invert", lambda value: 1 / value)], [1, 0, 2] + list(range(1, 100)))
+
+    def test_process_stage(self):
+        """Test that a process stage runs a picklable function in worker processes."""
+        pipeline, results = self._collect(
+            [Stage("factorial", math.factorial, workers=2, kind=Stage.PROCESS)], range(10)
+        )
+
+        self.assertEqual(results, [math.factorial(value) for value in range(10)])
+        self.assertEqual(pipeline.metrics()[1]["items"], 10)
+
+    @patch("ai.lib.pipeline.ProcessPoolExecutor")
+    def test_broken_process_pool_reports_every_item(self, mock_executor_class):
+        """Test that when a process stage can no longer take work, each item left is passed to on_error."""
+        mock_executor_class.return_value.submit.side_effect = BrokenProcessPool("A worker was killed")
+        errors = []
+
+        pipeline, results = self._collect(
+            [Stage("parse", math.factorial, kind=Stage.PROCESS)], range(6),
+            on_error=lambda item, error: errors.append((item, error))
+        )
+
+        self.assertEqual(results, [])
+        self.assertEqual([item for item, _ in errors], list(range(6)))
+        self.assertTrue(all(isinstance(error, BrokenProcessPool) for _, error in errors))
+
+    @patch("ai.lib.pipeline.ProcessPoolExecutor")
+    def test_broken_process_pool_without_on_error_raises(self, mock_executor_class):
+        """Test that without on_error a process stage that can't take work stops the pipeline with its error."""
+        mock_executor_class.return_value.submit.side_effect = BrokenProcessPool("A worker was killed")
+
+        with self.assertRaises(BrokenProcessPool):
+            self._collect([Stage("parse", math.factorial, kind=Stage.PROCESS)], range(6))
+
+    def test_metrics_report_every_stage(self):
+        """Test that metrics list the source, every stage and the sink with utilization."""
+        pipeline, _ = self._collect([Stage("sleep", lambda item: time.sleep(0.002) or item, workers=2)], range(10))
+
+        metrics = pipeline.metrics()
+        self.assertEqual([stage["stage"] for stage in metrics], ["source", "sleep", "sink"])
+        self.assertEqual(metrics[1]["items"], 10)
+        self.assertGreater(metrics[1]["busy_seconds"], 0.015)
+        self.assertTrue(0 < metrics[1]["utilization"] <= 1)
@@ -0,0 +1,188 @@
+"""
+Test file for the retrieval view's write path.
+Tests idempotent retries, the single atomic write, bulk persistence of a turn, and that no transaction is held
+during the LLM call.
+"""
+
+import threading
+import time
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from unittest.mock import Mock, patch
+from ai.models.conversation import ChatTurn, Conversation, Message
+from ai.models.document import Document, DocumentChunk
+from ai.views.retrieval import HybridRetrievalView, RAGResponse, RetrievalMixin
+
+ANSWER = '{"answer": "Enrollment opens in June.", "reason": "Handbook"}'
+
+
+class RetrievalViewFixtures:
+    def setUp(self):
+        """Set up an authenticated user, a conversation and one retrievable chunk."""
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.conversation = Conversation.objects.create(user=self.user)
+        document = Document.objects.create(file_url="knowledge-base/handbook.pdf", description="Handbook")
+        self.chunk = DocumentChunk.objects.create(
+            document=document, text="Enrollment opens in June.", tokens_json=[], embedding_json=[],
+            pos_json=[], entity_json=[]
+        )
+        self.similar_text = [{"id": self.chunk.id, "text": self.chunk.text, "source": "Handbook"}]
+        retrieve = patch.object(HybridRetrievalView, "_retrieve", return_value=self.similar_text)
+        retrieve.start()
+        self.addCleanup(retrieve.stop)
+
+    def _post(self, **headers):
+        return self.client.post(
+            "/api/ai/retrieve/", {"conversation_id": self.conversation.id, "query": "When is enrollment?"},
+            format="json", headers=headers
+        )
+
+
+@patch("ai.views.retrieval.get_chat_model")
+class IdempotentRetrievalTestCase(RetrievalViewFixtures, TestCase):
+    def test_retry_with_same_key_replays_saved_answer(self, mock_get_chat_model):
+        """Test that a retried request gets the saved response without a second LLM call or messages."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content=ANSWER)
+
+        first = self._post(**{"Idempotency-Key": "turn-1"})
+        retry = self._post(**{"Idempotency-Key": "turn-1"})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        for field in ("answer", "reason", "context", "message_id"):
+            self.assertEqual(retry.data[field], first.data[field])
+        self.assertEqual(mock_get_chat_model.return_value.invoke.call_count, 1)
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 2)
+
+    def test_requests_without_key_are_not_deduplicated(self, mock_get_chat_model):
+        """Test that requests without an Idempotency-Key each save a turn."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content=ANSWER)
+
+        self._post()
+        self._post()
+
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 4)
+
+    def test_concurrent_duplicate_saves_nothing_twice(self, mock_get_chat_model):
+        """Test that a retry racing the first request rolls back both of its messages and replays the winner."""
+        def racing_invoke(messages):
+            # The first request with this key commits while this one waits on the LLM
+            Message.objects.create(
+                conversation=self.conversation, role="assistant", content="First answer", reason="First",
+                idempotency_key="turn-1"
+            )
+            return Mock(content=ANSWER)
+
+        mock_get_chat_model.return_value.invoke.side_effect = racing_invoke
+
+        response = self._post(**{"Idempotency-Key": "turn-1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertEqual(response.data["answer"], "First answer")
+        self.assertFalse(Message.objects.filter(conversation=self.conversation, role="user").exists())
+
+    def test_failed_write_saves_neither_message(self, mock_get_chat_model):
+        """Test that both messages are written in one transaction."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content=ANSWER)
+
+        with patch.object(ChatTurn.context.through.objects, "bulk_create", side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError):
+                self._post()
+
+        self.assertFalse(Message.objects.filter(conversation=self.conversation).exists())
+        self.assertFalse(ChatTurn.objects.exists())
+
+
+class TurnPersistenceTestCase(RetrievalViewFixtures, TestCase):
+    def setUp(self):
+        """Set up five retrieved chunks."""
+        super().setUp()
+        self.chunks = [self.chunk] + [
+            DocumentChunk.objects.create(
+                document=self.chunk.document, text=f"Page {number}", tokens_json=[], embedding_json=[],
+                pos_json=[], entity_json=[]
+            )
+            for number in range(4)
+        ]
+
+    def _save(self, idempotency_key=""):
+        return RetrievalMixin()._save_messages(
+            self.conversation, "When is enrollment?", RAGResponse(answer="In June.", reason="Handbook"),
+            self.chunks, idempotency_key
+        )
+
+    def test_turn_is_written_in_three_inserts(self):
+        """Test that a turn takes three INSERTs however many chunks were retrieved (it took six before)."""
+        # SAVEPOINT, the turn, both messages, the context links, RELEASE SAVEPOINT
+        with self.assertNumQueries(5):
+            self._save("turn-1")
+
+    def test_context_is_recorded_once_per_turn(self):
+        """Test that both messages share one turn holding the context, with no per-message links."""
+        assistant_message = self._save()
+
+        user_message = Message.objects.get(conversation=self.conversation, role="user")
+        self.assertEqual(user_message.turn_id, assistant_message.turn_id)
+        self.assertEqual(ChatTurn.context.through.objects.count(), len(self.chunks))
+        self.assertEqual(Message.context.through.objects.count(), 0)
+        self.assertEqual(list(assistant_message.context_chunks.order_by("id")), self.chunks)
+
+    def test_conversation_lists_context_of_old_and_new_messages(self):
+        """Test that messages saved before turns existed still show their own context links."""
+        old_message = Message.objects.create(conversation=self.conversation, role="user", content="Hi")
+        old_message.context.set(self.chunks[:1])
+        self._save()
+        self._save()
+
+        # Conversation, its messages, their turns' context and the older messages' own context
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/api/ai/conversation/{self.conversation.id}/")
+
+        messages = response.data["messages"]
+        self.assertEqual(len(messages), 5)
+        self.assertEqual([chunk["id"] for chunk in messages[0]["context"]], [self.chunk.id])
+        for message in messages[1:]:
+            self.assertEqual(sorted(chunk["id"] for chunk in message["context"]), [chunk.id for chunk in self.chunks])
+
+
+class TransactionScopeTestCase(RetrievalViewFixtures, TransactionTestCase):
+    @patch("ai.views.retrieval.get_chat_model")
+    def test_llm_call_runs_outside_transaction(self, mock_get_chat_model):
+        """Test that another writer commits while the LLM call is in flight instead of waiting behind it."""
+        observed = {}
+        other_conversation = Conversation.objects.create(user=self.user)
+
+        def write_elsewhere():
+            started = time.perf_counter()
+            try:
+                Message.objects.create(conversation=other_conversation, role="user", content="Concurrent")
+            except Exception as e:
+                observed["error"] = e
+            observed["write_seconds"] = time.perf_counter() - started
+            connection.close()
+
+        def slow_invoke(messages):
+            observed["in_atomic_block"] = connection.in_atomic_block
+            writer = threading.Thread(target=write_elsewhere)
+            writer.start()
+            # LLM latency
+            time.sleep(0.3)
+            writer.join()
+            return Mock(content=ANSWER)
+
+        mock_get_chat_model.return_value.invoke.side_effect = slow_invoke
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(observed["in_atomic_block"])
+        self.assertNotIn("error", observed)
+        self.assertLess(observed["write_seconds"], 0.3)
+        self.assertEqual(Message.objects.filter(conversation=other_conversation).count(), 1)
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 2)
@@ -347,3 +347,25 @@ class HybridRetrieverTestCase(TestCase):
         """Clean up after tests."""
         DocumentChunk.objects.all().delete()
         Document.objects.all().delete()
+
+
+class SparseSearchTestCase(TestCase):
+    @patch('ai.lib.retriever.SearchRank')
+    @patch('ai.lib.retriever.DocumentChunk')
+    @patch('ai.lib.retriever.NLPPreprocessor')
+    def test_sparse_search_filters_on_search_vector(self, mock_nlp_class, mock_document_class, mock_search_rank):
+        """Test that candidates are matched on the stored search vector, so the GIN index is used, and ranked on it."""
+        mock_nlp_class.return_value.preprocess.return_value = {"embeddings": np.zeros(384), "entities": []}
+        mock_document_class.objects.filter.return_value.annotate.return_value.order_by.return_value.__getitem__ = Mock(
+            return_value=Mock(only=Mock(return_value=[]))
+        )
+
+        self.assertEqual(HybridRetriever().retrieve("enrollment schedule"), [])
+
+        search_query = mock_document_class.objects.filter.call_args.kwargs["search_vector"]
+        self.assertEqual(mock_document_class.objects.filter.call_args.kwargs["document__removed"], False)
+        self.assertEqual(str(search_query), str(HybridRetriever._search_query("enrollment schedule")))
+        vector, ranked_query = mock_search_rank.call_args.args
+        self.assertEqual(vector.name, "search_vector")
+        self.assertIs(ranked_query, search_query)
+
@@ -0,0 +1,210 @@
+import io
+import os
+import tempfile
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from django.test import TestCase
+from main.services import s3
+from main.services.s3 import S3Service, S3ObjectCache, LocalFilesystemClient, get_shared_client, split_byte_ranges
+
+class S3ObjectCacheTestCase(TestCase):
+    def setUp(self):
+        """Serve objects from a local-filesystem bucket with a disk cache in front."""
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        os.makedirs(os.path.join(self.root.name, "bucket"))
+
+        self.client = LocalFilesystemClient(self.root.name)
+        self.cache = S3ObjectCache(os.path.join(self.root.name, "cache"), max_bytes=1024)
+        self.s3_service = S3Service(client=self.client, cache=self.cache)
+        self.s3_service.aws_s3_bucket = "bucket"
+
+    def _read(self, key):
+        with self.s3_service.download_file_to_stream(key) as stream:
+            return stream.read()
+
+    def test_repeat_download_is_served_from_cache(self):
+        """Test that an unchanged object is revalidated by ETag instead of downloaded again."""
+        self.client.put_object(Bucket="bucket", Key="docs/a.pdf", Body=b"version one")
+
+        with patch.object(self.client, "get_object", wraps=self.client.get_object) as get_object:
+            self.assertEqual(self._read("docs/a.pdf"), b"version one")
+            self.assertEqual(self._read("docs/a.pdf"), b"version one")
+
+        get_object.assert_called_once()
+        etag = self.client.head_object(Bucket="bucket", Key="docs/a.pdf")["ETag"]
+        self.assertEqual(get_object.call_args.kwargs["IfMatch"], etag)
+
+    def test_changed_object_replaces_cached_version(self):
+        """Test that a new ETag refreshes the cache and drops the stale copy."""
+        self.client.put_object(Bucket="bucket", Key="docs/a.pdf", Body=b"version one")
+        self._read("docs/a.pdf")
+
+        self.client.put_object(Bucket="bucket", Key="docs/a.pdf", Body=b"version two!")
+
+        self.assertEqual(self._read("docs/a.pdf"), b"version two!")
+        self.assertEqual(self.s3_service.download_file_to_memory("docs/a.pdf"), b"version two!")
+        data_files = [name for name in os.listdir(self.cache.directory) if not name.endswith(".etag")]
+        self.assertEqual(len(data_files), 1)
+
+    def test_least_recently_used_objects_are_evicted(self):
+        """Test that the cache stays under max_bytes by evicting the least recently used object."""
+        for key in ("a", "b", "c"):
+            self.client.put_object(Bucket="bucket", Key=key, Body=key.encode() * 400)
+
+        self._read("a")
+        self._read("b")
+        # Make "a" the oldest entry regardless of filesystem timestamp resolution
+        etag, path = self.cache.lookup("bucket", "a")
+        os.utime(path, (0, 0))
+        self._read("c")
+
+        self.assertIsNone(self.cache.lookup("bucket", "a"))
+        self.assertIsNotNone(self.cache.lookup("bucket", "b"))
+        self.assertIsNotNone(self.cache.lookup("bucket", "c"))
+
+    def test_object_larger_than_cache_is_downloaded(self):
+        """Test that an object over max_bytes is still returned, without evicting the cached ones."""
+        self.client.put_object(Bucket="bucket", Key="small", Body=b"s" * 100)
+        self.client.put_object(Bucket="bucket", Key="large", Body=b"l" * 2048)
+        self._read("small")
+
+        self.assertEqual(self._read("large"), b"l" * 2048)
+        self.assertEqual(self.s3_service.download_file_to_memory("large"), b"l" * 2048)
+        self.assertIsNone(self.cache.lookup("bucket", "large"))
+        self.assertIsNotNone(self.cache.lookup("bucket", "small"))
+
+    def test_stored_object_is_never_evicted(self):
+        """Test that storing an object keeps it even when it alone is over max_bytes."""
+        self.client.put_object(Bucket="bucket", Key="a", Body=b"a" * 600)
+        self._read("a")
+
+        path = self.cache.store("bucket", "b", '"b"', lambda f: f.write(b"b" * 1100))
+
+        with self.cache.open(path) as f:
+            self.assertEqual(f.read(), b"b" * 1100)
+        self.assertIsNone(self.cache.lookup("bucket", "a"))
+
+    def test_missing_object_returns_none(self):
+        """Test that a missing key is reported the same way as without the cache."""
+        self.assertIsNone(self.s3_service.download_file_to_stream("docs/missing.pdf"))
+        self.assertIsNone(self.s3_service.download_file_to_memory("docs/missing.pdf"))
+
+    def test_small_objects_stay_in_memory(self):
+        """Test that a cached object under spool_threshold is parsed from memory and a larger one from the cached file."""
+        self.client.put_object(Bucket="bucket", Key="docs/a.pdf", Body=b"x" * 100)
+
+        with self.s3_service.download_file_to_stream("docs/a.pdf", spool_threshold=500) as stream:
+            self.assertIsInstance(stream, io.BytesIO)
+            self.assertEqual(stream.read(), b"x" * 100)
+        with self.s3_service.download_file_to_stream("docs/a.pdf", spool_threshold=50) as stream:
+            self.assertEqual(stream.name, self.cache.lookup("bucket", "docs/a.pdf")[1])
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_cache_and_head_are_opt_in(self):
+        """Test that by default there is no disk cache, and a download is a single GET without a HEAD."""
+        self.client.put_object(Bucket="bucket", Key="docs/a.pdf", Body=b"content")
+        s3_service = S3Service(client=self.client)
+        s3_service.aws_s3_bucket = "bucket"
+
+        with patch.object(self.client, "head_object", wraps=self.client.head_object) as head_object:
+            with s3_service.download_file_to_stream("docs/a.pdf") as stream:
+                self.assertEqual(stream.read(), b"content")
+            self.assertEqual(s3_service.download_file_to_memory("docs/a.pdf"), b"content")
+
+        self.assertIsNone(s3_service.cache)
+        head_object.assert_not_called()
+
+    def test_cache_can_be_disabled(self):
+        """Test that use_cache=False always downloads from the client."""
+        self.client.put_object(Bucket="bucket", Key="docs/a.pdf", Body=b"content")
+        s3_service = S3Service(client=self.client, use_cache=False)
+        s3_service.aws_s3_bucket = "bucket"
+
+        self.assertIsNone(s3_service.cache)
+        self.assertEqual(s3_service.download_file_to_memory("docs/a.pdf"), b"content")
+
+
+class RangedDownloadTestCase(TestCase):
+    def setUp(self):
+        """Serve a multi-part object from a local-filesystem bucket."""
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        os.makedirs(os.path.join(self.root.name, "bucket"))
+
+        self.client = LocalFilesystemClient(self.root.name)
+        self.content = os.urandom(10_000)
+        self.client.put_object(Bucket="bucket", Key="scans/big.pdf", Body=self.content)
+
+    def _service(self, cache=None):
+        s3_service = S3Service(client=self.client, cache=cache, use_cache=cache is not None)
+        s3_service.aws_s3_bucket = "bucket"
+        s3_service.ranged_threshold = 4096
+        s3_service.ranged_part_size = 1024
+        s3_service.ranged_concurrency = 4
+        return s3_service
+
+    def test_large_object_is_downloaded_in_ranges(self):
+        """Test that objects above the threshold are reassembled from parallel ranged GETs."""
+        s3_service = self._service()
+
+        with patch.object(self.client, "get_object", wraps=self.client.get_object) as get_object:
+            content = s3_service.download_file_to_memory("scans/big.pdf")
+
+        self.assertEqual(content, self.content)
+        ranges = sorted(call.kwargs["Range"] for call in get_object.call_args_list)
+        self.assertEqual(len(ranges), 10)
+        self.assertIn("bytes=9216-9999", ranges)
+
+    def test_ranged_download_to_stream(self):
+        """Test that ranged downloads fill both the in-memory and the spilled stream."""
+        s3_service = self._service()
+
+        with s3_service.download_file_to_stream("scans/big.pdf") as stream:
+            self.assertEqual(stream.read(), self.content)
+        with s3_service.download_file_to_stream("scans/big.pdf", spool_threshold=1) as stream:
+            self.assertEqual(stream.read(), self.content)
+
+    def test_ranged_download_into_cache(self):
+        """Test that a ranged download is stored in the object cache."""
+        cache = S3ObjectCache(os.path.join(self.root.name, "cache"), max_bytes=1024 * 1024)
+        s3_service = self._service(cache)
+
+        self.assertEqual(s3_service.download_file_to_memory("scans/big.pdf"), self.content)
+        with open(cache.lookup("bucket", "scans/big.pdf")[1], "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_object_changed_mid_download_fails(self):
+        """Test that ranges are pinned to the ETag seen by HEAD."""
+        s3_service = self._service()
+        head_object = self.client.head_object
+
+        def head_then_overwrite(**kwargs):
+            response = head_object(**kwargs)
+            os.utime(self.client._path("bucket", "scans/big.pdf"), ns=(0, 0))
+            return response
+
+        with patch.object(self.client, "head_object", side_effect=head_then_overwrite):
+            self.assertIsNone(s3_service.download_file_to_memory("scans/big.pdf"))
+
+    def test_local_client_range_and_preconditions(self):
+        """Test that the local stand-in answers ranged and conditional GETs like S3."""
+        response = self.client.get_object(Bucket="bucket", Key="scans/big.pdf", Range="bytes=100-199")
+        self.assertEqual(response["Body"].read(), self.content[100:200])
+        self.assertEqual(response["ContentRange"], "bytes 100-199/10000")
+
+        with self.assertRaises(ClientError):
+            self.client.get_object(Bucket="bucket", Key="scans/big.pdf", IfMatch='"stale"')
+
+    def test_split_byte_ranges(self):
+        """Test that byte ranges are inclusive and cover the object exactly."""
+        self.assertEqual(split_byte_ranges(10, 4), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(split_byte_ranges(0, 4), [])
+
+    @patch.dict(os.environ, {"S3_BACKEND": "local", "S3_LOCAL_ROOT": "/tmp"})
+    def test_services_share_one_client(self):
+        """Test that S3Service instances reuse the process-wide client."""
+        with patch.object(s3, "_shared_client", None):
+            client = get_shared_client()
+            self.assertIs(S3Service(use_cache=False).client, client)
+            self.assertIs(S3Service(use_cache=False).client, client)
@@ -0,0 +1,223 @@
+"""
+Test file for streamed chat responses.
+Tests incremental answer extraction from partial JSON and the Server-Sent Events retrieval endpoint, under WSGI and ASGI.
+"""
+
+import asyncio
+import json
+import time
+import warnings
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from unittest.mock import Mock, patch
+from ai.lib.streaming import AnswerExtractor, sse_event
+from ai.models.conversation import Conversation, Message
+from ai.models.document import Document, DocumentChunk
+
+
+def feed_in_pieces(text, size):
+    extractor = AnswerExtractor("answer")
+    pieces = [extractor.feed(text[start:start + size]) for start in range(0, len(text), size)]
+    return extractor, pieces
+
+
+class AnswerExtractorTestCase(SimpleTestCase):
+    def test_answer_is_decoded_at_any_chunk_size(self):
+        """Test that the answer decodes identically however the output is split."""
+        answer = 'Enroll via "CRS".\n\n• Pass the UPCAT\t✓ 😀 \\ done'
+        output = json.dumps({"answer": answer, "reason": "From the handbook"})
+        ascii_output = json.dumps({"answer": answer, "reason": "From the handbook"}, ensure_ascii=True)
+
+        for text in (output, ascii_output):
+            for size in (1, 2, 3, 7, len(text)):
+                extractor, pieces = feed_in_pieces(text, size)
+                self.assertEqual("".join(pieces), answer)
+                self.assertEqual(extractor.value, answer)
+                self.assertTrue(extractor.complete)
+
+    def test_text_is_returned_before_the_object_is_complete(self):
+        """Test that the answer is forwarded while the model is still writing it."""
+        extractor = AnswerExtractor("answer")
+
+        self.assertEqual(extractor.feed('{"answ'), "")
+        self.assertEqual(extractor.feed('er": "To enr'), "To enr")
+        self.assertEqual(extractor.feed('oll\\'), "oll")
+        self.assertEqual(extractor.feed('n'), "\n")
+        self.assertFalse(extractor.complete)
+
+    def test_only_top_level_answer_key_is_extracted(self):
+        """Test that a reason mentioning "answer" or a nested answer key is ignored."""
+        output = json.dumps({
+            "reason": 'quoted "answer": "no"',
+            "meta": {"answer": "nested"},
+            "answer": "Yes",
+        })
+
+        extractor, pieces = feed_in_pieces(output, 4)
+
+        self.assertEqual("".join(pieces), "Yes")
+
+    def test_output_without_answer_yields_nothing(self):
+        """Test that non-JSON output streams nothing and is kept for the final parse."""
+        extractor, pieces = feed_in_pieces("Sorry, I can't help with that.", 5)
+
+        self.assertEqual("".join(pieces), "")
+        self.assertFalse(extractor.complete)
+        self.assertEqual(extractor.raw, "Sorry, I can't help with that.")
+
+    def test_sse_event_format(self):
+        """Test that events are framed with an event name and a single JSON data line."""
+        self.assertEqual(sse_event("token", {"text": "a\nb"}), 'event: token\ndata: {"text": "a\\nb"}\n\n')
+
+
+def parse_events(body):
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class StreamingRetrievalViewTestCase(TestCase):
+    def setUp(self):
+        """Set up an authenticated user, a conversation and one retrievable chunk."""
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.conversation = Conversation.objects.create(user=self.user)
+        document = Document.objects.create(file_url="knowledge-base/handbook.pdf")
+        self.chunk = DocumentChunk.objects.create(
+            document=document, text="Enrollment opens in June.", tokens_json=[], embedding_json=[],
+            pos_json=[], entity_json=[]
+        )
+        self.similar_text = [{"id": self.chunk.id, "source": document.file_url, "text": self.chunk.text}]
+
+    def _stream(self, mock_get_chat_model, pieces):
+        mock_get_chat_model.return_value.stream.return_value = iter(Mock(content=piece) for piece in pieces)
+        with patch("ai.views.retrieval.HybridRetrievalView._retrieve", return_value=self.similar_text):
+            response = self.client.post(
+                "/api/ai/retrieve/stream/",
+                {"conversation_id": self.conversation.id, "query": "When is enrollment?"},
+                format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return parse_events(b"".join(response.streaming_content))
+
+    @patch("ai.views.retrieval.get_chat_model")
+    def test_stream_sends_context_tokens_then_done(self, mock_get_chat_model):
+        """Test that context comes first, answer tokens follow and the messages are saved at the end."""
+        events = self._stream(mock_get_chat_model, ['{"answer": "Enrollment', ' opens in June."', ', "reason": "Handbook"}'])
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], "context")
+        self.assertEqual(names[-1], "done")
+        self.assertEqual(events[0][1], self.similar_text)
+        self.assertEqual("".join(data["text"] for name, data in events if name == "token"), "Enrollment opens in June.")
+
+        done = events[-1][1]
+        self.assertEqual(done["answer"], "Enrollment opens in June.")
+        self.assertEqual(done["reason"], "Handbook")
+        assistant_message = Message.objects.get(id=done["message_id"])
+        self.assertEqual(assistant_message.content, "Enrollment opens in June.")
+        self.assertEqual(list(assistant_message.context_chunks), [self.chunk])
+        self.assertEqual(Message.objects.filter(conversation=self.conversation, role="user").count(), 1)
+
+    @patch("ai.views.retrieval.get_chat_model")
+    def test_stream_error_saves_nothing(self, mock_get_chat_model):
+        """Test that a failure mid-generation ends the stream with an error event and no messages."""
+        def failing_stream(messages):
+            yield Mock(content='{"answer": "Enroll')
+            raise TimeoutError("upstream timed out")
+
+        mock_get_chat_model.return_value.stream.side_effect = failing_stream
+        with patch("ai.views.retrieval.HybridRetrievalView._retrieve", return_value=self.similar_text):
+            response = self.client.post(
+                "/api/ai/retrieve/stream/",
+                {"conversation_id": self.conversation.id, "query": "When is enrollment?"},
+                format="json"
+            )
+        events = parse_events(b"".join(response.streaming_content))
+
+        self.assertEqual([name for name, _ in events], ["context", "token", "error"])
+        self.assertFalse(Message.objects.filter(conversation=self.conversation).exists())
+
+
+class ASGIStreamingRetrievalViewTestCase(TransactionTestCase):
+    def setUp(self):
+        """Set up a user with a JWT, a conversation and one retrievable chunk, committed for the request's thread."""
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.token = str(AccessToken.for_user(self.user))
+        self.conversation = Conversation.objects.create(user=self.user)
+        document = Document.objects.create(file_url="knowledge-base/handbook.pdf")
+        self.chunk = DocumentChunk.objects.create(
+            document=document, text="Enrollment opens in June.", tokens_json=[], embedding_json=[],
+            pos_json=[], entity_json=[]
+        )
+        self.similar_text = [{"id": self.chunk.id, "source": document.file_url, "text": self.chunk.text}]
+
+    async def _serve(self, body):
+        """Send one request through the ASGI application, returning each body part with its arrival time"""
+        from main.asgi import application
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+            "path": "/api/ai/retrieve/stream/", "raw_path": b"/api/ai/retrieve/stream/", "query_string": b"",
+            "root_path": "", "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+            "headers": [
+                (b"host", b"testserver"), (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()), (b"authorization", f"Bearer {self.token}".encode()),
+            ],
+        }
+        requests = [{"type": "http.request", "body": body, "more_body": False}]
+        disconnected = asyncio.Event()
+        started = time.monotonic()
+        parts = []
+        headers = {}
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                headers.update((name.decode().lower(), value.decode()) for name, value in message["headers"])
+            elif message.get("body"):
+                parts.append((time.monotonic() - started, message["body"]))
+
+        await application(scope, receive, send)
+        disconnected.set()
+        return headers, parts
+
+    @patch("ai.views.retrieval.get_chat_model")
+    def test_tokens_are_sent_as_they_are_generated(self, mock_get_chat_model):
+        """Test that under ASGI each token reaches the client while the model is still generating."""
+        async def slow_stream(messages):
+            for piece in ['{"answer": "Enrollment', ' opens', ' in June."', ', "reason": "Handbook"}']:
+                await asyncio.sleep(0.2)
+                yield Mock(content=piece)
+
+        mock_get_chat_model.return_value.astream = slow_stream
+        body = json.dumps({"conversation_id": self.conversation.id, "query": "When is enrollment?"}).encode()
+        with patch("ai.views.retrieval.HybridRetrievalView._retrieve", return_value=self.similar_text):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                headers, parts = async_to_sync(self._serve)(body)
+
+        self.assertEqual(headers["content-type"], "text/event-stream")
+        self.assertFalse([warning for warning in caught if "synchronous iterators" in str(warning.message)])
+        first_token = next(arrived for arrived, part in parts if part.startswith(b"event: token"))
+        self.assertLess(first_token, parts[-1][0] - 0.3)
+
+        events = parse_events(b"".join(part for _, part in parts))
+        self.assertEqual([name for name, _ in events], ["context", "token", "token", "token", "done"])
+        done = events[-1][1]
+        self.assertEqual(done["answer"], "Enrollment opens in June.")
+        self.assertEqual(Message.objects.get(id=done["message_id"]).content, "Enrollment opens in June.")
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 2)
+
@@ -0,0 +1,141 @@
+"""
+Test file for request tracing and queued logging.
+Tests spans, the Server-Timing header on chat responses, structured request logs and the non-blocking log handler.
+"""
+
+import io
+import json
+import logging
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from unittest.mock import Mock, patch
+from ai.models.conversation import Conversation
+from ai.views.retrieval import HybridRetrievalView
+from main.lib.log_queue import QueueLogHandler
+from main.lib.tracing import Trace, current_trace, span
+
+ANSWER = '{"answer": "Enrollment opens in June.", "reason": "Handbook"}'
+
+
+def parse_server_timing(header):
+    return {metric.split(";dur=")[0]: float(metric.split(";dur=")[1]) for metric in header.split(", ")}
+
+
+class SpanTestCase(SimpleTestCase):
+    def test_spans_add_up_per_stage(self):
+        """Test that stages are recorded in order and repeated stages add up."""
+        trace = Trace()
+
+        with span("history_load", trace):
+            pass
+        with span("document_lookup", trace):
+            pass
+        with span("document_lookup", trace):
+            pass
+
+        self.assertEqual(list(trace.durations), ["history_load", "document_lookup"])
+        self.assertEqual(list(parse_server_timing(trace.server_timing())), ["history_load", "document_lookup", "total"])
+
+    def test_span_outside_a_request_is_a_no_op(self):
+        """Test that code timed outside a request (e.g. ingestion) just runs."""
+        self.assertIsNone(current_trace())
+        with span("query_nlp"):
+            ran = True
+        self.assertTrue(ran)
+
+
+@patch("ai.views.retrieval.get_chat_model")
+class ServerTimingTestCase(TestCase):
+    def setUp(self):
+        """Set up a user, a conversation and a retriever stub that records a retrieval stage."""
+        self.user = User.objects.create_user("student", "student@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.conversation = Conversation.objects.create(user=self.user)
+
+        def retrieve(view, query):
+            with span("sparse_search"):
+                return []
+
+        retrieve = patch.object(HybridRetrievalView, "_retrieve", retrieve)
+        retrieve.start()
+        self.addCleanup(retrieve.stop)
+
+    def _post(self, path="/api/ai/retrieve/"):
+        return self.client.post(
+            path, {"conversation_id": self.conversation.id, "query": "When is enrollment?"}, format="json"
+        )
+
+    def test_chat_response_reports_stages(self, mock_get_chat_model):
+        """Test that a chat response carries per-stage timings and is logged once as structured data."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content=ANSWER)
+
+        with self.assertLogs("main.lib.tracing", level="INFO") as logs:
+            response = self._post()
+
+        stages = parse_server_timing(response["Server-Timing"])
+        for stage in ("history_load", "sparse_search", "document_lookup", "admission_wait", "llm", "persist", "total"):
+            self.assertIn(stage, stages)
+        self.assertGreaterEqual(stages["total"], stages["llm"])
+        self.assertEqual(len(logs.records), 1)
+        data = logs.records[0].data
+        self.assertEqual((data["path"], data["status"]), ("/api/ai/retrieve/", 200))
+        self.assertEqual(set(data["stages_ms"]), set(stages) - {"total"})
+
+    def test_streamed_response_is_logged_when_done(self, mock_get_chat_model):
+        """Test that a stream's LLM and persistence stages are logged once the stream ends."""
+        mock_get_chat_model.return_value.stream.return_value = [Mock(content=ANSWER)]
+
+        with self.assertLogs("main.lib.tracing", level="INFO") as logs:
+            response = self._post("/api/ai/retrieve/stream/")
+            self.assertIn("history_load", response["Server-Timing"])
+            self.assertEqual(logs.records, [])
+            b"".join(response.streaming_content)
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("llm", logs.records[0].data["stages_ms"])
+        self.assertIn("persist", logs.records[0].data["stages_ms"])
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_can_be_turned_off(self, mock_get_chat_model):
+        """Test that SERVER_TIMING=False keeps timings out of responses."""
+        mock_get_chat_model.return_value.invoke.return_value = Mock(content=ANSWER)
+
+        self.assertNotIn("Server-Timing", self._post())
+
+
+class QueueLogHandlerTestCase(SimpleTestCase):
+    def _logger(self, handler):
+        logger = logging.getLogger("tests.queued")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger
+
+    def test_records_are_written_as_json_lines(self):
+        """Test that records reach stdout from the listener thread as JSON with their data."""
+        stdout = io.StringIO()
+        with patch("sys.stdout", stdout):
+            handler = QueueLogHandler()
+        logger = self._logger(handler)
+
+        logger.info("Answer cache hit", extra={"data": {"similarity": 0.97}})
+        handler.stop()
+
+        entry = json.loads(stdout.getvalue())
+        self.assertEqual((entry["level"], entry["logger"], entry["message"]), ("INFO", "tests.queued", "Answer cache hit"))
+        self.assertEqual(entry["data"], {"similarity": 0.97})
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that logging never waits on a backed-up writer."""
+        with patch("sys.stdout", io.StringIO()):
+            handler = QueueLogHandler(max_size=1)
+        handler.stop()
+        logger = self._logger(handler)
+
+        for number in range(5):
+            logger.info("Message %s", number)
+
+        self.assertEqual(handler.queue.qsize(), 1)